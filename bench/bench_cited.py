@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+"""
+Time taken to extract cited entries compared with parsing the whole file
+
+Writes a file of entries with random titles, authors, years and `@string` journals, a fraction of which cross-reference others, then times parsing all of it with `reffile_factory` against extracting a number of cited entries with `cited.cited_entries`, with the offset index first built and then already up to date. Exits with status 1 if extracting with an up-to-date index is not at least the given factor faster than parsing.
+
+Usage::
+
+    python bench/bench_cited.py [--entries N] [--cited N] [--min-speedup X]
+"""
+
+import os
+import sys
+import time
+import random
+import shutil
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+import pathlib2 as pathlib
+from refmanage import utils
+from refmanage.cited import cited_entries
+from refmanage.offsets import OffsetIndex
+
+
+LETTERS = u"abcdefghijklmnopqrstuvwxyz"
+
+
+def vocabulary(size, rng):
+    """
+    Random pseudo-words
+
+    :rtype: list of unicode
+    """
+    return [u"".join(rng.choice(LETTERS) for i in range(rng.randint(3, 10))) for n in range(size)]
+
+
+def write_corpus(path, num_entries, seed=0):
+    """
+    Write `num_entries` entries to `path`, with proceedings cross-referenced by every tenth entry at the end
+
+    :returns: Citation keys
+    :rtype: list of unicode
+    """
+    rng = random.Random(seed)
+    words = vocabulary(20000, rng)
+    surnames = vocabulary(5000, rng)
+    num_proceedings = max(num_entries // 100, 1)
+    keys = []
+    with path.open("w", encoding="utf-8") as f:
+        for n in range(50):
+            f.write(u"@string{{j{0} = {{{1}}}}}\n".format(n, u" ".join(rng.choice(words) for i in range(3)).title()))
+        for n in range(num_entries - num_proceedings):
+            key = u"key{0}".format(n)
+            keys.append(key)
+            crossref = u"  crossref = {{proc{0}}},\n".format(rng.randrange(num_proceedings)) if n % 10 == 0 else u""
+            f.write(u"\n@article{{{0},\n  author = {{{1}}},\n  title = {{{2}}},\n  journal = j{3},\n  year = {4},\n{5}}}\n".format(
+                key, u" and ".join(rng.choice(surnames).title() for i in range(rng.randint(1, 4))),
+                u" ".join(rng.choice(words) for i in range(rng.randint(6, 14))), rng.randrange(50),
+                rng.randint(1950, 2016), crossref))
+        for n in range(num_proceedings):
+            f.write(u"\n@proceedings{{proc{0},\n  title = {{{1}}},\n}}\n".format(n, u" ".join(rng.choice(words) for i in range(5))))
+    return keys
+
+
+def timed(func, *args, **kwargs):
+    """
+    Seconds taken by calling `func`, and its result
+
+    :rtype: tuple
+    """
+    start = time.time()
+    result = func(*args, **kwargs)
+    return time.time() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--entries", type=int, default=20000)
+    parser.add_argument("--cited", type=int, default=50, help="Number of entries cited")
+    parser.add_argument("--min-speedup", type=float, default=100., help="Least speed-up accepted with an up-to-date index")
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    try:
+        path = pathlib.Path(directory, "master.bib")
+        keys = write_corpus(path, args.entries)
+        citations = random.Random(1).sample(keys, args.cited)
+        sys.stdout.write("{0} entries, {1:.1f} MB, {2} cited\n".format(args.entries, path.stat().st_size / 2.**20, args.cited))
+
+        parse_seconds, bibfile = timed(utils.reffile_factory, path, encoding="utf-8")
+        sys.stdout.write("full parse: {0:.3f} s\n".format(parse_seconds))
+
+        index = OffsetIndex(os.path.join(directory, "offsets.sqlite"))
+        for name in ["index built", "index up to date"]:
+            start = time.time()
+            names = index.update([path], 1, "utf-8")
+            index_seconds = time.time() - start
+            cited = cited_entries(index, names, citations, "utf-8")
+            seconds = time.time() - start
+            sys.stdout.write("{0}: {1:.3f} s ({2:.3f} s indexing), {3} commands extracted, {4:.0f}x faster than parsing\n".format(
+                name, seconds, index_seconds, len(cited.commands), parse_seconds / seconds))
+        index.close()
+    finally:
+        shutil.rmtree(directory)
+
+    if parse_seconds / seconds < args.min_speedup:
+        sys.stdout.write("FAILED: speed-up below {0}\n".format(args.min_speedup))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
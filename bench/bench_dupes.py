@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+"""
+Growth of the time taken to find near-duplicate entries
+
+Synthesizes fingerprints of entries with random titles, authors and years, a fraction of which are copies of others with a word dropped or misspelled, and times `dupes.find_duplicates` on increasing numbers of them. Reports the candidate pairs scored against the pairs an all-pairs comparison would score, the fraction of the planted duplicates found, and the exponent of the growth of the time taken between the smallest and largest sizes. Exits with status 1 if the growth is not sub-quadratic.
+
+Usage::
+
+    python bench/bench_dupes.py [--entries N [N ...]] [--duplicates X] [--max-exponent X]
+"""
+
+import os
+import sys
+import math
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from refmanage import dupes
+from refmanage.dupes import Fingerprint
+
+
+LETTERS = u"abcdefghijklmnopqrstuvwxyz"
+
+
+def vocabulary(size, rng):
+    """
+    Random pseudo-words
+
+    :rtype: list of unicode
+    """
+    return [u"".join(rng.choice(LETTERS) for i in range(rng.randint(3, 10))) for n in range(size)]
+
+
+def misspell(word, rng):
+    """
+    `word` with one letter replaced
+    """
+    i = rng.randrange(len(word))
+    return word[:i] + rng.choice(LETTERS) + word[i + 1:]
+
+
+def corpus(num_entries, duplicate_ratio, seed=0):
+    """
+    Fingerprints, with the pairs of indices of planted duplicates
+
+    :rtype: tuple
+    """
+    rng = random.Random(seed)
+    words = vocabulary(20000, rng)
+    surnames = vocabulary(5000, rng)
+    fingerprints = []
+    planted = []
+    for n in range(num_entries):
+        if fingerprints and rng.random() < duplicate_ratio:
+            i = rng.randrange(len(fingerprints))
+            original = fingerprints[i]
+            title = original.title.split()
+            j = rng.randrange(len(title))
+            if rng.random() < 0.5 and len(title) > 6:
+                del title[j]
+            else:
+                title[j] = misspell(title[j], rng)
+            fingerprints.append(original._replace(key=u"dup{0}".format(n), title=u" ".join(title)))
+            planted.append((i, n))
+        else:
+            title = u" ".join(rng.choice(words) for i in range(rng.randint(6, 14)))
+            fingerprints.append(Fingerprint(u"key{0}".format(n), None, None, u"", title,
+                                            rng.choice(surnames), unicode(rng.randint(1950, 2016))))
+    return fingerprints, planted
+
+
+def measure(num_entries, duplicate_ratio):
+    """
+    Seconds taken, candidate pairs and fraction of planted duplicates found for `num_entries` fingerprints
+
+    :rtype: tuple
+    """
+    fingerprints, planted = corpus(num_entries, duplicate_ratio)
+    start = time.time()
+    groups = dupes.find_duplicates(fingerprints)
+    seconds = time.time() - start
+
+    group_of = {}
+    for n, group in enumerate(groups):
+        for fingerprint in group:
+            group_of[fingerprint.key] = n
+    found = sum(1 for i, j in planted
+                if group_of.get(fingerprints[i].key, -1) == group_of.get(fingerprints[j].key, -2))
+    num_pairs = len(dupes.candidate_pairs(fingerprints))
+    return seconds, num_pairs, found / float(len(planted) or 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--entries", type=int, nargs="+", default=[10000, 20000, 40000, 80000])
+    parser.add_argument("--duplicates", type=float, default=0.05, help="Fraction of entries which are planted duplicates")
+    parser.add_argument("--max-exponent", type=float, default=1.5, help="Largest growth exponent accepted")
+    args = parser.parse_args()
+
+    sys.stdout.write("{0:>9} {1:>9} {2:>12} {3:>14} {4:>7}\n".format("entries", "seconds", "candidates", "all pairs", "recall"))
+    times = []
+    for num_entries in args.entries:
+        seconds, num_pairs, recall = measure(num_entries, args.duplicates)
+        times.append(seconds)
+        sys.stdout.write("{0:>9} {1:>9.2f} {2:>12} {3:>14} {4:>7.3f}\n".format(
+            num_entries, seconds, num_pairs, num_entries * (num_entries - 1) // 2, recall))
+
+    if len(args.entries) > 1:
+        exponent = math.log(times[-1] / times[0]) / math.log(args.entries[-1] / float(args.entries[0]))
+        sys.stdout.write("time grows as entries ** {0:.2f}\n".format(exponent))
+        if exponent > args.max_exponent:
+            sys.stdout.write("FAILED: growth exponent above {0}\n".format(args.max_exponent))
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+"""
+Time taken to build, update and query the entry store
+
+Writes files of entries with random titles, abstracts, authors, years and journals to a temporary directory, then times adding them to an empty `EntryStore`, which parses them all, updating it when none has changed and when one has, and queries by key, author, year range, journal and words of titles and abstracts. Exits with status 1 if a query takes longer than its threshold.
+
+Usage::
+
+    python bench/bench_entrystore.py [--files N] [--entries N] [--jobs N] [--max-query-ms X]
+"""
+
+import os
+import sys
+import time
+import random
+import shutil
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+import pathlib2 as pathlib
+from refmanage.entrystore import EntryStore
+
+
+LETTERS = u"abcdefghijklmnopqrstuvwxyz"
+
+ENTRY = u"""@article{{{key},
+    author = {{{author}}},
+    title = {{{title}}},
+    journal = {{{journal}}},
+    year = {{{year}}},
+    abstract = {{{abstract}}},
+}}
+
+"""
+
+
+def vocabulary(size, rng):
+    """
+    Random pseudo-words
+
+    :rtype: list of unicode
+    """
+    return [u"".join(rng.choice(LETTERS) for i in range(rng.randint(3, 10))) for n in range(size)]
+
+
+def write_corpus(directory, num_files, num_entries, seed=0):
+    """
+    Write `num_files` files of `num_entries` entries each to `directory`
+
+    :returns: Paths to the files, a key, a surname, a journal and a word of the titles used
+    :rtype: tuple
+    """
+    rng = random.Random(seed)
+    words = vocabulary(20000, rng)
+    surnames = vocabulary(5000, rng)
+    journals = [u" ".join(rng.choice(words) for i in range(3)).title() for n in range(200)]
+    paths = []
+    for i in range(num_files):
+        path = pathlib.Path(directory, "file{0}.bib".format(i))
+        with path.open("w", encoding="utf-8") as f:
+            for j in range(num_entries):
+                f.write(ENTRY.format(key=u"key{0}_{1}".format(i, j),
+                    author=u" and ".join(u"{0}, {1}.".format(rng.choice(surnames).title(), rng.choice(LETTERS).upper())
+                                         for k in range(rng.randint(1, 4))),
+                    title=u" ".join(rng.choice(words) for k in range(rng.randint(6, 14))),
+                    journal=rng.choice(journals), year=rng.randint(1950, 2016),
+                    abstract=u" ".join(rng.choice(words) for k in range(rng.randint(50, 150)))))
+        paths.append(path)
+    return paths, u"key0_0", surnames[0], journals[0], words[0]
+
+
+def timed(func, *args, **kwargs):
+    """
+    Seconds taken by calling `func`, and its result
+
+    :rtype: tuple
+    """
+    start = time.time()
+    result = func(*args, **kwargs)
+    return time.time() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--files", type=int, default=50)
+    parser.add_argument("--entries", type=int, default=200, help="Entries per file")
+    parser.add_argument("--jobs", type=int, default=None)
+    parser.add_argument("--max-query-ms", type=float, default=50., help="Longest time accepted for a query")
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    try:
+        paths, key, surname, journal, word = write_corpus(directory, args.files, args.entries)
+        store = EntryStore(os.path.join(directory, "entries.sqlite"))
+        for name in ["build", "unchanged"]:
+            seconds, num_parsed = timed(store.update, paths, args.jobs, "utf-8")
+            sys.stdout.write("{0}: {1:.3f} s, {2} files parsed\n".format(name, seconds, num_parsed))
+        with paths[0].open("a", encoding="utf-8") as f:
+            f.write(u"@misc{appended,}\n")
+        seconds, num_parsed = timed(store.update, paths, args.jobs, "utf-8")
+        sys.stdout.write("one changed: {0:.3f} s, {1} files parsed\n".format(seconds, num_parsed))
+        sys.stdout.write("{0} entries stored, full-text search with {1}\n".format(len(store), store.fts))
+
+        failures = []
+        for name, conditions in [("key", {"key": key}), ("author", {"author": surname}),
+                                 ("years", {"year": u"1990-1995"}), ("journal", {"journal": journal}),
+                                 ("text", {"text": [word]}), ("author and text", {"author": surname, "text": [word]})]:
+            seconds, entries = timed(store.query, **conditions)
+            ms = 1000 * seconds
+            sys.stdout.write("query {0}: {1:.2f} ms, {2} entries\n".format(name, ms, len(entries)))
+            if ms > args.max_query_ms:
+                failures.append("query {0} took {1:.2f} ms".format(name, ms))
+        store.close()
+    finally:
+        shutil.rmtree(directory)
+
+    if failures:
+        sys.stdout.write("FAILED: " + "; ".join(failures) + "\n")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
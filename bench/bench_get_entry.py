@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+"""
+Time taken to get single entries of a large file with `BibFile.get_entry`
+
+Writes a file as `bench_cited` does, then times constructing a `BibFile`, which parses the whole file, against opening it with `BibFile.open`, first when the file must be parsed and its byte spans recorded, then when they are already recorded, and getting a number of entries. Exits with status 1 if opening the recorded file and getting the entries is not at least the given factor faster than parsing.
+
+Usage::
+
+    python bench/bench_get_entry.py [--entries N] [--get N] [--min-speedup X]
+"""
+
+import os
+import sys
+import random
+import shutil
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+import pathlib2 as pathlib
+from refmanage import BibFile
+from refmanage.offsets import OffsetIndex
+from bench_cited import write_corpus, timed
+
+
+def open_and_get(path, index, keys):
+    """
+    Open the file at `path` with `index` and get the entries of `keys`
+
+    :rtype: list of `pybtex.database.Entry`
+    """
+    b = BibFile.open(path, "utf-8", index)
+    return [b.get_entry(key) for key in keys]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--entries", type=int, default=20000)
+    parser.add_argument("--get", type=int, default=10, help="Number of entries got")
+    parser.add_argument("--min-speedup", type=float, default=100., help="Least speed-up accepted once spans are recorded")
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    try:
+        path = pathlib.Path(directory, "master.bib")
+        keys = random.Random(1).sample(write_corpus(path, args.entries), args.get)
+        sys.stdout.write("{0} entries, {1:.1f} MB, {2} got\n".format(args.entries, path.stat().st_size / 2.**20, args.get))
+
+        parse_seconds, bibfile = timed(BibFile, path, encoding="utf-8")
+        sys.stdout.write("BibFile: {0:.3f} s\n".format(parse_seconds))
+
+        index = OffsetIndex(os.path.join(directory, "offsets.sqlite"))
+        for name in ["open, spans recorded", "open, spans already recorded"]:
+            seconds, entries = timed(open_and_get, path, index, keys)
+            sys.stdout.write("{0}: {1:.4f} s, {2:.0f}x faster than parsing\n".format(name, seconds, parse_seconds / seconds))
+        index.close()
+    finally:
+        shutil.rmtree(directory)
+
+    if parse_seconds / seconds < args.min_speedup:
+        sys.stdout.write("FAILED: speed-up below {0}\n".format(args.min_speedup))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""
+Peak memory and time of loading one large file
+
+Compares loading a file into unicode the ways refmanage used to (reading in text mode, and reading bytes then decoding through `io.TextIOWrapper`) with `reffile.load_src_txt`, which memory-maps the file and decodes it once. Optionally the loaded text is also parsed. Each measurement runs in a fresh process.
+
+Usage::
+
+    python bench/bench_loading.py [--entries N [N ...]] [--parse]
+"""
+
+import io
+import os
+import sys
+import time
+import shutil
+import argparse
+import resource
+import tempfile
+import subprocess
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+import corpus
+
+
+MODES = ["text", "bytes", "mmap"]
+
+
+def peak_rss_mb():
+    """
+    Peak resident set size of this process in MB
+
+    :rtype: float
+    """
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.
+
+
+def load(mode, path):
+    """
+    Contents of `path` as unicode, loaded in `mode`
+
+    :rtype: unicode
+    """
+    from refmanage import reffile
+
+    if mode == "text":
+        with path.open() as f:
+            return f.read()
+    elif mode == "bytes":
+        with path.open("rb") as f:
+            data = f.read()
+        return io.TextIOWrapper(io.BytesIO(data), encoding="utf-8").read()
+    else:
+        return reffile.load_src_txt(path, "utf-8")
+
+
+def child(mode, path, parse):
+    """
+    Load (and parse) `path` in `mode` and print seconds taken and peak RSS
+    """
+    import pathlib2 as pathlib
+    from refmanage import reffile
+
+    start = time.time()
+    src_txt = load(mode, pathlib.Path(path))
+    if parse:
+        reffile.parse_bib_txt(src_txt)
+    sys.stdout.write("{0:.3f} {1:.1f}\n".format(time.time() - start, peak_rss_mb()))
+
+
+def measure(mode, path, parse):
+    """
+    Seconds taken and peak RSS in MB of a fresh process loading `path` in `mode`
+
+    :rtype: tuple
+    """
+    args = [sys.executable, os.path.abspath(__file__), "--child", mode, path]
+    if parse:
+        args.append("--parse")
+    seconds, rss = subprocess.check_output(args).split()
+    return float(seconds), float(rss)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--entries", type=int, nargs="+", default=[20000, 80000])
+    parser.add_argument("--parse", action="store_true", help="Also parse the loaded text")
+    parser.add_argument("--child", nargs=2, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child[0], args.child[1], args.parse)
+        return
+
+    directory = tempfile.mkdtemp()
+    try:
+        sys.stdout.write("{0:>8} {1:>8} ".format("entries", "MB") +
+                         " ".join("{0:>16}".format("{0} (s, MB)".format(mode)) for mode in MODES) + "\n")
+        for num_entries in args.entries:
+            path = os.path.join(directory, "large.bib")
+            with open(path, "wb") as f:
+                f.write(corpus.bib_txt(num_entries).encode("utf-8"))
+            size_mb = os.path.getsize(path) / 2.**20
+            measurements = [measure(mode, path, args.parse) for mode in MODES]
+            sys.stdout.write("{0:>8} {1:>8.1f} ".format(num_entries, size_mb) +
+                             " ".join("{0:>7.2f} {1:>8.1f}".format(*m) for m in measurements) + "\n")
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    main()
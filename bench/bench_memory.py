@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""
+Peak memory of parsing many files
+
+Compares the peak resident set size of keeping every parsed file as a `RefFile` (`utils.construct_bibfile_data`) with keeping only a `ParseResult` per file (`utils.construct_parse_results`, as used by `ref -t`) for increasing numbers of files. Each measurement runs in a fresh process.
+
+Usage::
+
+    python bench/bench_memory.py [--files N [N ...]] [--entries N]
+"""
+
+import os
+import sys
+import shutil
+import argparse
+import resource
+import tempfile
+import subprocess
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+import corpus
+
+
+MODES = ["reffiles", "results"]
+
+
+def peak_rss_mb():
+    """
+    Peak resident set size of this process in MB
+
+    :rtype: float
+    """
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.
+
+
+def child(mode, paths):
+    """
+    Parse `paths` in `mode` and print peak RSS
+    """
+    import pathlib2 as pathlib
+    from refmanage import utils
+
+    paths = [pathlib.Path(path) for path in paths]
+    if mode == "reffiles":
+        data = utils.construct_bibfile_data(*paths)
+    else:
+        data = utils.construct_parse_results(*paths, jobs=1)
+    assert len(data) == len(paths)
+    sys.stdout.write("{0:.1f}\n".format(peak_rss_mb()))
+
+
+def measure(mode, paths):
+    """
+    Peak RSS in MB of a fresh process parsing `paths` in `mode`
+
+    :rtype: float
+    """
+    output = subprocess.check_output(
+        [sys.executable, os.path.abspath(__file__), "--child", mode] + paths)
+    return float(output)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--files", type=int, nargs="+", default=[50, 100, 200, 400])
+    parser.add_argument("--entries", type=int, default=200, help="Entries per file")
+    parser.add_argument("--child", nargs="+", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child[0], args.child[1:])
+        return
+
+    directory = tempfile.mkdtemp()
+    try:
+        all_paths = corpus.write_corpus(directory, max(args.files), args.entries)
+        size_mb = sum(os.path.getsize(path) for path in all_paths) / float(max(args.files)) / 2**20
+        sys.stdout.write("{0} entries per file, {1:.2f} MB per file\n".format(args.entries, size_mb))
+        sys.stdout.write("{0:>8} {1:>16} {2:>16}\n".format("files", *("{0} (MB)".format(mode) for mode in MODES)))
+        for num_files in args.files:
+            paths = all_paths[:num_files]
+            rss = [measure(mode, paths) for mode in MODES]
+            sys.stdout.write("{0:>8} {1:>16.1f} {2:>16.1f}\n".format(num_files, *rss))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+"""
+Per-call latency of `ref` with and without a server
+
+Runs `ref -t` on a small corpus a number of times in-process (`--no-server`), then with a `ref --serve` server running on a temporary socket, and reports the wall time of each call. The server keeps its modules imported and its parse cache warm between calls, so the difference is the start-up cost a client no longer pays.
+
+Usage::
+
+    python bench/bench_server.py [--calls N] [--files N] [--cache]
+"""
+
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+
+REPO_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+sys.path.insert(0, REPO_DIR)
+
+import corpus
+
+
+def call(args, directory, env):
+    """
+    Wall time in seconds of running `ref` with `args` in `directory`
+
+    :rtype: float
+    """
+    devnull = open(os.devnull, "wb")
+    start = time.time()
+    status = subprocess.call(
+        [sys.executable, "-c", "from refmanage.refmanage import main; main()"] + args,
+        cwd=directory, stdout=devnull, env=env)
+    wall = time.time() - start
+    if status != 0:
+        raise RuntimeError("ref exited with status {0}".format(status))
+    return wall
+
+
+def summary(walls):
+    """
+    Line reporting the median, fastest and slowest of `walls` in ms
+
+    :rtype: str
+    """
+    walls = sorted(walls)
+    return "{0:>8.1f} {1:>8.1f} {2:>8.1f}".format(
+        1000 * walls[len(walls) // 2], 1000 * walls[0], 1000 * walls[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--calls", type=int, default=20)
+    parser.add_argument("--files", type=int, default=20)
+    parser.add_argument("--cache", action="store_true", help="Let ref use its parse cache")
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    try:
+        corpus_dir = os.path.join(directory, "corpus")
+        os.mkdir(corpus_dir)
+        corpus.write_corpus(corpus_dir, args.files, 5)
+        socket_path = os.path.join(directory, "server.sock")
+        env = dict(os.environ,
+            PYTHONPATH=os.pathsep.join(filter(None, [REPO_DIR, os.environ.get("PYTHONPATH")])),
+            XDG_CACHE_HOME=os.path.join(directory, "cache"))
+        ref_args = ["-t", "--socket", socket_path, "*.bib"]
+        if not args.cache:
+            ref_args.append("--no-cache")
+
+        sys.stdout.write("{0:>12} {1:>8} {2:>8} {3:>8}\n".format("ms", "median", "min", "max"))
+        walls = [call(ref_args + ["--no-server"], corpus_dir, env) for i in range(args.calls)]
+        sys.stdout.write("{0:>12} {1}\n".format("in-process", summary(walls)))
+
+        server = subprocess.Popen(
+            [sys.executable, "-c", "from refmanage.refmanage import main; main()",
+             "--serve", "--socket", socket_path],
+            env=env, stderr=open(os.devnull, "wb"))
+        try:
+            while not os.path.exists(socket_path):
+                if server.poll() is not None:
+                    raise RuntimeError("server exited with status {0}".format(server.returncode))
+                time.sleep(0.05)
+            walls = [call(ref_args, corpus_dir, env) for i in range(args.calls)]
+            sys.stdout.write("{0:>12} {1}\n".format("server", summary(walls)))
+        finally:
+            server.terminate()
+            server.wait()
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+"""
+Start-up time of the `ref` command and the imports it spends it on
+
+For each command, run in-process or forwarded to a server, a fresh process times importing `ref` and running the command, keeping the fastest of several runs; the thresholds apply to this time, which excludes the start-up of the interpreter. Imports are timed by wrapping `__import__`, giving for each module imported its cumulative and self time as `python -X importtime` does on Python 3.7 and later. Exits with status 1 if a command takes longer than its threshold, or if `ref --version` imports pybtex.
+
+Usage::
+
+    python bench/bench_startup.py [--repeat N] [--top N] [--scale X]
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+
+REPO_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+sys.path.insert(0, REPO_DIR)
+
+CONTROL = os.path.join(REPO_DIR, "test", "controls", "one.bib")
+
+# name: (arguments of `ref`, threshold in ms, whether the command is forwarded to a server)
+COMMANDS = [
+    ("version", ["--version"], 40., False),
+    ("forward", ["-t", "--no-cache", CONTROL], 60., True),
+    ("test", ["-t", "--no-server", "--no-cache", CONTROL], 400., False),
+]
+
+
+# Run in the measured process with `-c`, importing nothing before `ref` does so that its imports are all timed; the arguments of `ref` follow
+CHILD = r"""
+import sys, time, __builtin__
+
+original_import = __builtin__.__import__
+# Seconds spent in and modules loaded by the nested imports of each import in progress
+stack = []
+imports = []
+
+def timed_import(*args, **kwargs):
+    before = set(sys.modules)
+    stack.append([0., set()])
+    start = time.time()
+    try:
+        return original_import(*args, **kwargs)
+    finally:
+        elapsed = time.time() - start
+        nested_seconds, nested_modules = stack.pop()
+        new = set(name for name in set(sys.modules) - before if sys.modules[name] is not None)
+        if stack:
+            stack[-1][0] += elapsed
+            stack[-1][1].update(new)
+        own = new - nested_modules
+        if own:
+            imports.append({"module": min(own, key=len), "cumulative": elapsed, "self": elapsed - nested_seconds})
+
+sys.argv = ["ref"] + sys.argv[1:]
+stdout, sys.stdout = sys.stdout, open("/dev/null", "wb")
+start = time.time()
+__builtin__.__import__ = timed_import
+try:
+    from refmanage.refmanage import main
+    import_seconds = time.time() - start
+    main()
+except SystemExit:
+    pass
+finally:
+    seconds = time.time() - start
+    __builtin__.__import__ = original_import
+    sys.stdout = stdout
+modules = sorted(name for name in sys.modules if sys.modules[name] is not None)
+import json
+json.dump({"seconds": seconds, "import_seconds": import_seconds, "imports": imports, "modules": modules}, sys.stdout)
+"""
+
+
+def measure(argv, repeat, env):
+    """
+    Fastest of `repeat` measurements of `ref` with `argv` in fresh processes
+
+    The wall time of the whole process, including the start-up of the interpreter, is added as "wall".
+
+    :rtype: dict
+    """
+    best = None
+    for i in range(repeat):
+        start = time.time()
+        output = subprocess.check_output([sys.executable, "-c", CHILD] + argv, env=env)
+        result = json.loads(output)
+        result["wall"] = time.time() - start
+        if best is None or result["seconds"] < best["seconds"]:
+            best = result
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10, help="Number of slowest imports listed per command")
+    parser.add_argument("--scale", type=float, default=1., help="Factor applied to the thresholds, for slow machines")
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    socket_path = os.path.join(directory, "server.sock")
+    env = dict(os.environ,
+        PYTHONPATH=os.pathsep.join(filter(None, [REPO_DIR, os.environ.get("PYTHONPATH")])),
+        XDG_CACHE_HOME=os.path.join(directory, "cache"))
+    server = subprocess.Popen(
+        [sys.executable, "-c", "from refmanage.refmanage import main; main()", "--serve", "--socket", socket_path],
+        env=env, stderr=open(os.devnull, "wb"))
+    try:
+        while not os.path.exists(socket_path):
+            if server.poll() is not None:
+                raise RuntimeError("server exited with status {0}".format(server.returncode))
+            time.sleep(0.05)
+        failures = run_commands(args, socket_path, env)
+    finally:
+        server.terminate()
+        server.wait()
+        shutil.rmtree(directory)
+
+    if failures:
+        sys.stdout.write("FAILED: " + "; ".join(failures) + "\n")
+        sys.exit(1)
+
+
+def run_commands(args, socket_path, env):
+    """
+    Measure and report each command, forwarding those which are to the server at `socket_path`
+
+    :returns: Descriptions of the thresholds exceeded
+    :rtype: list
+    """
+    failures = []
+    for name, argv, threshold, forwarded in COMMANDS:
+        if forwarded:
+            argv = argv + ["--socket", socket_path]
+        result = measure(argv, args.repeat, env)
+        ms = 1000 * result["seconds"]
+        pybtex = any(module.split(".")[0] == "pybtex" for module in result["modules"])
+        sys.stdout.write("{0}: {1:.1f} ms ({2:.1f} ms importing ref, {3:.1f} ms with interpreter start-up; "
+                         "{4} modules, pybtex {5}imported; threshold {6:.0f} ms)\n".format(
+            name, ms, 1000 * result["import_seconds"], 1000 * result["wall"], len(result["modules"]),
+            "" if pybtex else "not ", threshold * args.scale))
+        sys.stdout.write("{0:>10} {1:>10}  {2}\n".format("self (ms)", "cumul (ms)", "module"))
+        for record in sorted(result["imports"], key=lambda record: -record["self"])[:args.top]:
+            sys.stdout.write("{0:>10.1f} {1:>10.1f}  {2}\n".format(
+                1000 * record["self"], 1000 * record["cumulative"], record["module"]))
+        sys.stdout.write("\n")
+        if ms > threshold * args.scale:
+            failures.append("{0} took {1:.1f} ms".format(name, ms))
+        if name == "version" and pybtex:
+            failures.append("version imported pybtex")
+    return failures
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,284 @@
+# -*- coding: utf-8 -*-
+"""
+Throughput of parsing, classification and the `ref` command
+
+Synthesizes corpora of several shapes (many small files, a few large ones, mixes of parseable and unparseable files, copies of `test/controls`) and, for each, measures the library API phase by phase and `ref -t` end to end. Every measurement runs in a fresh process so that peak RSS is per measurement. Results are printed as a table and can be saved as JSON and compared with an earlier run.
+
+Usage::
+
+    python bench/bench_throughput.py [--scenarios NAME [NAME ...]] [--scale X] [--repeat N] [--output FILE] [--compare FILE]
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import resource
+import tempfile
+import subprocess
+
+REPO_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+sys.path.insert(0, REPO_DIR)
+
+import corpus
+
+
+# name: (corpus source, number of files, entries per file, fraction of invalid files, or `None` for the controls' mix)
+SCENARIOS = {
+    "many-small": ("synthetic", 2000, 1, 0.0),
+    "few-large": ("synthetic", 4, 5000, 0.0),
+    "half-invalid": ("synthetic", 400, 20, 0.5),
+    "controls": ("controls", 2400, 1, None),
+    "controls-huge": ("controls", 2, 5000, 0.0),
+}
+
+MODES = ["library", "cli", "cli-verbose"]
+
+# Library API phases, in the order they are run
+PHASES = ["glob", "read", "construct_bibfile_data", "bib_sublist", "gen_stdout_test_msg",
+          "construct_parse_results", "iter_parse_results_prescan"]
+
+# Phases after which files/sec and MB/sec are reported
+THROUGHPUT_PHASES = ["construct_bibfile_data", "construct_parse_results", "iter_parse_results_prescan"]
+
+CLI_ARGS = {
+    "cli": ["-t", "--no-cache", "*.bib"],
+    "cli-verbose": ["-tv", "--no-cache", "*.bib"],
+}
+
+
+def peak_rss_mb():
+    """
+    Peak resident set size in MB
+
+    :rtype: float
+    """
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.
+
+
+class Timer(object):
+    """
+    Context manager recording wall and CPU time of a phase in `timings`
+    """
+    def __init__(self, timings, phase):
+        self.timings = timings
+        self.phase = phase
+
+
+    def __enter__(self):
+        self.wall = time.time()
+        self.cpu = time.clock()
+        return self
+
+
+    def __exit__(self, *exc_info):
+        self.timings[self.phase] = {"wall": time.time() - self.wall,
+                                    "cpu": time.clock() - self.cpu}
+
+
+def child_library(directory):
+    """
+    Run the library API phases on the corpus in `directory`
+
+    :returns: phase timings, bytes read, number of files
+    :rtype: tuple
+    """
+    from refmanage import utils
+    from pybtex.database import BibliographyData
+    from pybtex.exceptions import PybtexError
+
+    timings = {}
+    with Timer(timings, "glob"):
+        paths = utils.handle_files_args(os.path.join(directory, "*.bib"))
+    with Timer(timings, "read"):
+        num_bytes = 0
+        for path in paths:
+            with path.open("rb") as f:
+                num_bytes += len(f.read())
+    with Timer(timings, "construct_bibfile_data"):
+        bibfile_data = utils.construct_bibfile_data(*paths)
+    with Timer(timings, "bib_sublist"):
+        parseable = utils.bib_sublist(bibfile_data, BibliographyData)
+        unparseable = utils.bib_sublist(bibfile_data, PybtexError)
+    with Timer(timings, "gen_stdout_test_msg"):
+        utils.gen_stdout_test_msg(parseable, verbose=True)
+        utils.gen_stdout_test_msg(unparseable, verbose=True)
+    del bibfile_data, parseable, unparseable
+    with Timer(timings, "construct_parse_results"):
+        utils.construct_parse_results(*paths, jobs=1)
+    with Timer(timings, "iter_parse_results_prescan"):
+        for result in utils.iter_parse_results(paths, jobs=1, prescan=True):
+            pass
+    return timings, num_bytes, len(paths)
+
+
+def child(mode, directory):
+    """
+    Measure `mode` on the corpus in `directory` and print the measurement as JSON
+    """
+    if mode == "library":
+        timings, num_bytes, num_files = child_library(directory)
+        peak = peak_rss_mb()
+    else:
+        devnull = open(os.devnull, "wb")
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [REPO_DIR, os.environ.get("PYTHONPATH")])))
+        start = time.time()
+        proc = subprocess.Popen(
+            [sys.executable, "-c", "from refmanage.refmanage import main; main()"] + CLI_ARGS[mode],
+            cwd=directory, stdout=devnull, env=env)
+        pid, status, rusage = os.wait4(proc.pid, 0)
+        wall = time.time() - start
+        if status != 0:
+            raise RuntimeError("ref exited with status {0}".format(status))
+        timings = {"ref": {"wall": wall, "cpu": rusage.ru_utime + rusage.ru_stime}}
+        peak = rusage.ru_maxrss / 1024.
+        paths = [os.path.join(directory, name) for name in os.listdir(directory)]
+        num_bytes = sum(os.path.getsize(path) for path in paths)
+        num_files = len(paths)
+    json.dump({"phases": timings, "bytes": num_bytes, "files": num_files, "peak_rss_mb": peak}, sys.stdout)
+
+
+def measure(mode, directory, repeat=1):
+    """
+    Measure `mode` on the corpus in `directory` in fresh processes, keeping the fastest of `repeat` runs
+
+    :rtype: dict
+    """
+    best = None
+    for i in range(repeat):
+        output = subprocess.check_output(
+            [sys.executable, os.path.abspath(__file__), "--child", mode, directory])
+        result = json.loads(output)
+        result["wall"] = sum(phase["wall"] for phase in result["phases"].values())
+        if best is None or result["wall"] < best["wall"]:
+            best = result
+
+    mb = best["bytes"] / 2.**20
+    if mode == "library":
+        best["throughput"] = dict(
+            (phase, {"files_per_sec": best["files"] / best["phases"][phase]["wall"],
+                     "mb_per_sec": mb / best["phases"][phase]["wall"]})
+            for phase in THROUGHPUT_PHASES)
+    else:
+        best["throughput"] = {"ref": {"files_per_sec": best["files"] / best["wall"],
+                                      "mb_per_sec": mb / best["wall"]}}
+    return best
+
+
+def write_scenario(name, directory, scale):
+    """
+    Write the corpus of scenario `name` to `directory`
+    """
+    source, num_files, entries_per_file, invalid_ratio = SCENARIOS[name]
+    num_files = max(1, int(num_files * scale))
+    if source == "synthetic":
+        corpus.write_corpus(directory, num_files, entries_per_file, invalid_ratio)
+    else:
+        corpus.write_controls_corpus(directory, num_files, entries_per_file)
+    if invalid_ratio == 0.0:
+        check_parses(os.path.join(directory, "file000000.bib"))
+
+
+def check_parses(path):
+    """
+    Raise `RuntimeError` unless the file at `path` parses, so that a scenario meant to measure successful parses does
+    """
+    from refmanage.reffile import parse_bib_txt
+    from pybtex.database import BibliographyData
+
+    with open(path, "rb") as f:
+        bib = parse_bib_txt(f.read().decode("utf-8"))
+    if not isinstance(bib, BibliographyData):
+        raise RuntimeError("{0} does not parse: {1}".format(path, bib))
+
+
+def metadata():
+    """
+    Description of the environment the benchmarks ran in
+
+    :rtype: dict
+    """
+    from refmanage.version import __version__
+    from pybtex.__version__ import version as pybtex_version
+    try:
+        commit = subprocess.check_output(["git", "rev-parse", "HEAD"],
+            cwd=REPO_DIR, stderr=open(os.devnull, "wb")).strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {"time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "commit": commit,
+            "refmanage": __version__,
+            "pybtex": pybtex_version,
+            "python": platform.python_version(),
+            "platform": platform.platform()}
+
+
+def report(results, baseline=None):
+    """
+    Print a table of `results`, with the ratio of each time to the same time in `baseline`
+    """
+    def key(result):
+        return result["scenario"], result["mode"]
+    baseline = dict((key(result), result) for result in (baseline or {}).get("results", []))
+
+    sys.stdout.write("{0:<14} {1:<12} {2:<28} {3:>9} {4:>9} {5:>10} {6:>9} {7:>9} {8:>8}\n".format(
+        "scenario", "mode", "phase", "wall (s)", "cpu (s)", "files/s", "MB/s", "RSS (MB)", "vs base"))
+    for result in results:
+        old = baseline.get(key(result))
+        for phase in sorted(result["phases"], key=lambda phase: (PHASES + ["ref"]).index(phase)):
+            timing = result["phases"][phase]
+            throughput = result["throughput"].get(phase)
+            ratio = ""
+            if old is not None and phase in old["phases"]:
+                ratio = "{0:.2f}x".format(timing["wall"] / max(old["phases"][phase]["wall"], 1e-9))
+            sys.stdout.write("{0:<14} {1:<12} {2:<28} {3:>9.3f} {4:>9.3f} {5:>10} {6:>9} {7:>9.1f} {8:>8}\n".format(
+                result["scenario"], result["mode"], phase, timing["wall"], timing["cpu"],
+                "{0:.1f}".format(throughput["files_per_sec"]) if throughput else "",
+                "{0:.2f}".format(throughput["mb_per_sec"]) if throughput else "",
+                result["peak_rss_mb"], ratio))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--scenarios", nargs="+", choices=sorted(SCENARIOS), default=sorted(SCENARIOS))
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=MODES)
+    parser.add_argument("--scale", type=float, default=1.0, help="Multiply the number of files in each scenario")
+    parser.add_argument("--repeat", type=int, default=1, help="Keep the fastest of N runs")
+    parser.add_argument("--output", help="Save results as JSON")
+    parser.add_argument("--compare", help="JSON results of an earlier run to compare against")
+    parser.add_argument("--child", nargs=2, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(*args.child)
+        return
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+    results = []
+    for name in args.scenarios:
+        directory = tempfile.mkdtemp()
+        try:
+            write_scenario(name, directory, args.scale)
+            for mode in args.modes:
+                result = measure(mode, directory, args.repeat)
+                result.update(scenario=name, mode=mode)
+                results.append(result)
+        finally:
+            shutil.rmtree(directory)
+
+    report(results, baseline)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"meta": metadata(), "results": results}, f, indent=2, sort_keys=True)
+
+
+if __name__ == "__main__":
+    main()
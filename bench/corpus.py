@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+"""
+Synthetic BibTeX corpora for benchmarks
+"""
+
+import io
+import os
+import glob
+import random
+
+
+CONTROLS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "test", "controls")
+
+
+ENTRY_TEMPLATE = u"""@article{{{key},
+    author = {{Smith, Joshua Ryan and Doe, Jane and {surname}, {given}}},
+    journal = {{Journal of Synthetic Benchmarks}},
+    title = {{An Efficiency Comparison of Synthetic Entry Number {n}}},
+    year = {{{year}}},
+    volume = {{{volume}}},
+    pages = {{{page}--{page_end}}},
+    doi = {{10.0000/bench.{n}}},
+    abstract = {{{abstract}}}
+}}
+
+"""
+
+INVALID_ENTRY = u"""@journal article{{invalid{n},
+    title = {{Unparseable entry}}
+}}
+
+"""
+
+SURNAMES = [u"Knauff", u"Nejasmic", u"Golovizin", u"Lamport", u"Patashnik", u"Knuth"]
+GIVEN_NAMES = [u"Markus", u"Jelica", u"Andrey", u"Leslie", u"Oren", u"Donald"]
+WORDS = u"the of document preparation systems used in academic research and development latex word".split()
+
+
+def entry(n, rng, abstract_words=60):
+    """
+    Text of one valid BibTeX entry
+
+    :param int n: Entry number; determines the citation key.
+    :param random.Random rng: Source of randomness.
+    :param int abstract_words: Number of words in the abstract field.
+    :rtype: unicode
+    """
+    page = rng.randint(1, 9000)
+    return ENTRY_TEMPLATE.format(
+        key=u"key{0}".format(n),
+        surname=rng.choice(SURNAMES),
+        given=rng.choice(GIVEN_NAMES),
+        n=n,
+        year=rng.randint(1900, 2016),
+        volume=rng.randint(1, 99),
+        page=page,
+        page_end=page + rng.randint(1, 30),
+        abstract=u" ".join(rng.choice(WORDS) for i in range(abstract_words)))
+
+
+def bib_txt(num_entries, valid=True, seed=0, abstract_words=60):
+    """
+    Text of a BibTeX file
+
+    :param int num_entries: Number of entries.
+    :param bool valid: If False, an unparseable entry is appended.
+    :param int seed: Seed for the random content.
+    :param int abstract_words: Number of words in each abstract.
+    :rtype: unicode
+    """
+    rng = random.Random(seed)
+    txt = u"".join(entry(n, rng, abstract_words) for n in range(num_entries))
+    if not valid:
+        txt += INVALID_ENTRY.format(n=num_entries)
+    return txt
+
+
+def write_corpus(directory, num_files, entries_per_file, invalid_ratio=0.0, seed=0, abstract_words=60):
+    """
+    Write a corpus of BibTeX files to `directory`
+
+    :param str directory: Existing directory to write files in.
+    :param int num_files: Number of files.
+    :param int entries_per_file: Number of entries in each file.
+    :param float invalid_ratio: Fraction of files containing an unparseable entry.
+    :param int seed: Seed for the random content.
+    :param int abstract_words: Number of words in each abstract.
+    :returns: Paths of the files written
+    :rtype: list
+    """
+    rng = random.Random(seed)
+    paths = []
+    for i in range(num_files):
+        path = os.path.join(directory, "file{0:06d}.bib".format(i))
+        valid = rng.random() >= invalid_ratio
+        txt = bib_txt(entries_per_file, valid, seed=rng.randint(0, 2**31), abstract_words=abstract_words)
+        with open(path, "wb") as f:
+            f.write(txt.encode("utf-8"))
+        paths.append(path)
+    return paths
+
+
+def control_txts():
+    """
+    Contents of the files in `test/controls`, keyed by file name
+
+    :rtype: dict
+    """
+    txts = {}
+    for path in sorted(glob.glob(os.path.join(CONTROLS_DIR, "*.bib"))):
+        with io.open(path, encoding="utf-8") as f:
+            txts[os.path.basename(path)] = f.read()
+    return txts
+
+
+def replicate_entry(txt, key, num_entries):
+    """
+    Text of `num_entries` copies of the single entry `txt`, each with its own citation key
+
+    :param unicode txt: Text of a file with one entry.
+    :param unicode key: Citation key of the entry in `txt`.
+    :param int num_entries: Number of copies.
+    :rtype: unicode
+    """
+    return u"\n\n".join(txt.replace(key, u"{0}.{1}".format(key, n), 1) for n in range(num_entries))
+
+
+def write_controls_corpus(directory, num_files, entries_per_file=1):
+    """
+    Write a corpus of files based on `test/controls` to `directory`
+
+    With `entries_per_file` of 1 the control files are copied verbatim in turn, so the corpus has the controls' mix of empty, valid and invalid files. Otherwise every file holds `entries_per_file` copies of the entry in `10.1371__journal.pone.0115069.bib`, with the "AND" separating its authors lower-cased so that the files parse; pybtex rejects the entry as it is.
+
+    :param str directory: Existing directory to write files in.
+    :param int num_files: Number of files.
+    :param int entries_per_file: Number of entries in each file.
+    :returns: Paths of the files written
+    :rtype: list
+    """
+    txts = control_txts()
+    if entries_per_file == 1:
+        names = sorted(txts)
+        file_txts = [txts[names[i % len(names)]] for i in range(num_files)]
+    else:
+        txt = replicate_entry(txts["10.1371__journal.pone.0115069.bib"].replace(u" AND ", u" and "),
+            u"10.1371/journal.pone.0115069", entries_per_file)
+        file_txts = [txt] * num_files
+
+    paths = []
+    for i, txt in enumerate(file_txts):
+        path = os.path.join(directory, "file{0:06d}.bib".format(i))
+        with open(path, "wb") as f:
+            f.write(txt.encode("utf-8"))
+        paths.append(path)
+    return paths
@@ -6,7 +6,44 @@ Base Library (:mod:`refmanage`)
 .. currentmodule:: refmanage
 """
 
+import sys
+import types
+import importlib
 from version import __version__
 from refmanage import *
-from reffile import RefFile, BibFile, NonbibFile
-import utils
+
+# Attributes whose modules import pybtex, by name: the module defining them, or `None` for the module of that name. They are imported on first access so that `ref --version` does not import pybtex.
+_LAZY_ATTRS = {
+    "RefFile": "reffile",
+    "BibFile": "reffile",
+    "NonbibFile": "reffile",
+    "ParseResult": "reffile",
+    "utils": None,
+}
+
+# Names exported by `from refmanage import *`; those in `_LAZY_ATTRS` are imported by it through `_Package.__getattr__`
+__all__ = sorted(name for name in globals() if not name.startswith("_") and name not in ("sys", "types", "importlib")) + sorted(_LAZY_ATTRS)
+
+
+class _Package(types.ModuleType):
+    """
+    Module type of this package, importing the attributes in `_LAZY_ATTRS` on first access
+    """
+    def __getattr__(self, name):
+        if name not in _LAZY_ATTRS:
+            raise AttributeError("'module' object has no attribute '{0}'".format(name))
+        module = importlib.import_module(__name__ + "." + (_LAZY_ATTRS[name] or name))
+        value = module if _LAZY_ATTRS[name] is None else getattr(module, name)
+        setattr(self, name, value)
+        return value
+
+
+    def __dir__(self):
+        return sorted(set(self.__dict__) | set(_LAZY_ATTRS))
+
+
+_package = _Package(__name__, __doc__)
+_package.__dict__.update(globals())
+# Keeps the globals of `_Package.__getattr__` alive; Python 2 clears the globals of a module when it is garbage collected
+_package._module = sys.modules[__name__]
+sys.modules[__name__] = _package
@@ -0,0 +1,253 @@
+# -*- coding: utf-8 -*-
+"""
+Background parsing (:mod:`refmanage.background`)
+================================================
+
+.. currentmodule:: refmanage.background
+
+Classify files without blocking the calling thread, for programs such as servers which run an event loop. `submit` returns a `ParseTask` at once; the files, or in-memory contents, are read and parsed in a pool of worker processes or threads with at most `limit` of them in flight, while a dispatching thread collects the results. A task can be waited on, iterated over as results complete, given a callback, or cancelled.
+
+Callbacks are called in the dispatching thread. A program running an event loop should hand each result over to the loop with the loop's thread-safe method, such as `IOLoop.add_callback` in Tornado or `reactor.callFromThread` in Twisted, rather than touch the loop's state from the callback.
+"""
+
+import Queue
+import functools
+import threading
+import multiprocessing
+import utils
+from reffile import ParseResult, decode_src_txt, parse_bib_txt
+from ref_exceptions import ParseCancelledError
+
+
+# Sentinel put on queues when a task finishes
+_FINISHED = object()
+
+
+def _parse_item(item, encoding=None):
+    """
+    `ParseResult` of a path, or of a `(name, data)` pair giving the raw contents of a file in memory
+
+    Module-level so that it can be dispatched to worker processes.
+
+    :param item: `pathlib.Path`, or `tuple` of name and `str`.
+    :param str encoding: Encoding of the contents; defaults to the locale's preferred encoding.
+    :rtype: ParseResult
+    :raises UndecodableFileError: if the contents are not valid in `encoding`.
+    """
+    if isinstance(item, tuple):
+        name, data = item
+        src_txt = decode_src_txt(data, encoding, name)
+        return ParseResult.from_reffile(utils._reffile(None, src_txt, parse_bib_txt(src_txt), name), details=False)
+    result, key, hit, phases = utils._parse_result(item, encoding=encoding)
+    return result
+
+
+class ParseTask(object):
+    """
+    Files being classified in the background
+
+    Use `submit` rather than constructing a `ParseTask` directly.
+
+    :param items: Iterable of items as accepted by `submit`; consumed by the dispatching thread.
+    :param pool: `multiprocessing.pool.Pool` or `multiprocessing.pool.ThreadPool` running the work.
+    :param bool own_pool: Whether to terminate `pool` when the task finishes.
+    :param int limit: Maximum number of items in flight.
+    :param callback: Function called with each `ParseResult` as it completes, if any.
+    :param str encoding: Encoding of the files.
+    """
+    def __init__(self, items, pool, own_pool, limit, callback=None, encoding=None):
+        if limit < 1:
+            raise ValueError("limit must be at least 1")
+        self._pool = pool
+        self._own_pool = own_pool
+        self._limit = limit
+        self._callback = callback
+        self._func = utils._Guarded(functools.partial(_parse_item, encoding=encoding))
+        self._lock = threading.Lock()
+        self._completed = Queue.Queue()
+        self._stream = Queue.Queue()
+        self._results = {}
+        self._num_items = None
+        self._error = None
+        self._cancelled = False
+        self._finished = threading.Event()
+        self._thread = threading.Thread(target=self._dispatch, args=(items,), name="refmanage-parse-task")
+        self._thread.daemon = True
+        self._thread.start()
+
+
+    def _dispatch(self, items):
+        """
+        Submit items to the pool, at most `self._limit` at a time, and collect their results
+        """
+        in_flight = 0
+        num_items = 0
+        try:
+            for index, item in enumerate(items):
+                while in_flight >= self._limit:
+                    if not self._collect():
+                        return
+                    in_flight -= 1
+                if self._cancelled:
+                    return
+                self._pool.apply_async(self._func, (item,),
+                    callback=functools.partial(self._put_completed, index))
+                in_flight += 1
+                num_items += 1
+            self._num_items = num_items
+            while in_flight:
+                if not self._collect():
+                    return
+                in_flight -= 1
+        except Exception, e:
+            self._fail(e)
+        finally:
+            if self._own_pool:
+                self._pool.terminate()
+            self._finished.set()
+            self._stream.put(_FINISHED)
+
+
+    def _put_completed(self, index, outcome):
+        self._completed.put((index, outcome))
+
+
+    def _collect(self):
+        """
+        Wait for one item to complete and record its result
+
+        :returns: Whether to carry on, which is not the case once the task is cancelled or has failed
+        :rtype: bool
+        """
+        completed = self._completed.get()
+        if completed is _FINISHED:
+            return False
+        index, (error, result) = completed
+        if error is not None:
+            self._fail(error)
+            return False
+        self._results[index] = result
+        self._stream.put(result)
+        if self._callback is not None:
+            self._callback(result)
+        return True
+
+
+    def _fail(self, error):
+        with self._lock:
+            if self._error is None and not self._cancelled:
+                self._error = error
+
+
+    def cancel(self):
+        """
+        Stop parsing
+
+        Items not yet dispatched are never parsed. With a pool owned by the task, items in flight are abandoned by terminating the pool; with a pool passed to `submit` they run to completion but their results are discarded. Cancelling a finished task does nothing.
+
+        :returns: Whether the task was cancelled, which is not the case if it had already finished
+        :rtype: bool
+        """
+        with self._lock:
+            if self._finished.is_set():
+                return False
+            self._cancelled = True
+        self._completed.put(_FINISHED)
+        return True
+
+
+    def cancelled(self):
+        """
+        Whether the task was cancelled
+
+        :rtype: bool
+        """
+        return self._cancelled
+
+
+    def done(self):
+        """
+        Whether the task has finished, by completing, failing or being cancelled
+
+        :rtype: bool
+        """
+        return self._finished.is_set()
+
+
+    def wait(self, timeout=None):
+        """
+        Block until the task finishes
+
+        :param float timeout: Maximum number of seconds to wait; waits indefinitely by default.
+        :returns: Whether the task has finished
+        :rtype: bool
+        """
+        # Event.wait without a timeout cannot be interrupted in Python 2
+        while not self._finished.wait(timeout if timeout is not None else 3600):
+            if timeout is not None:
+                return False
+        return True
+
+
+    def _check(self):
+        if self._cancelled:
+            raise ParseCancelledError()
+        if self._error is not None:
+            raise self._error
+
+
+    def results(self, timeout=None):
+        """
+        Results of all items, in the order the items were given, once the task has finished
+
+        :param float timeout: Maximum number of seconds to wait; waits indefinitely by default.
+        :rtype: list of `ParseResult`
+        :raises ParseCancelledError: if the task was cancelled.
+        :raises UndecodableFileError: if a file is not valid in the encoding; the first exception raised by any item is raised.
+        :raises RuntimeError: if the task has not finished within `timeout`.
+        """
+        if not self.wait(timeout):
+            raise RuntimeError("parse task has not finished")
+        self._check()
+        return [self._results[index] for index in range(self._num_items)]
+
+
+    def iter_completed(self):
+        """
+        Generator of results in the order the items complete, blocking until each is available
+
+        Only one generator should be consumed per task.
+
+        :rtype: generator of `ParseResult`
+        :raises ParseCancelledError: if the task is cancelled before all results are generated.
+        :raises UndecodableFileError: if a file is not valid in the encoding.
+        """
+        while True:
+            result = self._stream.get()
+            if result is _FINISHED:
+                self._stream.put(_FINISHED)
+                break
+            yield result
+        self._check()
+
+
+def submit(items, pool=None, jobs=None, limit=None, callback=None, encoding=None):
+    """
+    Classify files in the background
+
+    :param items: Iterable of `pathlib.Path`s to files possibly containing BibTeX data, or of `(name, data)` tuples giving the raw contents `data` of a file in memory; see `RefFile.from_bytes`.
+    :param pool: `multiprocessing.pool.Pool` or `multiprocessing.pool.ThreadPool` to run the work in; by default a pool of `jobs` worker processes is started, and terminated when the task finishes.
+    :param int jobs: Number of worker processes of the default pool; defaults to the number of CPUs.
+    :param int limit: Maximum number of items in flight; defaults to `utils.PARSE_WINDOW_PER_JOB` times `jobs`.
+    :param callback: Function called with each `ParseResult` as it completes, in the dispatching thread.
+    :param str encoding: Encoding of the files; defaults to the locale's preferred encoding.
+    :rtype: ParseTask
+    """
+    jobs = utils.resolve_jobs(jobs)
+    if limit is None:
+        limit = utils.PARSE_WINDOW_PER_JOB * jobs
+
+    own_pool = pool is None
+    if own_pool:
+        pool = multiprocessing.Pool(jobs)
+    return ParseTask(items, pool, own_pool, limit, callback, encoding)
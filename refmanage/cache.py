@@ -0,0 +1,245 @@
+# -*- coding: utf-8 -*-
+"""
+Parse result cache (:mod:`refmanage.cache`)
+===========================================
+
+.. currentmodule:: refmanage.cache
+
+Persistent cache of `ParseResult`s so that files which have not changed since the last run need not be parsed again.
+
+The other databases kept in the cache directory, such as the key index, derive from `SQLiteStore` too.
+"""
+
+import os
+import time
+import errno
+import hashlib
+import locale
+import sqlite3
+import cPickle as pickle
+from pybtex.__version__ import version as pybtex_version
+
+
+DEFAULT_MAX_ENTRIES = 100000
+
+
+def default_cache_dir():
+    """
+    Directory in which the cache is stored by default
+
+    Honors `$XDG_CACHE_HOME`, falling back to `~/.cache`.
+
+    :rtype: str
+    """
+    cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    return os.path.join(cache_home, "refmanage")
+
+
+def cache_key(path, stat, data, encoding=None):
+    """
+    Key identifying the contents of a file as decoded with a particular encoding and parsed by a particular version of pybtex
+
+    :param pathlib.Path path: Path to file.
+    :param stat: Result of `os.stat` on `path`.
+    :param data: Contents of `path`, as `str` or `mmap.mmap`.
+    :param str encoding: Encoding of `path`; defaults to the locale's preferred encoding.
+    :returns: resolved path, mtime in nanoseconds, size, SHA-1 of contents, encoding, pybtex version
+    :rtype: tuple
+    """
+    if encoding is None:
+        encoding = locale.getpreferredencoding()
+    return (unicode(path.resolve()),
+            int(stat.st_mtime * 10**9),
+            stat.st_size,
+            hashlib.sha1(data).hexdigest(),
+            encoding,
+            pybtex_version)
+
+
+class SQLiteStore(object):
+    """
+    SQLite database kept in the cache directory, opened on first use
+
+    Subclasses give the name of the database file in `FILENAME`, list their tables in `TABLES` and create them in `_create`. The connection is not pickled, so a store can be handed to worker processes.
+
+    :param str path: Path to the SQLite database file, or ":memory:" for a database which is not persisted; defaults to `FILENAME` in `default_cache_dir`.
+    """
+    # Name of the database file in the cache directory
+    FILENAME = None
+
+    # Increment whenever the layout of the database changes; databases with another version are emptied when opened.
+    SCHEMA_VERSION = 1
+
+    # Tables, dropped when the version changes and emptied by `clear`
+    TABLES = ()
+
+    @property
+    def path(self):
+        """
+        Path to the SQLite database file (read-only)
+
+        :type: str
+        """
+        return self._path
+
+
+    def __init__(self, path=None):
+        if path is None:
+            path = os.path.join(default_cache_dir(), self.FILENAME)
+        self._path = path
+        self._conn = None
+
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_conn"] = None
+        return state
+
+
+    def _connection(self):
+        """
+        Open the database, creating it if necessary
+
+        :rtype: `sqlite3.Connection`
+        """
+        if self._conn is None:
+            if self.path != ":memory:":
+                try:
+                    os.makedirs(os.path.dirname(os.path.abspath(self.path)))
+                except OSError, e:
+                    if e.errno != errno.EEXIST:
+                        raise
+            conn = sqlite3.connect(self.path, timeout=60)
+            if conn.execute("PRAGMA user_version").fetchone()[0] != self.SCHEMA_VERSION:
+                for table in self.TABLES:
+                    conn.execute("DROP TABLE IF EXISTS " + table)
+                conn.execute("PRAGMA user_version = {0:d}".format(self.SCHEMA_VERSION))
+            self._create(conn)
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+
+    def open(self):
+        """
+        Open the database now rather than on first use, so that errors opening it are raised here
+
+        :raises EnvironmentError: if the directory of the database cannot be created.
+        :raises sqlite3.Error: if the database cannot be opened.
+        """
+        self._connection()
+
+
+    def _create(self, conn):
+        """
+        Create the tables and indices which do not exist yet
+
+        :param sqlite3.Connection conn: Connection being opened.
+        """
+        raise NotImplementedError
+
+
+    def clear(self):
+        """
+        Remove all rows
+        """
+        conn = self._connection()
+        existing = set(row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'"))
+        with conn:
+            for table in self.TABLES:
+                if table in existing:
+                    conn.execute("DELETE FROM " + table)
+        conn.execute("VACUUM")
+
+
+    def close(self):
+        """
+        Close the database connection
+        """
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+class ParseCache(SQLiteStore):
+    """
+    SQLite database of `ParseResult`s
+
+    Each resolved path has at most one entry, which is valid only while the mtime, size, content hash, encoding and pybtex version recorded in its key are unchanged. The database holds at most `max_entries` entries; the least recently used are evicted first.
+
+    :param str path: Path to the SQLite database file.
+    :param int max_entries: Maximum number of entries kept.
+    """
+    FILENAME = "parse_results.sqlite"
+
+    # Also incremented whenever the layout of pickled `ParseResult`s, or the errors found in a file, change
+    SCHEMA_VERSION = 10
+
+    TABLES = ("parse_results",)
+
+    @property
+    def max_entries(self):
+        """
+        Maximum number of entries kept (read-only)
+
+        :type: int
+        """
+        return self._max_entries
+
+
+    def __init__(self, path=None, max_entries=DEFAULT_MAX_ENTRIES):
+        super(ParseCache, self).__init__(path)
+        self._max_entries = max_entries
+
+
+    def _create(self, conn):
+        conn.execute("""CREATE TABLE IF NOT EXISTS parse_results (
+            path TEXT PRIMARY KEY,
+            mtime_ns INTEGER,
+            size INTEGER,
+            digest TEXT,
+            encoding TEXT,
+            pybtex_version TEXT,
+            result BLOB,
+            atime REAL)""")
+        conn.execute("CREATE INDEX IF NOT EXISTS parse_results_atime ON parse_results (atime)")
+
+
+    def get(self, key):
+        """
+        Cached `ParseResult` for `key`
+
+        :param tuple key: Key from `cache_key`.
+        :returns: The cached result, or `None` if there is no valid entry.
+        :rtype: ParseResult
+        """
+        row = self._connection().execute(
+            "SELECT result FROM parse_results WHERE path = ? AND mtime_ns = ? AND size = ? AND digest = ? AND encoding = ? AND pybtex_version = ?",
+            key).fetchone()
+        if row is None:
+            return None
+        return pickle.loads(str(row[0]))
+
+
+    def update(self, hits=(), misses=()):
+        """
+        Record cache accesses and evict entries beyond `self.max_entries`
+
+        :param hits: Keys of entries which were found by `get`.
+        :param misses: `(key, ParseResult)` pairs to store.
+        """
+        now = time.time()
+        conn = self._connection()
+        with conn:
+            conn.executemany("UPDATE parse_results SET atime = ? WHERE path = ?",
+                ((now, key[0]) for key in hits))
+            conn.executemany("INSERT OR REPLACE INTO parse_results VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (key + (sqlite3.Binary(pickle.dumps(result, pickle.HIGHEST_PROTOCOL)), now)
+                 for key, result in misses))
+            conn.execute("""DELETE FROM parse_results WHERE path IN (
+                SELECT path FROM parse_results ORDER BY atime DESC LIMIT -1 OFFSET ?)""",
+                (self.max_entries,))
+
+
+    def __len__(self):
+        return self._connection().execute("SELECT COUNT(*) FROM parse_results").fetchone()[0]
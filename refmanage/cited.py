@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+"""
+Cited entries (:mod:`refmanage.cited`)
+======================================
+
+.. currentmodule:: refmanage.cited
+
+Extract the entries cited by a LaTeX document from BibTeX files, as BibTeX would select them, without parsing the files.
+
+The citation keys are read from the `\\citation` commands LaTeX writes to .aux files. Each cited entry is found with an `refmanage.offsets.OffsetIndex`, read by seeking to it and parsed on its own, with the `@string` macros of the files; the entries they cross-reference are extracted too, and placed after all the entries referring to them, as BibTeX requires.
+"""
+
+import re
+import locale
+import collections
+from pybtex.database.input import bibtex
+from pybtex.utils import CaseInsensitiveDict
+from offsets import ENTRY, STRING, PREAMBLE
+from reffile import load_src_txt, decode_src_txt, format_location_msg
+from stream import StreamError, iter_parsed_chunks
+
+
+AUX_COMMAND = re.compile(r"\\(citation|bibdata|@input)\{([^}]*)\}")
+
+
+class AuxData(collections.namedtuple("AuxData", "citations bibdata")):
+    """
+    What an .aux file says about the bibliography of a document
+
+    :param list citations: Citation keys, without repeats ignoring case, in the order first cited; "*" stands for every entry.
+    :param list bibdata: Paths to the BibTeX files named by `\\bibdata`, with ".bib" appended as BibTeX does.
+    """
+    __slots__ = ()
+
+
+class Cited(collections.namedtuple("Cited", "commands missing errors")):
+    """
+    Entries extracted by `cited_entries`
+
+    :param list commands: Raw contents of the `@string` and `@preamble` commands, then of the entries, as `str`.
+    :param list missing: Citation keys of no entry in the files, or of an entry which does not parse.
+    :param list errors: "path:line: message" of each error parsing the commands, which are left out.
+    """
+    __slots__ = ()
+
+
+def read_aux(path, encoding=None):
+    """
+    Citations and BibTeX files of an .aux file and the .aux files it inputs
+
+    Files input with `\\@input` are read where they are cited, relative to the directory of `path` as LaTeX writes them; those which do not exist yet, as happens before LaTeX has run on an included file, are skipped.
+
+    :param pathlib.Path path: Path to the .aux file.
+    :param str encoding: Encoding of the files; defaults to the locale's preferred encoding.
+    :rtype: `AuxData`
+    :raises UndecodableFileError: if a file is not valid in `encoding`.
+    """
+    directory = path.parent
+    citations = collections.OrderedDict()
+    bibdata = []
+    seen = set()
+
+    def read(path):
+        seen.add(path.resolve())
+        for command, value in AUX_COMMAND.findall(load_src_txt(path, encoding)):
+            if command == "citation":
+                for key in value.split(u","):
+                    key = key.strip()
+                    if key:
+                        citations.setdefault(key.lower(), key)
+            elif command == "bibdata":
+                for name in value.split(u","):
+                    name = name.strip()
+                    if name:
+                        bibdata.append(directory / (name if name.endswith(u".bib") else name + u".bib"))
+            else:
+                child = directory / value.strip()
+                if child.exists() and child.resolve() not in seen:
+                    read(child)
+
+    read(path)
+    return AuxData(list(citations.values()), bibdata)
+
+
+def cited_entries(index, paths, citations, encoding=None):
+    """
+    Raw contents of the entries cited, the entries they cross-reference, and the macros and preambles of the files
+
+    Each key is taken from the first file of `paths` defining it, ignoring case. Every `@string` and `@preamble` command of the files is extracted, as the entries may use any of the macros. Commands which do not parse on their own are left out rather than written broken, and the keys of such entries are reported missing.
+
+    :param OffsetIndex index: Index updated with `paths`.
+    :param list paths: Resolved paths of the BibTeX files, in order of precedence, as returned by `OffsetIndex.update`.
+    :param list citations: Citation keys; "*" stands for every entry of the files.
+    :param str encoding: Encoding of the files; defaults to the locale's preferred encoding.
+    :rtype: `Cited`
+    :raises UndecodableFileError: if a command extracted is not valid in `encoding`.
+    """
+    if encoding is None:
+        encoding = locale.getpreferredencoding()
+    if u"*" in citations:
+        citations = [span.key for path in paths for span in index.spans(path, (ENTRY,))] + list(citations)
+        citations.remove(u"*")
+
+    files = {}
+    macros = CaseInsensitiveDict(bibtex.month_names)
+    errors = []
+
+    def read(span):
+        if span.path not in files:
+            files[span.path] = open(span.path, "rb")
+        return span.read(files[span.path])
+
+    def parse(span, data):
+        """
+        Entries parsed from a command, or `None` if it does not parse
+        """
+        def decode(chunk, offset, lineno):
+            return decode_src_txt(chunk, encoding, span.path, offset, lineno)
+
+        items = list(iter_parsed_chunks([(span.offset, span.lineno, data)], decode, macros))
+        failed = [item for item in items if isinstance(item, StreamError)]
+        for item in failed:
+            errors.append(format_location_msg(span.path, item.lineno, item.message))
+        if failed or len(items) != (1 if span.kind == ENTRY else 0):
+            return None
+        return items
+
+    try:
+        commands = []
+        for path in paths:
+            for span in index.spans(path, (STRING, PREAMBLE)):
+                data = read(span)
+                if parse(span, data) is not None:
+                    commands.append(data)
+
+        # Raw contents of the entries by lower-cased key, in the order they are written
+        entries = collections.OrderedDict()
+        parents = set()
+        missing = []
+        # Lower-cased keys of the entries which do not parse
+        broken = set()
+        queue = collections.deque((key, False) for key in citations)
+        while queue:
+            key, crossref = queue.popleft()
+            lkey = key.lower()
+            if crossref:
+                parents.add(lkey)
+            if lkey in broken:
+                continue
+            if lkey in entries:
+                if crossref:
+                    # Cross-referenced entries follow the entries referring to them
+                    entries[lkey] = entries.pop(lkey)
+                continue
+            spans = index.lookup(key, paths)
+            if not spans:
+                missing.append(key)
+                continue
+            data = read(spans[0])
+            items = parse(spans[0], data)
+            if items is None:
+                broken.add(lkey)
+                missing.append(key)
+                continue
+            entries[lkey] = data
+            parent = items[0].entry.fields.get("crossref")
+            if parent:
+                queue.append((parent, True))
+    finally:
+        for f in files.values():
+            f.close()
+
+    commands.extend(data for lkey, data in entries.items() if lkey not in parents)
+    commands.extend(data for lkey, data in entries.items() if lkey in parents)
+    return Cited(commands, missing, errors)
@@ -0,0 +1,336 @@
+# -*- coding: utf-8 -*-
+"""
+Near-duplicate entries (:mod:`refmanage.dupes`)
+===============================================
+
+.. currentmodule:: refmanage.dupes
+
+Find entries which are probably the same work entered more than once, under different keys or in different files, without comparing every pair of entries.
+
+Each entry is reduced to a `Fingerprint` of its normalized DOI, title, first author's surname and year. Candidate pairs are only those entries which share a bucket: entries with the same DOI share one, and entries whose titles are similar are likely to share one of the MinHash bands of their title words, so the work grows with the number of entries and the sizes of the buckets rather than with the square of the number of entries. Each candidate pair is then scored by `similarity`, on the trigrams of the titles, and pairs scoring at least a threshold are grouped.
+"""
+
+import re
+import zlib
+import random
+import functools
+import itertools
+import unicodedata
+import collections
+import multiprocessing
+import utils
+from reffile import BibFile, format_location_msg
+
+
+# Number of MinHash values of a title; `BANDS` bands of `ROWS` values
+BANDS = 8
+ROWS = 3
+
+# Buckets larger than this are split by surname and year, and ignored if still larger
+MAX_BUCKET = 200
+
+# Default `similarity` from which entries are taken to be duplicates
+THRESHOLD = 0.7
+
+# Mersenne prime modulus of the hash functions
+_PRIME = 2**61 - 1
+
+_LATEX_COMMAND = re.compile(r"\\(?:[a-zA-Z]+\*?|.)")
+_NON_ALNUM = re.compile(r"[\W_]+", re.UNICODE)
+_DOI_PREFIX = re.compile(r"^(?:https?://(?:dx\.)?doi\.org/|doi:\s*)", re.IGNORECASE)
+
+# Words left out of title shingles, as most titles share them
+STOPWORDS = frozenset(u"a an and are as at by for from in into is of on or the to via with".split())
+
+
+def _permutations(num_perm, seed=0):
+    """
+    Coefficients of `num_perm` hash functions `(a * x + b) % _PRIME`
+    """
+    rng = random.Random(seed)
+    return [(rng.randint(1, _PRIME - 1), rng.randint(0, _PRIME - 1)) for i in range(num_perm)]
+
+
+_PERMUTATIONS = _permutations(BANDS * ROWS)
+
+# Words whose hashes are memoized at most, about 1 kB each
+MAX_WORD_HASHES = 2**17
+
+_WORD_HASHES = {}
+
+
+def normalize_text(text):
+    """
+    Text lower-cased and stripped of LaTeX commands, braces, accents and punctuation
+
+    :param unicode text: BibTeX field value.
+    :rtype: unicode
+    """
+    text = _LATEX_COMMAND.sub(u"", text).replace(u"{", u"").replace(u"}", u"")
+    text = u"".join(c for c in unicodedata.normalize("NFKD", unicode(text)) if not unicodedata.combining(c))
+    return _NON_ALNUM.sub(u" ", text.lower()).strip()
+
+
+def normalize_doi(doi):
+    """
+    DOI lower-cased and stripped of any resolver URL or "doi:" prefix
+
+    :param unicode doi: Value of a "doi" field.
+    :rtype: unicode
+    """
+    return _DOI_PREFIX.sub(u"", doi.strip()).lower()
+
+
+class Fingerprint(collections.namedtuple("Fingerprint", "key path lineno doi title surname year")):
+    """
+    Normalized fields identifying the work an entry describes
+
+    Missing fields are empty strings.
+
+    :param unicode key: Citation key.
+    :param unicode path: Resolved path to the file defining the entry, or `None`.
+    :param int lineno: Line number of the entry, or `None`.
+    :param unicode doi: Normalized DOI; see `normalize_doi`.
+    :param unicode title: Normalized title; see `normalize_text`.
+    :param unicode surname: Normalized surname of the first author, or else editor.
+    :param unicode year: Year.
+    """
+    __slots__ = ()
+
+    @classmethod
+    def from_entry(cls, key, entry, path=None, lineno=None):
+        """
+        Construct from a parsed entry
+
+        :param unicode key: Citation key.
+        :param pybtex.database.Entry entry: Parsed entry.
+        :param unicode path: Resolved path to the file defining the entry.
+        :param int lineno: Line number of the entry.
+        :rtype: Fingerprint
+        """
+        surname = u""
+        persons = entry.persons.get("author") or entry.persons.get("editor")
+        if persons:
+            surname = normalize_text(u" ".join(persons[0].last()))
+        return cls(key, path, lineno,
+                   normalize_doi(entry.fields.get("doi", u"")),
+                   normalize_text(entry.fields.get("title", u"")),
+                   surname,
+                   normalize_text(entry.fields.get("year", u"")))
+
+
+    def msg(self):
+        """
+        "path:line: key" message
+
+        :rtype: unicode
+        """
+        return format_location_msg(self.path, self.lineno, self.key)
+
+
+def file_fingerprints(path, encoding=None):
+    """
+    Fingerprints of the entries of a file, or none if it is unparseable
+
+    Module-level so that it can be dispatched to worker processes.
+
+    :param pathlib.Path path: Path to file possibly containing BibTeX data.
+    :param str encoding: Encoding of the file; defaults to the locale's preferred encoding.
+    :rtype: list of `Fingerprint`
+    :raises UndecodableFileError: if the file is not valid in `encoding`.
+    """
+    reffile = utils.reffile_factory(path, encoding=encoding)
+    if not isinstance(reffile, BibFile):
+        return []
+    name = unicode(path.resolve())
+    lines = dict(reffile.key_lines())
+    return [Fingerprint.from_entry(key, entry, name, lines.get(key)) for key, entry in reffile.bib.entries.items()]
+
+
+def iter_fingerprints(paths, jobs=None, encoding=None):
+    """
+    Generator of the fingerprints of the entries of files, parsed in a pool of worker processes
+
+    :param paths: Iterable of `pathlib.Path`s to files possibly containing BibTeX data.
+    :param int jobs: Number of worker processes; defaults to the number of CPUs.
+    :param str encoding: Encoding of the files; defaults to the locale's preferred encoding.
+    :rtype: generator of `Fingerprint`
+    :raises UndecodableFileError: if a file is not valid in `encoding`.
+    """
+    jobs = utils.resolve_jobs(jobs)
+
+    func = functools.partial(file_fingerprints, encoding=encoding)
+    if jobs == 1:
+        for fingerprints in itertools.imap(func, paths):
+            for fingerprint in fingerprints:
+                yield fingerprint
+        return
+
+    pool = multiprocessing.Pool(jobs)
+    try:
+        for fingerprints in utils._imap_bounded(pool, func, paths, utils.PARSE_WINDOW_PER_JOB * jobs, ordered=False):
+            for fingerprint in fingerprints:
+                yield fingerprint
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def shingles(title):
+    """
+    Set of the words of a normalized title, leaving out `STOPWORDS` unless the title has no other words
+
+    :rtype: frozenset
+    """
+    words = frozenset(title.split())
+    return words - STOPWORDS or words
+
+
+def trigrams(title):
+    """
+    Set of the character trigrams of a normalized title
+
+    Comparing trigrams rather than words tolerates typos and plurals.
+
+    :rtype: frozenset
+    """
+    if len(title) < 3:
+        return frozenset([title]) if title else frozenset()
+    return frozenset(title[i:i + 3] for i in range(len(title) - 2))
+
+
+def _word_hashes(word):
+    """
+    Value of each hash function for `word`, memoized as titles share most of their words
+    """
+    hashes = _WORD_HASHES.get(word)
+    if hashes is None:
+        if len(_WORD_HASHES) >= MAX_WORD_HASHES:
+            _WORD_HASHES.clear()
+        h = zlib.crc32(word.encode("utf-8")) & 0xffffffff
+        hashes = _WORD_HASHES[word] = tuple((a * h + b) % _PRIME for a, b in _PERMUTATIONS)
+    return hashes
+
+
+def signature(words):
+    """
+    MinHash signature of a set of words: the least value of each hash function over the words
+
+    :param words: Non-empty set of unicode words.
+    :rtype: tuple of `BANDS * ROWS` int
+    """
+    return tuple(map(min, zip(*[_word_hashes(word) for word in words])))
+
+
+def _buckets(fingerprints, words):
+    """
+    Indices of fingerprints sharing a DOI or a band of the signature of their title words, by bucket
+    """
+    buckets = collections.defaultdict(list)
+    for i, fingerprint in enumerate(fingerprints):
+        if fingerprint.doi:
+            buckets[("doi", fingerprint.doi)].append(i)
+        if words[i]:
+            sig = signature(words[i])
+            for band in range(BANDS):
+                buckets[(band, sig[band * ROWS:(band + 1) * ROWS])].append(i)
+    return buckets
+
+
+def candidate_pairs(fingerprints, words=None, max_bucket=MAX_BUCKET):
+    """
+    Pairs of fingerprints worth scoring: those sharing a DOI or a band of the MinHash signature of their title words
+
+    A bucket of more than `max_bucket` fingerprints, such as the titles consisting only of a common word, is split by surname and year, and the parts still larger than `max_bucket` are ignored, so that no bucket costs more than `max_bucket ** 2` comparisons.
+
+    :param list fingerprints: `Fingerprint`s.
+    :param list words: Title words of each fingerprint, by `shingles`; computed if not given.
+    :param int max_bucket: Largest bucket all of whose pairs are candidates.
+    :returns: Index of each fingerprint of each pair, the first lower
+    :rtype: set of tuple
+    """
+    if words is None:
+        words = [shingles(fingerprint.title) for fingerprint in fingerprints]
+    pairs = set()
+    for bucket in _buckets(fingerprints, words).itervalues():
+        if len(bucket) < 2:
+            continue
+        if len(bucket) <= max_bucket:
+            parts = [bucket]
+        else:
+            split = collections.defaultdict(list)
+            for i in bucket:
+                split[(fingerprints[i].surname, fingerprints[i].year)].append(i)
+            parts = [part for part in split.itervalues() if len(part) <= max_bucket]
+        for part in parts:
+            pairs.update(itertools.combinations(part, 2))
+    return pairs
+
+
+def similarity(a, b, grams_a=None, grams_b=None):
+    """
+    Likelihood that two entries describe the same work, from 0 to 1
+
+    Entries with the same DOI score 1 and entries with different DOIs 0. Otherwise entries whose years or first authors' surnames are both known and differ score 0, and other entries score the Jaccard similarity of the trigrams of their titles.
+
+    :param Fingerprint a: Fingerprint of one entry.
+    :param Fingerprint b: Fingerprint of the other entry.
+    :param frozenset grams_a: Title trigrams of `a`, by `trigrams`; computed if not given.
+    :param frozenset grams_b: Title trigrams of `b`, by `trigrams`; computed if not given.
+    :rtype: float
+    """
+    if a.doi and b.doi:
+        return 1. if a.doi == b.doi else 0.
+    if (a.year and b.year and a.year != b.year) or (a.surname and b.surname and a.surname != b.surname):
+        return 0.
+    if grams_a is None:
+        grams_a = trigrams(a.title)
+    if grams_b is None:
+        grams_b = trigrams(b.title)
+    if not (grams_a and grams_b):
+        return 0.
+    return len(grams_a & grams_b) / float(len(grams_a | grams_b))
+
+
+def find_duplicates(fingerprints, threshold=THRESHOLD, max_bucket=MAX_BUCKET):
+    """
+    Groups of entries which are probably the same work
+
+    Candidate pairs from `candidate_pairs` scoring at least `threshold` by `similarity` are joined into groups; an entry is in a group if it is similar enough to any other entry of the group.
+
+    :param fingerprints: Iterable of `Fingerprint`s.
+    :param float threshold: Least `similarity` of duplicates.
+    :param int max_bucket: See `candidate_pairs`.
+    :returns: Groups of two or more fingerprints, each sorted by path, line number and key, sorted by their first fingerprint
+    :rtype: list of list
+    """
+    fingerprints = list(fingerprints)
+    words = [shingles(fingerprint.title) for fingerprint in fingerprints]
+
+    # Union-find forest of fingerprint indices
+    parents = range(len(fingerprints))
+
+    def root(i):
+        while parents[i] != i:
+            parents[i] = parents[parents[i]]
+            i = parents[i]
+        return i
+
+    # Trigrams of the fingerprints in candidate pairs, by index
+    grams = {}
+
+    def grams_of(i):
+        if i not in grams:
+            grams[i] = trigrams(fingerprints[i].title)
+        return grams[i]
+
+    for i, j in candidate_pairs(fingerprints, words, max_bucket):
+        if root(i) != root(j) and similarity(fingerprints[i], fingerprints[j], grams_of(i), grams_of(j)) >= threshold:
+            parents[root(i)] = root(j)
+
+    groups = collections.defaultdict(list)
+    for i, fingerprint in enumerate(fingerprints):
+        groups[root(i)].append(fingerprint)
+    order = lambda fingerprint: (fingerprint.path, fingerprint.lineno, fingerprint.key)
+    return sorted((sorted(group, key=order) for group in groups.itervalues() if len(group) > 1),
+                  key=lambda group: order(group[0]))
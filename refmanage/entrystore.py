@@ -0,0 +1,357 @@
+# -*- coding: utf-8 -*-
+"""
+Entry store (:mod:`refmanage.entrystore`)
+=========================================
+
+.. currentmodule:: refmanage.entrystore
+
+SQLite database of the entries of parseable files, so that entries can be searched by key, author, year, journal or words of their title and abstract without parsing the files again.
+
+Files are added with `EntryStore.update`, which parses, in parallel, only the files whose modification time or size changed since they were stored, and of those only the ones whose contents changed. Keys, author surnames, years and journals are indexed, and titles and abstracts are indexed for full-text search with FTS5, or FTS4 if the SQLite library lacks FTS5; without either, words are searched with `LIKE`.
+"""
+
+import os
+import shlex
+import locale
+import hashlib
+import sqlite3
+import functools
+import itertools
+import collections
+import multiprocessing
+import utils
+from cache import SQLiteStore
+from dupes import normalize_text
+from reffile import BibFile, mapped, decode_src_txt, format_location_msg
+
+
+# Fields of `parse_query` and the columns they search
+QUERY_FIELDS = ("key", "author", "year", "journal", "type")
+
+# Entries written to the database per transaction
+UPDATE_BATCH = 1000
+
+
+class StoredEntry(collections.namedtuple("StoredEntry", "key path lineno type title year journal authors")):
+    """
+    Entry found in an `EntryStore`
+
+    Missing fields are empty strings.
+
+    :param unicode key: Citation key.
+    :param unicode path: Resolved path to the file defining the entry.
+    :param int lineno: Line number of the entry, or `None` if unknown.
+    :param unicode type: Entry type, such as "article".
+    :param unicode title: Title, as written in the file.
+    :param unicode year: Year.
+    :param unicode journal: Journal, or else book title.
+    :param unicode authors: Authors, or else editors, as "Surname, First" joined by "and".
+    """
+    __slots__ = ()
+
+    def msg(self):
+        """
+        "path:line: key (year) title" message
+
+        :rtype: unicode
+        """
+        return format_location_msg(self.path, self.lineno, u"{0} ({1}) {2}".format(self.key, self.year, self.title))
+
+
+def _entry_record(key, entry, lineno):
+    """
+    Values stored for an entry: key, line number, type, title, year, journal, authors, abstract, normalized author surnames
+    """
+    fields = entry.fields
+    role = "author" if entry.persons.get("author") else "editor"
+    persons = entry.persons.get(role) or []
+    return (key, lineno, entry.type.lower(), fields.get("title", u""), fields.get("year", u""),
+            fields.get("journal", u"") or fields.get("booktitle", u""), u" and ".join(unicode(person) for person in persons),
+            fields.get("abstract", u""), [normalize_text(u" ".join(person.last())) for person in persons])
+
+
+def file_records(path, encoding=None, digest=None):
+    """
+    Values stored for each entry of a file, unless its contents are unchanged
+
+    Module-level so that it can be dispatched to worker processes.
+
+    :param pathlib.Path path: Path to file possibly containing BibTeX data.
+    :param str encoding: Encoding of the file; defaults to the locale's preferred encoding.
+    :param str digest: SHA-1 of the contents of the file when it was stored, if it was.
+    :returns: path, SHA-1 of the contents, records of the entries or `None` if the digest is `digest`; an unparseable file has no entries
+    :rtype: tuple
+    :raises UndecodableFileError: if the file is not valid in `encoding`.
+    """
+    with path.open("rb") as f:
+        with mapped(f) as data:
+            new_digest = hashlib.sha1(data).hexdigest()
+            if new_digest == digest:
+                return path, new_digest, None
+            src_txt = decode_src_txt(data, encoding, path)
+    reffile = utils._classify(path, src_txt)
+    if not isinstance(reffile, BibFile):
+        return path, new_digest, []
+    lines = dict(reffile.key_lines())
+    return path, new_digest, [_entry_record(key, entry, lines.get(key)) for key, entry in reffile.bib.entries.items()]
+
+
+def parse_query(query):
+    """
+    Conditions of a query such as `author:knuth year:1984-1990 "literate programming"`
+
+    Words prefixed with a field of `QUERY_FIELDS` and a colon give the value of that field; the other words are searched for in titles and abstracts. Words may be quoted as in a shell.
+
+    :param unicode query: Query.
+    :returns: field to value, with the other words under "text"
+    :rtype: dict
+    :raises ValueError: if a field is given twice, or quotes are unbalanced.
+    """
+    conditions = {}
+    words = []
+    for word in shlex.split(query.encode("utf-8")):
+        word = word.decode("utf-8")
+        field, sep, value = word.partition(u":")
+        if sep and field.lower() in QUERY_FIELDS:
+            field = field.lower()
+            if field in conditions:
+                raise ValueError("field given more than once: " + field)
+            conditions[field] = value
+        else:
+            words.append(word)
+    if words:
+        conditions["text"] = words
+    return conditions
+
+
+class EntryStore(SQLiteStore):
+    """
+    SQLite database of the entries of files
+
+    :param str path: Path to the SQLite database file, or ":memory:" for a store which is not persisted.
+    """
+    FILENAME = "entries.sqlite"
+
+    TABLES = ("files", "entries", "authors", "entries_fts", "entries_text")
+
+    @property
+    def fts(self):
+        """
+        Full-text search module used, "fts5" or "fts4", or `None` if neither is available (read-only)
+
+        :type: str
+        """
+        self._connection()
+        return self._fts
+
+
+    def __init__(self, path=None):
+        super(EntryStore, self).__init__(path)
+        self._fts = None
+
+
+    def _create(self, conn):
+        conn.execute("""CREATE TABLE IF NOT EXISTS files (
+            path TEXT PRIMARY KEY,
+            mtime_ns INTEGER,
+            size INTEGER,
+            encoding TEXT,
+            digest TEXT)""")
+        conn.execute("""CREATE TABLE IF NOT EXISTS entries (
+            id INTEGER PRIMARY KEY,
+            path TEXT,
+            key TEXT,
+            lkey TEXT,
+            lineno INTEGER,
+            type TEXT,
+            title TEXT,
+            year TEXT,
+            journal TEXT,
+            authors TEXT)""")
+        conn.execute("""CREATE TABLE IF NOT EXISTS authors (
+            entry_id INTEGER,
+            surname TEXT)""")
+        for index in ("entries (path)", "entries (lkey)", "entries (year)", "entries (journal COLLATE NOCASE)",
+                      "entries (type)", "authors (surname)", "authors (entry_id)"):
+            name = index.replace(" (", "_").split()[0].rstrip(")")
+            conn.execute("CREATE INDEX IF NOT EXISTS {0} ON {1}".format(name, index))
+
+        self._fts = None
+        row = conn.execute("SELECT sql FROM sqlite_master WHERE name = 'entries_fts'").fetchone()
+        if row is not None:
+            self._fts = "fts5" if "fts5" in row[0].lower() else "fts4"
+        else:
+            for module in ("fts5", "fts4"):
+                try:
+                    conn.execute("CREATE VIRTUAL TABLE entries_fts USING {0}(title, abstract)".format(module))
+                except sqlite3.OperationalError:
+                    continue
+                self._fts = module
+                break
+        if self._fts is None:
+            conn.execute("""CREATE TABLE IF NOT EXISTS entries_text (
+                rowid INTEGER PRIMARY KEY,
+                title TEXT,
+                abstract TEXT)""")
+
+
+    def _text_table(self):
+        return "entries_fts" if self._fts is not None else "entries_text"
+
+
+    def update(self, paths, jobs=None, encoding=None):
+        """
+        Store the entries of files which changed since they were stored, and forget files which no longer exist
+
+        :param paths: Iterable of `pathlib.Path`s to files possibly containing BibTeX data.
+        :param int jobs: Number of worker processes parsing files; defaults to the number of CPUs.
+        :param str encoding: Encoding of the files; defaults to the locale's preferred encoding.
+        :returns: Number of files parsed
+        :rtype: int
+        :raises UndecodableFileError: if a file is not valid in `encoding`.
+        """
+        jobs = utils.resolve_jobs(jobs)
+        if encoding is None:
+            encoding = locale.getpreferredencoding()
+        conn = self._connection()
+        stored = dict((row[0], row[1:]) for row in conn.execute("SELECT path, mtime_ns, size, encoding, digest FROM files"))
+
+        with conn:
+            for name in stored:
+                if not os.path.exists(name):
+                    self._forget(name)
+
+        # State of each file to check, by resolved path
+        states = {}
+
+        def changed(paths):
+            for path in paths:
+                name = unicode(path.resolve())
+                if name in states:
+                    continue
+                stat = path.stat()
+                states[name] = (int(stat.st_mtime * 10**9), stat.st_size, encoding)
+                old = stored.get(name)
+                if old is None or old[:3] != states[name]:
+                    # Unchanged contents are not parsed again, as long as they are decoded the same way
+                    yield path, old[3] if old is not None and old[2] == encoding else None
+
+        func = functools.partial(_file_records, encoding=encoding)
+        pool = None
+        if jobs == 1:
+            records = itertools.imap(func, changed(paths))
+        else:
+            pool = multiprocessing.Pool(jobs)
+            records = utils._imap_bounded(pool, func, changed(paths), utils.PARSE_WINDOW_PER_JOB * jobs, ordered=False)
+
+        num_parsed = 0
+        try:
+            pending = 0
+            conn.execute("BEGIN")
+            for path, digest, entries in records:
+                name = unicode(path.resolve())
+                conn.execute("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?)", (name,) + states[name] + (digest,))
+                if entries is None:
+                    continue
+                num_parsed += 1
+                self._forget(name, keep_file=True)
+                for key, lineno, entry_type, title, year, journal, authors, abstract, surnames in entries:
+                    entry_id = conn.execute("INSERT INTO entries VALUES (NULL, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        (name, key, key.lower(), lineno, entry_type, title, year, journal, authors)).lastrowid
+                    conn.execute("INSERT INTO {0} (rowid, title, abstract) VALUES (?, ?, ?)".format(self._text_table()),
+                        (entry_id, title, abstract))
+                    conn.executemany("INSERT INTO authors VALUES (?, ?)", ((entry_id, surname) for surname in surnames))
+                pending += len(entries)
+                if pending >= UPDATE_BATCH:
+                    conn.commit()
+                    conn.execute("BEGIN")
+                    pending = 0
+            conn.commit()
+        except:
+            conn.rollback()
+            raise
+        finally:
+            if pool is not None:
+                pool.terminate()
+                pool.join()
+        return num_parsed
+
+
+    def _forget(self, name, keep_file=False):
+        """
+        Remove the entries of the file at resolved path `name`, and the file itself unless `keep_file`
+        """
+        conn = self._conn
+        ids = "SELECT id FROM entries WHERE path = ?"
+        conn.execute("DELETE FROM {0} WHERE rowid IN ({1})".format(self._text_table(), ids), (name,))
+        conn.execute("DELETE FROM authors WHERE entry_id IN ({0})".format(ids), (name,))
+        conn.execute("DELETE FROM entries WHERE path = ?", (name,))
+        if not keep_file:
+            conn.execute("DELETE FROM files WHERE path = ?", (name,))
+
+
+    def query(self, key=None, author=None, year=None, journal=None, type=None, text=None, limit=None):
+        """
+        Entries matching all the conditions given
+
+        :param unicode key: Citation key, ignoring case.
+        :param unicode author: Surname of an author, or else editor, ignoring case and accents.
+        :param unicode year: Year, or range of years such as "1984-1990".
+        :param unicode journal: Journal, or else book title, ignoring case.
+        :param unicode type: Entry type, such as "article", ignoring case.
+        :param list text: Words all found in the title or abstract, ignoring case.
+        :param int limit: Maximum number of entries; all by default.
+        :returns: Entries sorted by path and line number
+        :rtype: list of `StoredEntry`
+        """
+        conn = self._connection()
+        conditions = []
+        params = []
+        if key is not None:
+            conditions.append("e.lkey = ?")
+            params.append(key.lower())
+        if author is not None:
+            conditions.append("e.id IN (SELECT entry_id FROM authors WHERE surname = ?)")
+            params.append(normalize_text(author))
+        if year is not None:
+            first, sep, last = year.partition(u"-")
+            if sep:
+                conditions.append("e.year BETWEEN ? AND ?")
+                params.extend([first, last])
+            else:
+                conditions.append("e.year = ?")
+                params.append(year)
+        if journal is not None:
+            conditions.append("e.journal = ? COLLATE NOCASE")
+            params.append(journal)
+        if type is not None:
+            conditions.append("e.type = ?")
+            params.append(type.lower())
+        if text:
+            if self._fts is not None:
+                conditions.append("e.id IN (SELECT rowid FROM entries_fts WHERE entries_fts MATCH ?)")
+                params.append(u" ".join(u'"{0}"'.format(word.replace(u'"', u'""')) for word in text))
+            else:
+                for word in text:
+                    conditions.append("e.id IN (SELECT rowid FROM entries_text WHERE title LIKE ? OR abstract LIKE ?)")
+                    params.extend([u"%" + word + u"%"] * 2)
+
+        sql = "SELECT e.key, e.path, e.lineno, e.type, e.title, e.year, e.journal, e.authors FROM entries e"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " ORDER BY e.path, e.lineno"
+        if limit is not None:
+            sql += " LIMIT {0:d}".format(limit)
+        return [StoredEntry(*row) for row in conn.execute(sql, params)]
+
+
+    def __len__(self):
+        return self._connection().execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+
+def _file_records(item, encoding=None):
+    """
+    `file_records` of a `(path, digest)` pair
+    """
+    path, digest = item
+    return file_records(path, encoding, digest)
@@ -0,0 +1,278 @@
+# -*- coding: utf-8 -*-
+"""
+Instrumentation hooks (:mod:`refmanage.hooks`)
+==============================================
+
+.. currentmodule:: refmanage.hooks
+
+Callbacks subscribed with `subscribe` are called with an event name and a `dict` of information as the library works:
+
+`"phase"`
+    A phase of work has finished. `name` is one of `"glob"` (expanding path arguments), `"read"` (reading a file and looking it up in the cache), `"prescan"`, `"parse"` or `"message"` (building STDOUT messages), `wall` and `cpu` are its wall-clock and CPU times in seconds, and `path` and `bytes` are set where they apply.
+
+`"file"`
+    A file has been classified. `path` is its path, `bib_type` the type of its parsed data, `cached` whether its result came from the cache.
+
+Events are emitted in the calling process, even for files parsed by worker processes. When nothing is subscribed the hooks cost a function call and a test of an empty list.
+"""
+
+import time
+import heapq
+import collections
+
+
+# Subscribed callbacks, in order of subscription
+_subscribers = []
+
+
+def subscribe(callback):
+    """
+    Call `callback(event, info)` on every event
+
+    :param callback: Callable of an event name and a `dict` of information.
+    """
+    _subscribers.append(callback)
+
+
+def unsubscribe(callback):
+    """
+    Stop calling `callback`
+
+    :param callback: Callable previously passed to `subscribe`.
+    :raises ValueError: if `callback` is not subscribed.
+    """
+    _subscribers.remove(callback)
+
+
+def active():
+    """
+    Whether anything is subscribed
+
+    :rtype: bool
+    """
+    return bool(_subscribers)
+
+
+def emit(event, **info):
+    """
+    Call subscribed callbacks with `event` and `info`
+
+    :param str event: Event name.
+    """
+    for callback in list(_subscribers):
+        callback(event, info)
+
+
+def clock():
+    """
+    Current wall-clock and CPU times
+
+    :returns: wall-clock time, CPU time
+    :rtype: tuple
+    """
+    return time.time(), time.clock()
+
+
+class _Phase(object):
+    """
+    Context manager emitting a "phase" event with its duration on exit
+    """
+    def __init__(self, name, info):
+        self.name = name
+        self.info = info
+
+
+    def __enter__(self):
+        self.start = clock()
+        return self
+
+
+    def set(self, **info):
+        """
+        Add to the information emitted with the event
+        """
+        self.info.update(info)
+
+
+    def __exit__(self, *exc_info):
+        wall, cpu = clock()
+        emit("phase", name=self.name, wall=wall - self.start[0], cpu=cpu - self.start[1], **self.info)
+
+
+class _NullPhase(object):
+    """
+    Context manager doing nothing
+    """
+    def __enter__(self):
+        return self
+
+
+    def set(self, **info):
+        pass
+
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+_NULL_PHASE = _NullPhase()
+
+
+def phase(name, **info):
+    """
+    Context manager timing a phase of work and emitting a "phase" event when it finishes
+
+    The object bound by `with` has a `set` method which adds to `info` before the event is emitted.
+
+    :param str name: Phase name.
+    :rtype: context manager
+    """
+    if not _subscribers:
+        return _NULL_PHASE
+    return _Phase(name, info)
+
+
+def timed_iter(name, iterable):
+    """
+    Generator of the items of `iterable`, emitting a "phase" event for the time taken to produce each one
+
+    :param str name: Phase name.
+    :rtype: generator
+    """
+    iterator = iter(iterable)
+    while True:
+        with phase(name):
+            item = next(iterator)
+        yield item
+
+
+class Stats(object):
+    """
+    Subscriber accumulating counts, bytes read, time per phase and the slowest files
+
+    The slowest files are those with the greatest sum of "read", "prescan" and "parse" wall-clock time.
+
+    :param int slowest: Number of slowest files kept.
+    """
+    # Phases which are attributed to individual files
+    FILE_PHASES = ("read", "prescan", "parse")
+
+    def __init__(self, slowest=10):
+        self.slowest = slowest
+        self.files = 0
+        self.cached = 0
+        self.bytes = 0
+        self.bib_types = collections.Counter()
+        self.wall = collections.Counter()
+        self.cpu = collections.Counter()
+        self.counts = collections.Counter()
+        self._file_times = collections.Counter()
+        self._heap = []
+        self._start = clock()
+        self._end = None
+
+
+    def __call__(self, event, info):
+        if event == "phase":
+            name = info["name"]
+            self.wall[name] += info["wall"]
+            self.cpu[name] += info["cpu"]
+            self.counts[name] += 1
+            self.bytes += info.get("bytes", 0)
+            if name in self.FILE_PHASES:
+                self._file_times[info["path"]] += info["wall"]
+        elif event == "file":
+            self.files += 1
+            self.cached += info["cached"]
+            self.bib_types[info["bib_type"].__name__] += 1
+            wall = self._file_times.pop(info["path"], 0.)
+            item = (wall, unicode(info["path"]))
+            if len(self._heap) < self.slowest:
+                heapq.heappush(self._heap, item)
+            elif self.slowest:
+                heapq.heappushpop(self._heap, item)
+
+
+    def stop(self):
+        """
+        Record the end of the run
+        """
+        self._end = clock()
+
+
+    def as_dict(self):
+        """
+        Accumulated statistics
+
+        :rtype: dict
+        """
+        end = self._end or clock()
+        return {"files": self.files,
+                "cached": self.cached,
+                "bytes": self.bytes,
+                "bib_types": dict(self.bib_types),
+                "wall": end[0] - self._start[0],
+                "cpu": end[1] - self._start[1],
+                "phases": dict((name, {"count": self.counts[name], "wall": self.wall[name], "cpu": self.cpu[name]})
+                               for name in self.counts),
+                "slowest": [{"path": path, "wall": wall} for wall, path in sorted(self._heap, reverse=True)]}
+
+
+    def format(self):
+        """
+        Accumulated statistics as human-readable text
+
+        CPU times of phases run in worker processes are those of the workers.
+
+        :rtype: unicode
+        """
+        stats = self.as_dict()
+        lines = [u"files: {0} ({1} cached), {2} bytes read".format(stats["files"], stats["cached"], stats["bytes"])]
+        lines += [u"{0}: {1}".format(name, count) for name, count in sorted(stats["bib_types"].items())]
+        lines.append(u"total: {0:.3f} s wall, {1:.3f} s cpu".format(stats["wall"], stats["cpu"]))
+        lines.append(u"{0:<10} {1:>8} {2:>10} {3:>10}".format(u"phase", u"count", u"wall (s)", u"cpu (s)"))
+        for name, phase_stats in sorted(stats["phases"].items(), key=lambda item: -item[1]["wall"]):
+            lines.append(u"{0:<10} {1:>8} {2:>10.3f} {3:>10.3f}".format(
+                name, phase_stats["count"], phase_stats["wall"], phase_stats["cpu"]))
+        if stats["slowest"]:
+            lines.append(u"slowest files:")
+            lines += [u"{0:>10.3f} {1}".format(item["wall"], item["path"]) for item in stats["slowest"]]
+        return u"\n".join(lines) + u"\n"
+
+
+class FileTimes(object):
+    """
+    Subscriber recording, for each file, the bytes read and the wall-clock time spent prescanning and parsing it
+
+    The phases of a file are summed until its "file" event, and the sums kept until taken with `pop`.
+    """
+    def __init__(self):
+        self._pending = collections.defaultdict(lambda: [0., 0])
+        self._done = {}
+
+
+    def __call__(self, event, info):
+        if event == "phase":
+            name = info["name"]
+            if name in Stats.FILE_PHASES:
+                times = self._pending[info["path"]]
+                if name != "read":
+                    times[0] += info["wall"]
+                times[1] += info.get("bytes", 0)
+        elif event == "file":
+            times = self._pending.pop(info["path"], None)
+            if times is not None:
+                self._done[info["path"]] = (times[0], times[1], info["cached"])
+
+
+    def pop(self, path):
+        """
+        Times recorded for the file at `path`, forgetting them
+
+        Files whose results were shared with byte-identical files have no times of their own.
+
+        :param pathlib.Path path: Path to file.
+        :returns: seconds prescanning and parsing, bytes read, whether the result came from the cache; or `None` if nothing was recorded
+        :rtype: tuple
+        """
+        return self._done.pop(path, None)
@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+"""
+Citation key index (:mod:`refmanage.keyindex`)
+==============================================
+
+.. currentmodule:: refmanage.keyindex
+
+Index of the citation keys defined across many files, to find keys defined more than once and where a key is defined.
+
+BibTeX treats keys differing only in case as the same key, so keys are indexed by their lower-cased form, and keys differing only in case collide. The keys of each file, with the line numbers of their entries, come from its `ParseResult`, so changed files are parsed in parallel and the parse cache is used. The index is persisted in an SQLite database in which the keys of a file are replaced only when its modification time, size or encoding changes; looking a key up is a single query on an index of the lower-cased keys.
+"""
+
+import os
+import locale
+import collections
+import pathlib2 as pathlib
+import utils
+from cache import SQLiteStore
+from reffile import format_location_msg
+
+
+class KeyLocation(collections.namedtuple("KeyLocation", "key path lineno")):
+    """
+    Where a citation key is defined
+
+    :param unicode key: Citation key, as spelled in the file.
+    :param unicode path: Resolved path to the file.
+    :param int lineno: Line number of the entry, or `None` if unknown.
+    """
+    __slots__ = ()
+
+    def msg(self):
+        """
+        "path:line: key" message
+
+        :rtype: unicode
+        """
+        return format_location_msg(self.path, self.lineno, self.key)
+
+
+def collisions(index):
+    """
+    Keys defined more than once, ignoring case
+
+    :param dict index: Lower-cased key to list of `KeyLocation`s, as returned by `KeyIndex.update`.
+    :returns: lower-cased key, locations sorted by path and line of each key defined more than once, sorted by key
+    :rtype: list of tuple
+    """
+    return sorted((lkey, sorted(locations, key=lambda location: (location.path, location.lineno)))
+                  for lkey, locations in index.iteritems() if len(locations) > 1)
+
+
+class KeyIndex(SQLiteStore):
+    """
+    SQLite database of the citation keys defined in files
+
+    :param str path: Path to the SQLite database file, or ":memory:" for an index which is not persisted.
+    """
+    FILENAME = "keys.sqlite"
+
+    TABLES = ("files", "keys")
+
+    def _create(self, conn):
+        conn.execute("""CREATE TABLE IF NOT EXISTS files (
+            path TEXT PRIMARY KEY,
+            mtime_ns INTEGER,
+            size INTEGER,
+            encoding TEXT)""")
+        conn.execute("""CREATE TABLE IF NOT EXISTS keys (
+            lkey TEXT,
+            key TEXT,
+            path TEXT,
+            lineno INTEGER)""")
+        conn.execute("CREATE INDEX IF NOT EXISTS keys_lkey ON keys (lkey)")
+        conn.execute("CREATE INDEX IF NOT EXISTS keys_path ON keys (path)")
+
+
+    def update(self, paths, jobs=None, cache=None, encoding=None):
+        """
+        Index the keys of files which changed since they were last indexed, and collect the keys of all of them
+
+        :param paths: Iterable of `pathlib.Path`s to files possibly containing BibTeX data.
+        :param int jobs: Number of worker processes parsing files; defaults to the number of CPUs.
+        :param ParseCache cache: Cache of parse results; defaults to no caching.
+        :param str encoding: Encoding of the files; defaults to the locale's preferred encoding.
+        :returns: Lower-cased key to the `KeyLocation`s of the key in the files of `paths`
+        :rtype: dict
+        :raises UndecodableFileError: if a file is not valid in `encoding`.
+        """
+        if encoding is None:
+            encoding = locale.getpreferredencoding()
+        conn = self._connection()
+        indexed = dict((row[0], tuple(row[1:])) for row in conn.execute("SELECT path, mtime_ns, size, encoding FROM files"))
+
+        # Resolved paths, without repeats, and the state of those to index again
+        resolved = collections.OrderedDict()
+        stale = {}
+        for path in paths:
+            name = unicode(path.resolve())
+            if name in resolved:
+                continue
+            stat = path.stat()
+            resolved[name] = (int(stat.st_mtime * 10**9), stat.st_size, encoding)
+            if indexed.get(name) != resolved[name]:
+                stale[name] = resolved[name]
+
+        results = list(utils.iter_parse_results((pathlib.Path(name) for name in stale), jobs, cache,
+            ordered=False, encoding=encoding, keys=True))
+
+        with conn:
+            for result in results:
+                name = unicode(result.path)
+                conn.execute("DELETE FROM keys WHERE path = ?", (name,))
+                conn.executemany("INSERT INTO keys VALUES (?, ?, ?, ?)",
+                    ((key.lower(), key, name, lineno) for key, lineno in result.keys or ()))
+                conn.execute("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)", (name,) + stale[name])
+
+        index = {}
+        for name in resolved:
+            for key, lineno in conn.execute("SELECT key, lineno FROM keys WHERE path = ? ORDER BY rowid", (name,)):
+                index.setdefault(key.lower(), []).append(KeyLocation(key, name, lineno))
+        return index
+
+
+    def lookup(self, key):
+        """
+        Where `key`, or a key differing from it only in case, is defined in the files indexed
+
+        Files which have been removed since they were indexed are left out; files which have changed are not indexed again.
+
+        :param unicode key: Citation key.
+        :rtype: list of `KeyLocation`
+        """
+        rows = self._connection().execute(
+            "SELECT key, path, lineno FROM keys WHERE lkey = ? ORDER BY path, lineno", (key.lower(),))
+        return [KeyLocation(*row) for row in rows if os.path.exists(row[1])]
+
+
+    def __len__(self):
+        return self._connection().execute("SELECT COUNT(*) FROM keys").fetchone()[0]
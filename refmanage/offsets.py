@@ -0,0 +1,283 @@
+# -*- coding: utf-8 -*-
+"""
+Byte-offset index (:mod:`refmanage.offsets`)
+============================================
+
+.. currentmodule:: refmanage.offsets
+
+Index of where each command of BibTeX files starts and ends, so that single entries can be read by seeking instead of parsing whole files.
+
+Files are split into commands by `refmanage.stream.iter_chunks` working on their raw bytes, which tracks nesting but does not parse, so indexing a file is much cheaper than parsing it. Only files in ASCII-compatible encodings can be split this way; see `refmanage.stream.is_ascii_compatible`. The index is persisted in an SQLite database in which the spans of a file are replaced only when its modification time, size or encoding changes, and the SHA-1 digest of each command is kept so that readers can tell whether it changed without these.
+
+Files found parseable by a whole-file parse are recorded as such, so that `refmanage.reffile.BibFile.open` can later give their entries without parsing them again.
+"""
+
+import locale
+import hashlib
+import functools
+import itertools
+import collections
+import multiprocessing
+import utils
+from cache import SQLiteStore
+from stream import BLOCK_SIZE, HEADER, iter_chunks, is_ascii_compatible, _chunk_key
+
+
+ENTRY = "entry"
+STRING = "string"
+PREAMBLE = "preamble"
+
+
+class Span(collections.namedtuple("Span", "path kind key offset length lineno digest")):
+    """
+    Where a command is in a file
+
+    :param unicode path: Resolved path to the file.
+    :param str kind: `ENTRY`, `STRING` or `PREAMBLE`.
+    :param unicode key: Citation key of an entry, or `None`.
+    :param int offset: Offset in bytes of the "@" starting the command.
+    :param int length: Length in bytes of the command.
+    :param int lineno: Line number of the "@" starting the command.
+    :param str digest: SHA-1 digest of the raw contents of the command.
+    """
+    __slots__ = ()
+
+    def read(self, f):
+        """
+        Raw contents of the command
+
+        :param file f: The file, opened in binary mode.
+        :rtype: str
+        """
+        f.seek(self.offset)
+        return f.read(self.length)
+
+
+    def matches(self, data):
+        """
+        Whether `data`, as returned by `read`, is the command as it was indexed
+
+        :param str data: Raw contents.
+        :rtype: bool
+        """
+        return hashlib.sha1(data).hexdigest() == self.digest
+
+
+def scan_file(path, encoding=None, block_size=BLOCK_SIZE):
+    """
+    Spans of the commands of a file, in order
+
+    Module-level so that it can be dispatched to worker processes. Commands which are not entries, strings or preambles, such as malformed ones, are left out, as are entries without a key.
+
+    :param pathlib.Path path: Path to file containing BibTeX.
+    :param str encoding: Encoding of the file; defaults to the locale's preferred encoding.
+    :param int block_size: Bytes read at a time.
+    :rtype: list of `Span`
+    :raises ValueError: if `encoding` is not ASCII-compatible.
+    :raises UndecodableFileError: if a key is not valid in `encoding`.
+    """
+    if encoding is None:
+        encoding = locale.getpreferredencoding()
+    if not is_ascii_compatible(encoding):
+        raise ValueError("cannot index files in {0}, which is not ASCII-compatible".format(encoding))
+    name = unicode(path.resolve())
+    spans = []
+    with path.open("rb") as f:
+        for offset, lineno, chunk in iter_chunks(iter(functools.partial(f.read, block_size), b"")):
+            m = HEADER.match(chunk, 1)
+            if m is None:
+                continue
+            command = m.group(1).lower()
+            if command in (STRING, PREAMBLE):
+                spans.append(Span(name, command, None, offset, len(chunk), lineno, hashlib.sha1(chunk).hexdigest()))
+                continue
+            key = _chunk_key(chunk)
+            if key is not None:
+                try:
+                    key = key.decode(encoding)
+                except UnicodeDecodeError:
+                    continue
+                spans.append(Span(name, ENTRY, key, offset, len(chunk), lineno, hashlib.sha1(chunk).hexdigest()))
+    return spans
+
+
+def file_state(path, encoding=None):
+    """
+    Modification time, size and encoding of a file, which the spans of a file are valid for
+
+    :param pathlib.Path path: Path to the file.
+    :param str encoding: Encoding of the file; defaults to the locale's preferred encoding.
+    :rtype: tuple
+    """
+    if encoding is None:
+        encoding = locale.getpreferredencoding()
+    stat = path.stat()
+    return (int(stat.st_mtime * 10**9), stat.st_size, encoding)
+
+
+def _scanned(path, encoding=None):
+    """
+    `path` and its `scan_file` spans
+    """
+    return path, scan_file(path, encoding)
+
+
+class OffsetIndex(SQLiteStore):
+    """
+    SQLite database of the spans of the commands of files
+
+    :param str path: Path to the SQLite database file, or ":memory:" for an index which is not persisted.
+    """
+    FILENAME = "offsets.sqlite"
+
+    SCHEMA_VERSION = 3
+
+    TABLES = ("files", "spans")
+
+    def _create(self, conn):
+        conn.execute("""CREATE TABLE IF NOT EXISTS files (
+            path TEXT PRIMARY KEY,
+            mtime_ns INTEGER,
+            size INTEGER,
+            encoding TEXT,
+            parseable INTEGER)""")
+        conn.execute("""CREATE TABLE IF NOT EXISTS spans (
+            path TEXT,
+            kind TEXT,
+            lkey TEXT,
+            key TEXT,
+            offset INTEGER,
+            length INTEGER,
+            lineno INTEGER,
+            digest TEXT)""")
+        conn.execute("CREATE INDEX IF NOT EXISTS spans_lkey ON spans (lkey)")
+        conn.execute("CREATE INDEX IF NOT EXISTS spans_path ON spans (path, kind)")
+
+
+    def update(self, paths, jobs=None, encoding=None):
+        """
+        Index the files which changed since they were last indexed
+
+        :param paths: Iterable of `pathlib.Path`s to files containing BibTeX.
+        :param int jobs: Number of worker processes scanning files; defaults to the number of CPUs.
+        :param str encoding: Encoding of the files; defaults to the locale's preferred encoding.
+        :returns: Resolved paths of the files, without repeats, in the order given
+        :rtype: list of unicode
+        :raises ValueError: if `encoding` is not ASCII-compatible.
+        """
+        jobs = utils.resolve_jobs(jobs)
+        if encoding is None:
+            encoding = locale.getpreferredencoding()
+        if not is_ascii_compatible(encoding):
+            raise ValueError("cannot index files in {0}, which is not ASCII-compatible".format(encoding))
+        conn = self._connection()
+        indexed = dict((row[0], tuple(row[1:])) for row in conn.execute("SELECT path, mtime_ns, size, encoding FROM files"))
+
+        # Resolved paths, without repeats, and the state of those to index again
+        resolved = collections.OrderedDict()
+        stale = collections.OrderedDict()
+        for path in paths:
+            name = unicode(path.resolve())
+            if name in resolved:
+                continue
+            resolved[name] = file_state(path, encoding)
+            if indexed.get(name) != resolved[name]:
+                stale[name] = path
+
+        func = functools.partial(_scanned, encoding=encoding)
+        pool = None
+        if jobs == 1 or len(stale) < 2:
+            scanned = itertools.imap(func, stale.itervalues())
+        else:
+            pool = multiprocessing.Pool(jobs)
+            scanned = utils._imap_bounded(pool, func, stale.itervalues(), utils.PARSE_WINDOW_PER_JOB * jobs, ordered=False)
+        try:
+            with conn:
+                for path, spans in scanned:
+                    name = unicode(path.resolve())
+                    self._store(name, spans, resolved[name], None)
+        finally:
+            if pool is not None:
+                pool.terminate()
+                pool.join()
+        return list(resolved)
+
+
+    def _store(self, name, spans, state, parseable):
+        """
+        Replace the spans of the file at resolved path `name`, in the current transaction
+        """
+        conn = self._conn
+        conn.execute("DELETE FROM spans WHERE path = ?", (name,))
+        conn.executemany("INSERT INTO spans VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            ((name, span.kind, span.key and span.key.lower(), span.key, span.offset, span.length, span.lineno, span.digest)
+             for span in spans))
+        conn.execute("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?)", (name,) + state + (parseable,))
+
+
+    def record(self, path, spans, state):
+        """
+        Store the spans of a file found parseable by a whole-file parse
+
+        :param pathlib.Path path: Path to the file.
+        :param list spans: `Span`s of the file, as returned by `scan_file`.
+        :param tuple state: State of the file before it was parsed, as returned by `file_state`; if it changed since, `file_spans` ignores the spans.
+        """
+        conn = self._connection()
+        with conn:
+            self._store(unicode(path.resolve()), spans, state, 1)
+
+
+    def file_spans(self, path, encoding=None, kinds=None):
+        """
+        Spans of a file recorded with `record`, if the file has not changed since
+
+        :param pathlib.Path path: Path to the file.
+        :param str encoding: Encoding of the file; defaults to the locale's preferred encoding.
+        :param tuple kinds: Kinds of commands given; all by default.
+        :returns: Spans in order, or `None` if the file was not recorded as parseable or its modification time, size or encoding changed since
+        :rtype: list of `Span`
+        """
+        name = unicode(path.resolve())
+        row = self._connection().execute(
+            "SELECT mtime_ns, size, encoding FROM files WHERE path = ? AND parseable", (name,)).fetchone()
+        if row is None or tuple(row) != file_state(path, encoding):
+            return None
+        return self.spans(name, kinds)
+
+
+    def lookup(self, key, paths=None):
+        """
+        Spans of the entries whose key is `key`, ignoring case
+
+        :param unicode key: Citation key.
+        :param list paths: Resolved paths of the files to look in, in order of precedence; all files indexed, in no particular order, by default.
+        :returns: Spans, in the order of `paths` then of the files
+        :rtype: list of `Span`
+        """
+        spans = [Span(*row) for row in self._connection().execute(
+            "SELECT path, kind, key, offset, length, lineno, digest FROM spans WHERE lkey = ? ORDER BY offset", (key.lower(),))]
+        if paths is None:
+            return spans
+        order = dict((name, n) for n, name in enumerate(paths))
+        return sorted((span for span in spans if span.path in order), key=lambda span: order[span.path])
+
+
+    def spans(self, path, kinds=None):
+        """
+        Spans of the commands of a file, in order
+
+        :param unicode path: Resolved path to the file.
+        :param tuple kinds: Kinds of commands given; all by default.
+        :rtype: list of `Span`
+        """
+        sql = "SELECT path, kind, key, offset, length, lineno, digest FROM spans WHERE path = ?"
+        params = [path]
+        if kinds is not None:
+            sql += " AND kind IN ({0})".format(", ".join("?" * len(kinds)))
+            params.extend(kinds)
+        return [Span(*row) for row in self._connection().execute(sql + " ORDER BY offset", params)]
+
+
+    def __len__(self):
+        return self._connection().execute("SELECT COUNT(*) FROM spans").fetchone()[0]
@@ -0,0 +1,227 @@
+# -*- coding: utf-8 -*-
+"""
+Fast parseability check (:mod:`refmanage.prescan`)
+==================================================
+
+.. currentmodule:: refmanage.prescan
+
+Decide whether pybtex would accept a BibTeX string without building pybtex's `Entry` and `Person` objects.
+
+The scanner mirrors the grammar of `pybtex.database.input.bibtex.BibTeXEntryIterator` token by token, but matches each field value with a single regular expression and only checks the things pybtex's `Parser` can reject: syntax, undefined macros, repeated keys and the comma structure of names in person fields. Whenever it cannot be sure of pybtex's decision it gives up and returns `None`, so the caller falls back to the real parser.
+"""
+
+import re
+from string import digits
+from pybtex.bibtex.utils import split_name_list, split_tex_string
+from pybtex.database import Person
+from pybtex.database.input.bibtex import BibTeXEntryIterator, month_names
+from pybtex.textutils import normalize_whitespace
+
+
+# Deepest nesting of braces within a field value handled by the scanner
+MAX_BRACE_DEPTH = 8
+
+_NAME_CHARS = BibTeXEntryIterator.NAME_CHARS
+_NAME = u"[{0}][{1}]*".format(re.escape(_NAME_CHARS), re.escape(_NAME_CHARS + digits))
+
+
+def _braced(depth):
+    """
+    Pattern of a brace-delimited string containing at most `depth` levels of nested braces
+    """
+    if depth == 0:
+        return ur"\{[^{}]*\}"
+    inner = _braced(depth - 1)
+    return ur"\{[^{}]*(?:" + inner + ur"[^{}]*)*\}"
+
+
+_BRACED = _braced(MAX_BRACE_DEPTH)
+
+# Each pattern eats leading whitespace, as `pybtex.scanner.Scanner.get_token` does. Entry keys are matched atomically (lookahead plus backreference) so that backtracking never accepts a shorter key than pybtex's scanner would.
+WS_NAME = re.compile(ur"\s*(" + _NAME + ur")")
+WS_OPEN = re.compile(ur"\s*([({])")
+WS_KEY_BRACE = re.compile(ur"\s*(?=([^\s,}]+))\1")
+WS_KEY_PAREN = re.compile(ur"\s*(?=([^\s,]+))\1")
+WS_EQUALS = re.compile(ur"\s*=")
+WS_HASH = re.compile(ur"\s*#")
+WS_COMMA = re.compile(ur"\s*,")
+WS_CLOSE = {u"{": re.compile(ur"\s*\}"), u"(": re.compile(ur"\s*\)")}
+WS_STRING_START = re.compile(ur'\s*["{]')
+WS_VALUE_PART = re.compile(
+    ur'\s*(?:"([^"{}]*(?:' + _BRACED + ur'[^"{}]*)*)"'
+    ur"|\{([^{}]*(?:" + _BRACED + ur"[^{}]*)*)\}"
+    ur"|([0-9]+)"
+    ur"|(" + _NAME + ur"))")
+
+# Person field values which need pybtex's own name splitting functions
+SLOW_NAMES = re.compile(ur"(?u)[{}~]|[^\S ]| and and ")
+
+PERSON_FIELDS = frozenset(role.lower() for role in Person.valid_roles)
+
+
+class _Uncertain(Exception):
+    """
+    Raised when the scanner cannot predict pybtex's decision
+    """
+    pass
+
+
+class _Rejected(Exception):
+    """
+    Raised when pybtex is certain to reject the input
+    """
+    pass
+
+
+def _match(pattern, text, pos):
+    """
+    Match `pattern` at `pos`, rejecting the input if it does not match
+    """
+    m = pattern.match(text, pos)
+    if m is None:
+        raise _Rejected()
+    return m
+
+
+def _value(text, pos, macros):
+    """
+    Scan a field value starting at `pos`
+
+    :returns: position after the value, flattened value
+    :rtype: tuple
+    """
+    parts = []
+    while True:
+        m = WS_VALUE_PART.match(text, pos)
+        if m is None:
+            if WS_STRING_START.match(text, pos):
+                # Either a syntax error or braces nested too deeply to tell
+                raise _Uncertain()
+            raise _Rejected()
+        quoted, braced, number, macro = m.groups()
+        if macro is not None:
+            try:
+                parts.append(macros[macro.lower()])
+            except KeyError:
+                raise _Rejected()
+        else:
+            parts.append(quoted if quoted is not None else braced if braced is not None else number)
+        pos = m.end()
+
+        m = WS_HASH.match(text, pos)
+        if m is None:
+            return pos, u"".join(parts)
+        pos = m.end()
+
+
+def _check_names(value):
+    """
+    Check a person field value as `pybtex.database.Person` would parse it
+    """
+    value = normalize_whitespace(value)
+
+    if not SLOW_NAMES.search(value):
+        # Without braces, tildes, non-ASCII whitespace or consecutive "and"s, `split_name_list` is `str.split` and a name has one more part than it has commas away from its ends.
+        for name in value.split(u" and "):
+            if name[1:-1].count(u",") > 2:
+                raise _Rejected()
+        return
+
+    for name in split_name_list(value):
+        if not name:
+            continue
+        parts = split_tex_string(name, ",")
+        if len(parts) > 3 or not parts:
+            raise _Rejected()
+        # pybtex fails with a non-PybtexError on names with an empty last name component
+        if not split_tex_string(parts[0] if len(parts) > 1 else name):
+            raise _Uncertain()
+
+
+def quick_verdict(src_txt):
+    """
+    Whether pybtex would parse `src_txt` without error
+
+    :param unicode src_txt: BibTeX source.
+    :returns: `True` if pybtex accepts `src_txt`, `False` if it rejects it, `None` if the scanner cannot tell.
+    :rtype: bool or None
+    """
+    return quick_scan(src_txt)[0]
+
+
+def quick_scan(src_txt):
+    """
+    Whether pybtex would parse `src_txt` without error, and if so, how many entries it would give
+
+    :param unicode src_txt: BibTeX source.
+    :returns: verdict as from `quick_verdict`, number of entries if the verdict is `True` (else `None`)
+    :rtype: tuple
+    """
+    try:
+        num_entries = _scan(src_txt)
+    except _Rejected:
+        return False, None
+    except _Uncertain:
+        return None, None
+    return True, num_entries
+
+
+def _scan(text):
+    """
+    Scan `text`, raising `_Rejected` or `_Uncertain` where pybtex's decision is known to be rejection or is unknown
+
+    :returns: number of entries
+    :rtype: int
+    """
+    macros = dict((name.lower(), value) for name, value in month_names.items())
+    keys = set()
+    num_entries = 0
+
+    pos = 0
+    while True:
+        pos = text.find(u"@", pos)
+        if pos < 0:
+            return num_entries
+        pos += 1
+
+        m = _match(WS_NAME, text, pos)
+        command = m.group(1).lower()
+        m = _match(WS_OPEN, text, m.end())
+        body_start = m.group(1)
+        pos = m.end()
+
+        if command == u"comment":
+            continue
+        elif command == u"preamble":
+            pos, value = _value(text, pos, macros)
+        elif command == u"string":
+            m = _match(WS_NAME, text, pos)
+            name = m.group(1).lower()
+            pos = _match(WS_EQUALS, text, m.end()).end()
+            pos, value = _value(text, pos, macros)
+            macros[name] = value
+        else:
+            key_pattern = WS_KEY_BRACE if body_start == u"{" else WS_KEY_PAREN
+            m = _match(key_pattern, text, pos)
+            key = m.group(1).lower()
+            pos = m.end()
+
+            while True:
+                m = WS_NAME.match(text, pos)
+                if m is not None:
+                    field = m.group(1).lower()
+                    pos = _match(WS_EQUALS, text, m.end()).end()
+                    pos, value = _value(text, pos, macros)
+                    if field in PERSON_FIELDS:
+                        _check_names(value)
+                m = WS_COMMA.match(text, pos)
+                if m is None:
+                    break
+                pos = m.end()
+
+            if key in keys:
+                raise _Rejected()
+            keys.add(key)
+            num_entries += 1
+
+        pos = _match(WS_CLOSE[body_start], text, pos).end()
@@ -11,3 +11,15 @@ class ParseableBibtexError(Exception):
     Raised when BibTeX parsing succeeds when it should fail
     """
     pass
+
+class UndecodableFileError(Exception):
+    """
+    Raised when the contents of a file cannot be decoded with the requested encoding
+    """
+    pass
+
+class ParseCancelledError(Exception):
+    """
+    Raised when the results of a cancelled background parse are requested
+    """
+    pass
@@ -1,10 +1,161 @@
 # -*- coding: utf-8 -*-
+import mmap
+import codecs
+import locale
 import StringIO
+import contextlib
 import pathlib2 as pathlib
+from pybtex.database import BibliographyData
 from pybtex.database.input import bibtex
 from pybtex.exceptions import PybtexError
 from pybtex.scanner import TokenRequired
-from ref_exceptions import UnparseableBibtexError, ParseableBibtexError
+from pybtex.utils import CaseInsensitiveDict
+from ref_exceptions import UnparseableBibtexError, ParseableBibtexError, UndecodableFileError
+
+
+@contextlib.contextmanager
+def mapped(f):
+    """
+    Context manager giving the contents of an open file as a read-only memory map
+
+    Mapping avoids copying the contents into memory before they are decoded. Files which cannot be mapped, such as empty files and pipes, are read instead.
+
+    :param file f: File opened in binary mode.
+    :returns: `mmap.mmap` or `str`, closed on exit
+    """
+    try:
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (ValueError, EnvironmentError):
+        yield f.read()
+        return
+    try:
+        yield data
+    finally:
+        data.close()
+
+
+def decode_src_txt(data, encoding=None, path=None, offset=0, lineno=1):
+    """
+    Decode the raw contents of a file as `pathlib.Path.open` would
+
+    The contents are decoded in a single step and newlines are translated as in universal newlines mode, which copies the decoded text only if it contains carriage returns.
+
+    :param data: Raw contents of a file containing BibTeX, as `str` or `mmap.mmap`.
+    :param str encoding: Encoding of `data`; defaults to the locale's preferred encoding.
+    :param pathlib.Path path: Path to the file, for error messages.
+    :param int offset: Byte offset of `data` within the file, for error messages.
+    :param int lineno: Line number of the start of `data` within the file, for error messages.
+    :rtype: unicode
+    :raises UndecodableFileError: if `data` is not valid in `encoding`.
+    """
+    if encoding is None:
+        encoding = locale.getpreferredencoding()
+    try:
+        src_txt, length = codecs.getdecoder(encoding)(data)
+    except UnicodeDecodeError, e:
+        msg = "{0} is not valid {1}: byte 0x{2:02x} at offset {3} (line {4})".format(
+            path if path is not None else "data", encoding,
+            ord(e.object[e.start]), offset + e.start, lineno + data[:e.start].count(b"\n"))
+        raise UndecodableFileError(msg)
+
+    if u"\r" in src_txt:
+        src_txt = src_txt.replace(u"\r\n", u"\n").replace(u"\r", u"\n")
+    return src_txt
+
+
+def load_src_txt(path, encoding=None):
+    """
+    Read and decode the file at `path`
+
+    The file is memory-mapped and decoded once; see `mapped` and `decode_src_txt`.
+
+    :param pathlib.Path path: Path to file containing BibTeX.
+    :param str encoding: Encoding of the file; defaults to the locale's preferred encoding.
+    :rtype: unicode
+    :raises UndecodableFileError: if the file is not valid in `encoding`.
+    """
+    with path.open("rb") as f:
+        with mapped(f) as data:
+            return decode_src_txt(data, encoding, path)
+
+
+def parse_bib_txt(src_txt):
+    """
+    Parse a string containing BibTeX
+
+    Parsing failures are returned rather than raised so that the caller can decide which `RefFile` child class to construct from a single parse.
+
+    :param unicode src_txt: BibTeX source.
+    :returns: Bibliography data, or the exception raised upon parsing.
+    :rtype: `pybtex.database.BibliographyData` or `pybtex.exceptions.PybtexError`
+    """
+    parser = bibtex.Parser()
+    try:
+        bib = parser.parse_stream(StringIO.StringIO(src_txt))
+    except PybtexError, e:
+        bib = e
+
+    return bib
+
+
+def error_info(error):
+    """
+    Information about an exception raised upon parsing
+
+    Only `pybtex.scanner.TokenRequired` errors carry an error type, line number and context; these elements are `None` for other errors.
+
+    :param pybtex.exceptions.PybtexError error: Parsing error.
+    :returns: error type, message, line number, context
+    :rtype: tuple
+    """
+    if isinstance(error, TokenRequired):
+        return (error.error_type, error.message, error.lineno, error.get_context())
+    else:
+        return (None, error.message, None, None)
+
+
+def format_error_msg(error_type, message, lineno, context):
+    """
+    Format information about a parsing error for STDOUT
+
+    Errors without an error type are formatted as their message, followed by their line number if known.
+
+    :param str error_type: Type of parsing error, or `None`.
+    :param unicode message: Parsing error message.
+    :param int lineno: Line number of parsing error, or `None`.
+    :param unicode context: Source context of parsing error, or `None`.
+    :rtype: unicode
+    """
+    msg = u""
+    if error_type is not None:
+        msg += error_type + ": "
+        msg += message + "\n"
+        msg += str(lineno) + " "
+        msg += context
+    else:
+        msg += message
+        if lineno is not None:
+            msg += u" (line {0})".format(lineno)
+
+    return msg
+
+
+def format_location_msg(path, lineno, msg):
+    """
+    Prefix a message with where in a file it applies, as "path:line: msg"
+
+    The line number is left out if unknown, and the whole prefix if `path` is `None`.
+
+    :param unicode path: Path to the file, or `None` for content given in memory.
+    :param int lineno: Line number, or `None`.
+    :param unicode msg: Message.
+    :rtype: unicode
+    """
+    if path is None:
+        return unicode(msg)
+    if lineno is None:
+        return u"{0}: {1}".format(path, msg)
+    return u"{0}:{1}: {2}".format(path, lineno, msg)
 
 
 class RefFile(object):
@@ -14,13 +165,23 @@ class RefFile(object):
     @property
     def path(self):
         """
-        Path to file containing BibTeX (read-only)
+        Path to file containing BibTeX, or `None` for content given in memory (read-only)
 
         :type: `pathlib.Path`
         """
         return self._path
 
 
+    @property
+    def name(self):
+        """
+        Name of content given in memory, used in messages in place of the path, or `None` (read-only)
+
+        :type: unicode
+        """
+        return self._name
+
+
     @property
     def bib(self):
         """
@@ -31,23 +192,84 @@ class RefFile(object):
         raise NotImplementedError()
 
 
+    @property
+    def bib_type(self):
+        """
+        Type of `self.bib` (read-only)
+
+        :type: `type`
+        """
+        return type(self.bib)
+
+
     @property
     def src_txt(self):
         """
         String representation of source BibTeX data (read-only)
 
+        Read when first used if the file was opened with `BibFile.open`.
+
         :type: `str`
         """
+        if self._src_txt is None:
+            self._src_txt = load_src_txt(self.path, self._encoding)
         return self._src_txt
 
 
-    def __init__(self, path):
+    def __init__(self, path, src_txt=None, bib=None, encoding=None, name=None):
         self._path = path
-        with self.path.open() as f: self._src_txt = f.read()
-        self._parse_bib_file()
+        self._name = name
+        self._encoding = encoding
+        if src_txt is None:
+            src_txt = load_src_txt(self.path, encoding)
+        self._src_txt = src_txt
+        if bib is None:
+            bib = self._parse_bib_file()
+        self._set_bib(bib)
+
+
+    @classmethod
+    def from_bytes(cls, data, name=u"<bytes>", encoding=None):
+        """
+        Construct from the raw contents of a file held in memory, without touching the filesystem
+
+        :param str data: Raw BibTeX source.
+        :param unicode name: Name of the content, used in messages.
+        :param str encoding: Encoding of `data`; defaults to the locale's preferred encoding.
+        :raises UndecodableFileError: if `data` is not valid in `encoding`.
+        """
+        return cls(None, decode_src_txt(data, encoding, name), name=name)
+
+
+    @classmethod
+    def from_stream(cls, fileobj, name=None, encoding=None):
+        """
+        Construct from the contents of an open file or file-like object, read to its end
+
+        :param fileobj: Object whose `read` method returns `str`, to be decoded, or `unicode`.
+        :param unicode name: Name of the content, used in messages; defaults to `fileobj.name`, or "<stream>".
+        :param str encoding: Encoding of the contents if they are `str`; defaults to the locale's preferred encoding.
+        :raises UndecodableFileError: if the contents are not valid in `encoding`.
+        """
+        if name is None:
+            name = getattr(fileobj, "name", u"<stream>")
+        data = fileobj.read()
+        if isinstance(data, unicode):
+            return cls(None, data, name=name)
+        return cls.from_bytes(data, name, encoding)
 
 
     def _parse_bib_file(self):
+        """
+        Parse `self.src_txt`
+
+        :returns: Bibliography data, or the exception raised upon parsing.
+        :rtype: `pybtex.database.BibliographyData` or `pybtex.exceptions.PybtexError`
+        """
+        return parse_bib_txt(self.src_txt)
+
+
+    def _set_bib(self, bib):
         raise NotImplementedError()
 
 
@@ -57,6 +279,8 @@ class RefFile(object):
 
         :rtype: unicode
         """
+        if self.name is not None:
+            return unicode(self.name)
         msg = unicode(self.path.resolve())
         return msg
 
@@ -89,31 +313,186 @@ class BibFile(RefFile):
     Common functionality for a file containing BibTeX
 
     :param pathlib.Path path: Path to file containing BibTeX data.
+    :param unicode src_txt: Contents of `path`, if already read.
+    :param bib: Result of parsing `src_txt`, if already parsed.
+    :type bib: `pybtex.database.BibliographyData` or `pybtex.exceptions.PybtexError`
+    :param str encoding: Encoding of `path`, if `src_txt` is not given; defaults to the locale's preferred encoding.
+    :param unicode name: Name of `src_txt` given in memory, used in messages in place of `path`, which is then `None`.
     :raises UnparseableBibtexError: if the `pathlib.Path` points to an unparseable BibTeX file.
     """
+    # Byte-offset index and resolved path, spans of the `@string` commands, macros they define and entries parsed from spans, of a file opened with `open` without parsing
+    _index = None
+    _indexed_path = None
+    _string_spans = None
+    _macros = None
+    _partial = None
+
     @property
     def bib(self):
         """
         Bibliography data (read-only)
 
+        Parsed when first used if the file was opened with `open`.
+
         :type: `pybtex.database.BibliographyData`
+        :raises UnparseableBibtexError: if the file was opened with `open` and has become unparseable since.
         """
+        if self._bib is None:
+            self._set_bib(self._parse_bib_file())
         return self._bib
 
 
-    def _parse_bib_file(self):
+    @property
+    def bib_type(self):
         """
-        Parse BibTeX located at `self.path`, set `self.bib`
+        Type of `self.bib`, known without parsing (read-only)
+
+        :type: `type`
         """
-        parser = bibtex.Parser()
+        return BibliographyData
+
+
+    @classmethod
+    def open(cls, path, encoding=None, index=None):
+        """
+        Construct for access to single entries with `get_entry`, parsing the file only if it is not known to be parseable
+
+        A file is known to be parseable if `index` recorded it so and its modification time, size and encoding have not changed since. Otherwise, the file is parsed as by the constructor and, unless its encoding is not ASCII-compatible, the byte spans of its commands are recorded in `index` for the next time it is opened. `src_txt` and `bib` of a file known to be parseable are read and parsed when first used.
+
+        :param pathlib.Path path: Path to file containing BibTeX data.
+        :param str encoding: Encoding of the file; defaults to the locale's preferred encoding.
+        :param OffsetIndex index: Byte-offset index, in which `get_entry` then looks entries up; defaults to the one in the cache directory.
+        :raises UnparseableBibtexError: if the `pathlib.Path` points to an unparseable BibTeX file.
+        :raises UndecodableFileError: if the file is not valid in `encoding`.
+        """
+        # offsets imports stream, which imports this module
+        from offsets import OffsetIndex, STRING, file_state, scan_file
+        if encoding is None:
+            encoding = locale.getpreferredencoding()
+        own_index = index is None
+        if own_index:
+            index = OffsetIndex()
+        string_spans = index.file_spans(path, encoding, (STRING,))
+        if string_spans is not None:
+            b = cls.__new__(cls)
+            b._path = path
+            b._name = None
+            b._encoding = encoding
+            b._src_txt = None
+            b._bib = None
+            b._index = index
+            b._indexed_path = unicode(path.resolve())
+            b._string_spans = string_spans
+            b._partial = BibliographyData()
+            return b
+
         try:
-            bib = parser.parse_stream(StringIO.StringIO(self.src_txt))
-        except PybtexError:
+            state = file_state(path, encoding)
+            b = cls(path, encoding=encoding)
+            try:
+                spans = scan_file(path, encoding)
+            except ValueError:
+                # Not ASCII-compatible
+                return b
+            index.record(path, spans, state)
+            return b
+        finally:
+            if own_index:
+                index.close()
+
+
+    def get_entry(self, key):
+        """
+        Entry whose key is `key`, ignoring case
+
+        Unless `bib` is already parsed, only the entry, the entry it cross-references if any, and the first time the `@string` commands of the file, are read and parsed; in a file opened with `open`, they are read from their byte spans, looked up in the index, and the whole file is parsed instead if one of them changed since it was indexed.
+
+        :param unicode key: Citation key.
+        :rtype: `pybtex.database.Entry`
+        :raises KeyError: if no entry has the key.
+        """
+        if self._bib is not None or self._index is None:
+            return self.bib.entries[key]
+        if key in self._partial.entries:
+            return self._partial.entries[key]
+
+        spans = self._index.lookup(key, [self._indexed_path])
+        if not spans:
+            raise KeyError(key)
+        item = self._parse_span(spans[0])
+        if item is None:
+            return self.bib.entries[key]
+        self._partial.add_entry(item.key, item.entry)
+        if "crossref" in item.entry.fields:
+            try:
+                self.get_entry(item.entry.fields["crossref"])
+            except KeyError:
+                # As in a whole-file parse, inherited fields are then missing
+                pass
+        return item.entry
+
+
+    def _parse_span(self, span):
+        """
+        Parse a command of a file opened with `open` on its own, with the macros of the file
+
+        :returns: Entry parsed, or `None` if the command, or an `@string` command, changed since it was indexed or does not parse
+        :rtype: `stream.StreamEntry`
+        """
+        # stream imports this module
+        from stream import StreamEntry, iter_parsed_chunks
+
+        def parse(span, data):
+            def decode(chunk, offset, lineno):
+                return decode_src_txt(chunk, self._encoding, self.path, offset, lineno)
+
+            return list(iter_parsed_chunks([(span.offset, span.lineno, data)], decode, self._macros))
+
+        with self.path.open("rb") as f:
+            data = span.read(f)
+            if not span.matches(data):
+                return None
+            if self._macros is None:
+                self._macros = CaseInsensitiveDict(bibtex.month_names)
+                for string_span in self._string_spans:
+                    string_data = string_span.read(f)
+                    if not string_span.matches(string_data) or parse(string_span, string_data):
+                        self._macros = None
+                        return None
+        items = parse(span, data)
+        if len(items) != 1 or not isinstance(items[0], StreamEntry):
+            return None
+        return items[0]
+
+
+    def _set_bib(self, bib):
+        """
+        Set `self.bib` with the result of parsing `self.src_txt`
+
+        :raises UnparseableBibtexError: if `bib` is not `pybtex.database.BibliographyData`.
+        """
+        if not isinstance(bib, BibliographyData):
             raise UnparseableBibtexError()
 
         self._bib = bib
 
 
+    def key_lines(self):
+        """
+        Citation key and line number of each entry, in the order of `self.bib.entries`
+
+        Line numbers are found by `stream.iter_key_lines` without parsing again; an entry whose header it does not find has line number `None`.
+
+        :rtype: list of tuple
+        """
+        # stream imports this module
+        from stream import iter_key_lines
+        lines = {}
+        for key, lineno in iter_key_lines(self.src_txt):
+            lines.setdefault(key.lower(), lineno)
+        return [(key, lines.get(key.lower())) for key in self.bib.entries]
+
+
     def verbose_msg(self):
         """
         Component of STDOUT message when "--verbose" flag set
@@ -128,6 +507,11 @@ class NonbibFile(RefFile):
     Common functionality for a file containing unparseable BibTeX
 
     :param pathlib.Path path: Path to file containing BibTeX data.
+    :param unicode src_txt: Contents of `path`, if already read.
+    :param bib: Result of parsing `src_txt`, if already parsed.
+    :type bib: `pybtex.database.BibliographyData` or `pybtex.exceptions.PybtexError`
+    :param str encoding: Encoding of `path`, if `src_txt` is not given; defaults to the locale's preferred encoding.
+    :param unicode name: Name of `src_txt` given in memory, used in messages in place of `path`, which is then `None`.
     :raises ParseableBibtexError: if the `pathlib.Path` points to a parseable BibTeX file.
     """
     @property
@@ -140,21 +524,250 @@ class NonbibFile(RefFile):
         return self._bib
 
 
-    def _parse_bib_file(self):
+    def _set_bib(self, bib):
         """
-        Attempt to parse BibTeX located at `self.path`
+        Set `self.bib` with the exception raised upon parsing `self.src_txt`
 
-        Set `self.bib` with the exception raised upon parsing.
+        :raises ParseableBibtexError: if `bib` is not `pybtex.exceptions.PybtexError`.
         """
-        parser = bibtex.Parser()
-        try:
-            bib = parser.parse_stream(StringIO.StringIO(self.src_txt))
-        except PybtexError, e:
-            bib = e
-        else:
+        if not isinstance(bib, PybtexError):
             raise ParseableBibtexError()
 
         self._bib = bib
+        self._errors = None
+
+
+    def error_info(self):
+        """
+        Information about the exception raised upon parsing
+
+        Only `pybtex.scanner.TokenRequired` errors carry an error type, line number and context; these elements are `None` for other errors.
+
+        :returns: error type, message, line number, context
+        :rtype: tuple
+        """
+        return error_info(self.bib)
+
+
+    def errors(self):
+        """
+        Information about every error in `self.src_txt`
+
+        Parsing resumes at the next command after each error, by `stream.iter_text_errors`; after a syntax error, only the rest of the source is parsed again. Should that find nothing, the exception raised upon parsing the whole file is the only error.
+
+        :returns: error type, message, line number, context of each error, in order
+        :rtype: list of tuple
+        """
+        if self._errors is None:
+            # stream imports this module
+            from stream import iter_text_errors
+            self._errors = list(iter_text_errors(self.src_txt, self.bib)) or [self.error_info()]
+        return list(self._errors)
+
+
+    def verbose_msg(self):
+        """
+        Component of STDOUT message when "--verbose" flag set
+
+        :rtype: unicode
+        """
+        return u"\n".join(format_error_msg(*error) for error in self.errors())
+
+
+class ParseResult(object):
+    """
+    Picklable summary of a `RefFile`
+
+    Holds only what the "test" command-line functionality needs from a `RefFile`. Unlike a `RefFile`, a `ParseResult` can be passed between processes, and it references neither the source text nor the parsed bibliography data, so that many results can be kept in memory at once.
+
+    :param pathlib.Path path: Path to file containing BibTeX data.
+    :param type bib_type: Type of the parsed `RefFile.bib`.
+    :param str error_type: Type of parsing error, if any.
+    :param unicode message: Parsing error message, if any.
+    :param int lineno: Line number of parsing error, if any.
+    :param unicode context: Source context of parsing error, if any.
+    :param list errors: Error type, message, line number and context of every parsing error, if collected; otherwise only the one error given is known.
+    :param int num_entries: Number of entries, if parsed.
+    :param unicode name: Name of content given in memory, used in messages in place of `path`.
+    :param list keys: Citation key and line number of each entry, if collected; see `BibFile.key_lines`.
+    """
+    __slots__ = ("_path", "_bib_type", "_error_type", "_message", "_lineno", "_context", "_errors", "_num_entries", "_name", "_keys")
+
+    @property
+    def path(self):
+        """
+        Path to file containing BibTeX (read-only)
+
+        :type: `pathlib.Path`
+        """
+        return self._path
+
+
+    @property
+    def name(self):
+        """
+        Name of content given in memory, used in messages in place of the path, or `None` (read-only)
+
+        :type: unicode
+        """
+        return self._name
+
+
+    @property
+    def bib_type(self):
+        """
+        Type of the parsed `RefFile.bib` (read-only)
+
+        :type: `type`
+        """
+        return self._bib_type
+
+
+    @property
+    def error_type(self):
+        """
+        Type of parsing error, or `None` (read-only)
+
+        :type: str
+        """
+        return self._error_type
+
+
+    @property
+    def message(self):
+        """
+        Parsing error message, or `None` if parsing succeeded (read-only)
+
+        :type: unicode
+        """
+        return self._message
+
+
+    @property
+    def lineno(self):
+        """
+        Line number of parsing error, or `None` (read-only)
+
+        :type: int
+        """
+        return self._lineno
+
+
+    @property
+    def context(self):
+        """
+        Source context of parsing error, or `None` (read-only)
+
+        :type: unicode
+        """
+        return self._context
+
+
+    @property
+    def errors(self):
+        """
+        Error type, message, line number and context of every parsing error, or of the first only if the others were not collected (read-only)
+
+        :type: list of tuple
+        """
+        if self._errors is None:
+            return [] if self.message is None else [(self.error_type, self.message, self.lineno, self.context)]
+        return list(self._errors)
+
+
+    @property
+    def num_entries(self):
+        """
+        Number of entries, or `None` if the file is unparseable or was not fully parsed (read-only)
+
+        :type: int
+        """
+        return self._num_entries
+
+
+    @property
+    def keys(self):
+        """
+        Citation key and line number of each entry, or `None` if the file is unparseable or they were not collected (read-only)
+
+        :type: list of tuple
+        """
+        return None if self._keys is None else list(self._keys)
+
+
+    @property
+    def complete(self):
+        """
+        Whether the result has the number of entries of a parseable file, which a prescan may leave out, or every error of an unparseable file (read-only)
+
+        :type: bool
+        """
+        if issubclass(self.bib_type, BibliographyData):
+            return self.num_entries is not None
+        return self._errors is not None
+
+
+    def __init__(self, path, bib_type, error_type=None, message=None, lineno=None, context=None, errors=None, num_entries=None, name=None, keys=None):
+        self._path = path
+        self._bib_type = bib_type
+        self._error_type = error_type
+        self._message = message
+        self._lineno = lineno
+        self._context = context
+        self._errors = None if errors is None else tuple(errors)
+        self._num_entries = num_entries
+        self._name = name
+        self._keys = None if keys is None else tuple(keys)
+
+
+    def __getstate__(self):
+        return tuple(getattr(self, slot) for slot in self.__slots__)
+
+
+    def __setstate__(self, state):
+        for slot, value in zip(self.__slots__, state):
+            setattr(self, slot, value)
+
+
+    @classmethod
+    def from_reffile(cls, reffile, details=True, keys=False):
+        """
+        Construct from a `RefFile`
+
+        :param RefFile reffile: Parsed file to summarize.
+        :param bool details: Whether to collect every error of an unparseable file with `NonbibFile.errors`, which parses it again, rather than only the first.
+        :param bool keys: Whether to collect the keys of a parseable file with `BibFile.key_lines`, which scans its source again.
+        :rtype: ParseResult
+        """
+        if isinstance(reffile, NonbibFile):
+            errors = reffile.errors() if details else None
+            return cls(reffile.path, reffile.bib_type, *reffile.error_info(), errors=errors, name=reffile.name)
+        else:
+            return cls(reffile.path, reffile.bib_type, num_entries=len(reffile.bib.entries), name=reffile.name,
+                       keys=reffile.key_lines() if keys else None)
+
+
+    def with_path(self, path):
+        """
+        Copy of this result for a different path to the same content
+
+        :param pathlib.Path path: Path to file containing BibTeX data.
+        :rtype: ParseResult
+        """
+        return ParseResult(path, self.bib_type, self.error_type, self.message, self.lineno, self.context, self._errors, self.num_entries,
+                           keys=self._keys)
+
+
+    def terse_msg(self):
+        """
+        Component of STDOUT message listing `self.path`
+
+        :rtype: unicode
+        """
+        if self.name is not None:
+            return unicode(self.name)
+        msg = unicode(self.path.resolve())
+        return msg
 
 
     def verbose_msg(self):
@@ -163,14 +776,19 @@ class NonbibFile(RefFile):
 
         :rtype: unicode
         """
-        msg = u""
-        if isinstance(self.bib, TokenRequired):
-            msg += self.bib.error_type + ": "
-            msg += self.bib.message + "\n"
-            msg += str(self.bib.lineno) + " "
-            msg += self.bib.get_context()
-        elif isinstance(self.bib, PybtexError):
-            msg += self.bib.message
+        return u"\n".join(format_error_msg(*error) for error in self.errors)
+
+
+    def test_msg(self, verbose=False):
+        """
+        STDOUT message for "test" command-line functionality
+
+        :param bool verbose: Switch to [in|ex]clude verbose message
+        :rtype: unicode
+        """
+        msg = self.terse_msg()
+        if verbose:
+            msg += "\n" + self.verbose_msg() + "\n"
 
         return msg
 
@@ -1,11 +1,18 @@
 # -*- coding: utf-8 -*-
 import os
 import sys
+import json
+import codecs
+import functools
+import cProfile
 import argparse
 import version
-import utils
-from pybtex.database import BibliographyData
-from pybtex.exceptions import PybtexError
+import hooks
+from watch import Watcher, PollNotifier, DEBOUNCE
+from server import Server, forward
+from ref_exceptions import UndecodableFileError
+
+# pybtex, and the modules which import it, are imported by the commands which need them so that `ref --version`, and commands forwarded to a server, start quickly.
 
 
 def define_parser():
@@ -22,6 +29,129 @@ def define_parser():
         action="store_true",
         help="Test parseability of BibTeX file(s)",)
 
+    parser.add_argument("-k", "--keys",
+        action="store_true",
+        help="Print citation keys defined more than once across BibTeX file(s), ignoring case as BibTeX does",)
+
+    parser.add_argument("--lookup",
+        metavar="KEY",
+        help="Print where KEY is defined in the files indexed so far, after indexing the BibTeX file(s)",)
+
+    parser.add_argument("-d", "--dupes",
+        action="store_true",
+        help="Print groups of entries across BibTeX file(s) which are probably the same work",)
+
+    parser.add_argument("--similarity",
+        type=float,
+        metavar="X",
+        default=None,
+        help="With --dupes, least similarity of entries taken to be the same work, from 0 to 1 (default: 0.7)",)
+
+    parser.add_argument("--index",
+        action="store_true",
+        help="Add the entries of BibTeX file(s) to the entry store, parsing only files changed since they were added",)
+
+    parser.add_argument("--query",
+        metavar="QUERY",
+        help="Print entries of the entry store matching QUERY, after adding the BibTeX file(s) to it; "
+             "QUERY is words searched for in titles and abstracts and conditions such as author:knuth, "
+             "year:1984-1990, journal:\"Computer Journal\", type:article or key:knuth1984",)
+
+    parser.add_argument("--cited",
+        action="append",
+        metavar="AUX",
+        help="Print the entries cited in LaTeX .aux file AUX, with the entries they cross-reference and the macros "
+             "and preambles of the files, from the BibTeX file(s), or else the files named by \\bibdata in AUX",)
+
+    parser.add_argument("-r", "--recursive",
+        action="store_true",
+        help="Search directories for BibTeX files",)
+
+    parser.add_argument("--include",
+        action="append",
+        metavar="PATTERN",
+        help="With --recursive, test only files whose names match PATTERN (default: *.bib)",)
+
+    parser.add_argument("--exclude",
+        action="append",
+        metavar="PATTERN",
+        help="With --recursive, skip files and directories whose names or paths match PATTERN",)
+
+    parser.add_argument("-j", "--jobs",
+        type=int,
+        default=None,
+        help="Number of processes used to parse files, or shards of a single large file (default: number of CPUs)",)
+
+    parser.add_argument("--dedupe-content",
+        action="store_true",
+        help="Parse files with byte-identical contents only once",)
+
+    parser.add_argument("--unordered",
+        action="store_true",
+        help="Print files in the order their parsing completes rather than the order given",)
+
+    parser.add_argument("--no-cache",
+        action="store_true",
+        help="Neither read nor write the parse result cache or the key, entry and offset indexes",)
+
+    parser.add_argument("--clear-cache",
+        action="store_true",
+        help="Remove all entries from the parse result cache and the key, entry and offset indexes",)
+
+    parser.add_argument("--encoding",
+        metavar="ENCODING",
+        help="Encoding of the BibTeX files (default: the locale's preferred encoding)",)
+
+    parser.add_argument("--watch",
+        action="store_true",
+        help="After testing, keep watching the files and print only files which enter or leave the list",)
+
+    parser.add_argument("--poll",
+        action="store_true",
+        help="With --watch, poll for changes even where inotify is available",)
+
+    parser.add_argument("--debounce",
+        type=float,
+        default=DEBOUNCE,
+        metavar="SECONDS",
+        help="With --watch, wait until files have been unchanged for SECONDS (default: {0})".format(DEBOUNCE),)
+
+    parser.add_argument("--stats",
+        action="store_true",
+        help="Print counts, bytes read, time per phase and the slowest files to STDERR",)
+
+    parser.add_argument("--stats-json",
+        metavar="FILE",
+        help="Write the statistics of --stats to FILE as JSON",)
+
+    parser.add_argument("--slowest",
+        type=int,
+        default=10,
+        metavar="N",
+        help="Number of slowest files listed by --stats (default: 10)",)
+
+    parser.add_argument("--profile",
+        metavar="FILE",
+        help="Write cProfile statistics of the main process to FILE; use with -j 1 to include parsing",)
+
+    parser.add_argument("--format",
+        choices=["text", "jsonl"],
+        default="text",
+        help="Print a list of paths, or a JSON object per file with its path, parseability, entry count, errors, parse time and size (default: text)",)
+
+    parser.add_argument("--serve",
+        action="store_true",
+        help="Run commands sent by other invocations of ref until interrupted, keeping modules loaded",)
+
+    parser.add_argument("--socket",
+        metavar="PATH",
+        help="Path of the socket of --serve, to which commands are forwarded (default: {0})".format(
+            "$XDG_RUNTIME_DIR/refmanage.sock or ~/.cache/refmanage/server.sock"),)
+
+    parser.add_argument("--no-server",
+        action="store_true",
+        help="Run in this process even if a server is listening",)
+
     parser.add_argument("-v", "--verbose",
         action="store_true",
         help="Verbose output",)
@@ -43,6 +173,9 @@ def define_parser():
         help="File(s) to test parseability",
         metavar="files")
 
+    # Parse cache kept open between commands by a server; see `run`
+    parser.set_defaults(parse_cache=None)
+
     return parser
 
 
@@ -50,19 +183,101 @@ def cli_args_dispatcher(args):
     """
     Dispatch functionality based on command-line args
     """
-    if args.version:
-        ver(args)
-    elif args.test:
-        test(args)
+    if args.clear_cache:
+        clear_cache(args)
+
+    stats = None
+    if args.stats or args.stats_json:
+        stats = hooks.Stats(args.slowest)
+        hooks.subscribe(stats)
+    profiler = None
+    if args.profile:
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+    try:
+        if args.version:
+            ver(args)
+        elif args.test and args.watch:
+            watch_test(args)
+        elif args.test:
+            test(args)
+        elif args.keys or args.lookup is not None:
+            keys(args)
+        elif args.dupes:
+            find_dupes(args)
+        elif args.index or args.query is not None:
+            index_entries(args)
+        elif args.cited:
+            write_cited(args)
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(args.profile)
+        if stats is not None:
+            hooks.unsubscribe(stats)
+            stats.stop()
+            report_stats(args, stats)
 
 
 def main():
     """
     Method called via command-line
+
+    Unless asked for the version, told to serve, to watch or not to use a server, the command is forwarded to a server listening on the socket, if any.
     """
     parser = define_parser()
     args = parser.parse_args()
-    cli_args_dispatcher(args)
+    if not (args.version or args.serve or args.watch or args.no_server):
+        status = forward(sys.argv[1:], args.socket)
+        if status is not None:
+            sys.exit(status)
+    run_args(parser, args)
+
+
+def run(argv, encoding=None, cache=None):
+    """
+    Run a command in this process on behalf of a client of the server
+
+    :param list argv: Command-line arguments, without the program name.
+    :param str encoding: Encoding of the files unless `--encoding` is given; defaults to the locale's preferred encoding.
+    :param ParseCache cache: Parse cache used unless `--no-cache` is given, kept open by the server between commands; defaults to opening one for the command.
+    """
+    parser = define_parser()
+    args = parser.parse_args(argv)
+    if args.serve or args.watch:
+        parser.error("--serve and --watch cannot be run by a server; use --no-server")
+    if args.encoding is None:
+        args.encoding = encoding
+    args.parse_cache = cache
+    run_args(parser, args)
+
+
+def run_args(parser, args):
+    """
+    Check and run a command given by parsed command-line arguments
+
+    :param argparse.ArgumentParser parser: Parser of the arguments, for reporting errors.
+    :param argparse.Namespace args: Parsed arguments.
+    """
+    if args.encoding is not None:
+        try:
+            codecs.lookup(args.encoding)
+        except LookupError:
+            parser.error("unknown encoding: " + args.encoding)
+    if args.format != "text" and args.watch:
+        parser.error("--format {0} cannot be used with --watch".format(args.format))
+    if args.similarity is not None and not 0 <= args.similarity <= 1:
+        parser.error("--similarity must be between 0 and 1")
+    if args.jobs is not None and args.jobs < 1:
+        parser.error("--jobs must be at least 1")
+    if args.serve:
+        serve(args)
+        return
+    try:
+        cli_args_dispatcher(args)
+    except UndecodableFileError, e:
+        sys.exit("ref: error: " + str(e))
 
 
 def ver(args):
@@ -72,18 +287,337 @@ def ver(args):
     sys.stdout.write(version.__version__ + "\n")
 
 
+def serve(args):
+    """
+    Implement "serve" command-line functionality
+    """
+    # Import what the commands need up front: they are run in the working directory of each client, from which the package may not be importable
+    import utils
+    import cache
+    import keyindex
+    import dupes
+    import entrystore
+    import offsets
+    import cited
+    import pybtex.database
+    import pybtex.exceptions
+    from cache import ParseCache
+
+    # Kept open so that commands find their results without opening the database again
+    cache = open_store(ParseCache, args.no_cache)
+    server = Server(functools.partial(run, cache=cache), args.socket)
+    server.listen()
+    sys.stderr.write("ref: serving on {0}\n".format(server.path))
+    server.serve_forever()
+
+
+def open_store(cls, no_cache=False, in_memory=False):
+    """
+    Open the SQLite database of type `cls` kept in the cache directory
+
+    If it cannot be opened, as when the cache directory cannot be created, a warning is written to STDERR so that the command can go on without it.
+
+    :param type cls: Subclass of `cache.SQLiteStore`.
+    :param bool no_cache: Whether not to use the cache directory, as with "--no-cache".
+    :param bool in_memory: Whether to use a database which is not persisted, rather than none, when the cache directory is not used.
+    :returns: The opened database, or `None`
+    :rtype: `cache.SQLiteStore`
+    """
+    import sqlite3
+    if not no_cache:
+        store = cls()
+        try:
+            store.open()
+            return store
+        except (EnvironmentError, sqlite3.Error), e:
+            sys.stderr.write("ref: warning: cannot open {0}, continuing without it: {1}\n".format(store.path, e))
+    return cls(":memory:") if in_memory else None
+
+
+def parse_cache(args):
+    """
+    Parse cache of a command: that of the server running it, if any, else one opened for the command unless "--no-cache" is given
+
+    :rtype: `cache.ParseCache`, or `None`
+    """
+    from cache import ParseCache
+    if args.no_cache:
+        return None
+    if args.parse_cache is not None:
+        return args.parse_cache
+    return open_store(ParseCache)
+
+
+def clear_cache(args):
+    """
+    Implement "clear-cache" command-line functionality
+    """
+    from cache import ParseCache
+    from keyindex import KeyIndex
+    from entrystore import EntryStore
+    from offsets import OffsetIndex
+    for cls in (ParseCache, KeyIndex, EntryStore, OffsetIndex):
+        store = open_store(cls)
+        if store is not None:
+            store.clear()
+            store.close()
+
+
+def report_stats(args, stats):
+    """
+    Implement "stats" command-line functionality
+    """
+    if args.stats:
+        sys.stderr.write(stats.format().encode("utf-8"))
+    if args.stats_json:
+        with open(args.stats_json, "w") as f:
+            json.dump(stats.as_dict(), f, indent=2, sort_keys=True)
+
+
 def test(args):
     """
     Implement "test" command-line functionality
     """
-    paths = utils.handle_files_args(*args.paths_args)
-    bibfile_data = utils.construct_bibfile_data(*paths)
+    import utils
+    from pybtex.database import BibliographyData
+    from pybtex.exceptions import PybtexError
+
+    jsonl = args.format == "jsonl"
+    file_times = None
+    if jsonl:
+        # Subscribe before parsing starts so that the phases are timed
+        file_times = hooks.FileTimes()
+        hooks.subscribe(file_times)
+
+    cache = parse_cache(args)
+    paths = utils.iter_files_args(args.paths_args, args.recursive, args.include, args.exclude)
+    bibfile_data = utils.iter_parse_results(paths, args.jobs, cache,
+        ordered=not args.unordered, dedupe_content=args.dedupe_content, prescan=not (args.verbose or jsonl),
+        encoding=args.encoding, details=args.verbose or jsonl)
 
     if args.parseable:
-        sublist = utils.bib_sublist(bibfile_data, BibliographyData)
+        val_type = BibliographyData
     else:
-        sublist = utils.bib_sublist(bibfile_data, PybtexError)
+        val_type = PybtexError
+
+    def selected(results):
+        for result in results:
+            if issubclass(result.bib_type, val_type):
+                yield result
+            elif file_times is not None:
+                # Times of the files left out would otherwise never be popped
+                file_times.pop(result.path)
+
+    sublist = selected(bibfile_data)
+
+    try:
+        if jsonl:
+            msgs = utils.iter_stdout_test_jsonl(sublist, file_times)
+        else:
+            msgs = utils.iter_stdout_test_msg(sublist, args.verbose)
+        for msg in msgs:
+            sys.stdout.write(msg)
+            sys.stdout.flush()
+    finally:
+        if file_times is not None:
+            hooks.unsubscribe(file_times)
+
+
+def keys(args):
+    """
+    Implement "keys" command-line functionality
+
+    Each key defined more than once is printed, followed by where each of its definitions is. With "--lookup", where the key is defined is printed instead, from the key index; exits with status 1 if it is not defined.
+    """
+    import utils
+    from keyindex import KeyIndex, collisions
+
+    cache = parse_cache(args)
+    index = open_store(KeyIndex, args.no_cache, in_memory=True)
+    try:
+        paths = utils.iter_files_args(args.paths_args, args.recursive, args.include, args.exclude)
+        locations = index.update(paths, args.jobs, cache, args.encoding)
+        if args.lookup is not None:
+            found = index.lookup(args.lookup.decode("utf-8"))
+            if not found:
+                sys.exit("ref: key not found: " + args.lookup)
+            for location in found:
+                sys.stdout.write(location.msg().encode("utf-8") + "\n")
+            return
+
+        for lkey, duplicates in collisions(locations):
+            sys.stdout.write(lkey.encode("utf-8") + "\n")
+            for location in duplicates:
+                sys.stdout.write(u"    {0}\n".format(location.msg()).encode("utf-8"))
+    finally:
+        index.close()
+
+
+def find_dupes(args):
+    """
+    Implement "dupes" command-line functionality
+
+    Each group of entries which are probably the same work is printed as the normalized title of its first entry, followed by where each entry is defined.
+    """
+    import utils
+    from dupes import THRESHOLD, iter_fingerprints, find_duplicates
+
+    threshold = THRESHOLD if args.similarity is None else args.similarity
+    paths = utils.iter_files_args(args.paths_args, args.recursive, args.include, args.exclude)
+    for group in find_duplicates(iter_fingerprints(paths, args.jobs, args.encoding), threshold):
+        sys.stdout.write(group[0].title.encode("utf-8") + "\n")
+        for fingerprint in group:
+            sys.stdout.write(u"    {0}\n".format(fingerprint.msg()).encode("utf-8"))
+
+
+def index_entries(args):
+    """
+    Implement "index" and "query" command-line functionality
+
+    The entries of the files are added to the entry store; with "--query", the entries of all the files in the store which match are then printed, otherwise the number of files parsed and entries stored.
+    """
+    import utils
+    from entrystore import EntryStore, parse_query
+
+    conditions = None
+    if args.query is not None:
+        try:
+            conditions = parse_query(args.query.decode("utf-8"))
+        except ValueError, e:
+            sys.exit("ref: invalid query: " + str(e))
+
+    store = open_store(EntryStore, args.no_cache, in_memory=True)
+    try:
+        paths = utils.iter_files_args(args.paths_args, args.recursive, args.include, args.exclude)
+        num_parsed = store.update(paths, args.jobs, args.encoding)
+        if conditions is None:
+            sys.stdout.write("{0} files parsed, {1} entries stored\n".format(num_parsed, len(store)))
+            return
+        for entry in store.query(**conditions):
+            sys.stdout.write(entry.msg().encode("utf-8") + "\n")
+    finally:
+        store.close()
+
+
+def write_cited(args):
+    """
+    Implement "cited" command-line functionality
+
+    The commands extracted are printed as they are written in the files, separated by blank lines. Each error parsing them, and each citation not found, is reported on STDERR; exits with status 1 if a citation is not found.
+    """
+    import collections
+    import utils
+    import pathlib2 as pathlib
+    from offsets import OffsetIndex
+    from cited import read_aux, cited_entries
+
+    citations = collections.OrderedDict()
+    bibdata = []
+    for aux in args.cited:
+        try:
+            data = read_aux(pathlib.Path(aux), args.encoding)
+        except EnvironmentError, e:
+            sys.exit("ref: error: cannot read {0}: {1}".format(aux, e.strerror))
+        for key in data.citations:
+            citations.setdefault(key.lower(), key)
+        bibdata.extend(data.bibdata)
+
+    paths_args = args.paths_args
+    if paths_args == ["*.bib"] and bibdata:
+        # No files given
+        paths_args = [str(path) for path in bibdata]
+
+    index = open_store(OffsetIndex, args.no_cache, in_memory=True)
+    try:
+        paths = utils.iter_files_args(paths_args, args.recursive, args.include, args.exclude)
+        try:
+            cited = cited_entries(index, index.update(paths, args.jobs, args.encoding), citations.values(), args.encoding)
+        except ValueError, e:
+            sys.exit("ref: error: " + str(e))
+    finally:
+        index.close()
+
+    if cited.commands:
+        sys.stdout.write("\n\n".join(command.rstrip() for command in cited.commands) + "\n")
+    for msg in cited.errors:
+        sys.stderr.write(u"ref: warning: {0}\n".format(msg).encode("utf-8"))
+    for key in cited.missing:
+        sys.stderr.write(u"ref: warning: citation not found: {0}\n".format(key).encode("utf-8"))
+    if cited.missing:
+        sys.exit(1)
+
+
+def watch_test(args):
+    """
+    Implement "test --watch" command-line functionality
+
+    The files are tested once, then re-tested as they are created or modified. Files entering the list are printed prefixed with "+ ", files leaving it, by changing or being removed, with "- ".
+    """
+    import utils
+    from pybtex.database import BibliographyData
+    from pybtex.exceptions import PybtexError
+
+    cache = parse_cache(args)
+    notifier = PollNotifier() if args.poll else None
+    watcher = Watcher(args.paths_args, args.recursive, args.include, args.exclude,
+        notifier=notifier, debounce=args.debounce)
+
+    if args.parseable:
+        val_type = BibliographyData
+    else:
+        val_type = PybtexError
+
+    def parse(paths):
+        return utils.iter_parse_results(paths, args.jobs, cache,
+            ordered=not args.unordered, dedupe_content=args.dedupe_content, prescan=not args.verbose,
+            encoding=args.encoding, details=args.verbose)
+
+    def results(paths):
+        """
+        Paths and results of the files at `paths`; the result is `None` for a file removed or renamed before it could be parsed
+        """
+        paths = list(paths)
+        done = set()
+        try:
+            for result in parse(paths):
+                done.add(result.path)
+                yield result.path, result
+        except EnvironmentError:
+            # Parse the rest one at a time to tell which files went away
+            for path in paths:
+                if path in done:
+                    continue
+                try:
+                    result = next(parse([path]))
+                except EnvironmentError:
+                    result = None
+                yield path, result
+
+    def write(msg):
+        sys.stdout.write(msg.encode("utf-8") + "\n")
+        sys.stdout.flush()
 
-    msg = utils.gen_stdout_test_msg(sublist, args.verbose)
+    # Terse message of each listed file, by path
+    listed = {}
+    for path, result in results(watcher.paths):
+        if result is not None and issubclass(result.bib_type, val_type):
+            listed[result.path] = result.terse_msg()
+            write(result.test_msg(args.verbose))
 
-    sys.stdout.write(msg)
+    try:
+        for modified, removed in watcher.changes():
+            for path in removed:
+                if path in listed:
+                    write(u"- " + listed.pop(path))
+            for path, result in results(modified):
+                was_listed = path in listed
+                if result is not None and issubclass(result.bib_type, val_type):
+                    listed[path] = result.terse_msg()
+                    if not was_listed:
+                        write(u"+ " + result.test_msg(args.verbose))
+                elif was_listed:
+                    write(u"- " + listed.pop(path))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.close()
@@ -0,0 +1,253 @@
+# -*- coding: utf-8 -*-
+"""
+Command server (:mod:`refmanage.server`)
+========================================
+
+.. currentmodule:: refmanage.server
+
+`ref --serve` runs a server on a Unix socket which executes `ref` commands on behalf of clients, keeping its modules imported between commands. `ref` forwards its arguments to a server listening on the socket and prints what it sends back, and runs commands in-process when no server is listening.
+
+Requests and responses are JSON objects, one per line. A request gives the arguments, working directory and preferred encoding of the client. The response is a sequence of `{"stdout": text}` and `{"stderr": text}` objects, sent as the command writes its output, ended by `{"exit": status}`. Commands are run one at a time, in the working directory of the client.
+"""
+
+import os
+import sys
+import json
+import errno
+import locale
+import signal
+import socket
+import threading
+import traceback
+
+
+def default_socket_path():
+    """
+    Path of the server socket: in `$XDG_RUNTIME_DIR` if set, else in the cache directory
+
+    :rtype: str
+    """
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime_dir:
+        return os.path.join(runtime_dir, "refmanage.sock")
+    from cache import default_cache_dir
+    return os.path.join(default_cache_dir(), "server.sock")
+
+
+def _connect(path):
+    """
+    Socket connected to the server at `path`, or `None` if none is listening
+    """
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+    except socket.error:
+        sock.close()
+        return None
+    return sock
+
+
+def forward(argv, path=None, stdout=None, stderr=None):
+    """
+    Run a `ref` command in the server listening at `path`, if any
+
+    :param list argv: Command-line arguments, without the program name.
+    :param str path: Path of the server socket; defaults to `default_socket_path()`.
+    :param file stdout: File to write the standard output of the command to; defaults to `sys.stdout`.
+    :param file stderr: File to write the standard error of the command to; defaults to `sys.stderr`.
+    :returns: Exit status of the command, or `None` if no server is listening
+    :rtype: int
+    """
+    stdout = stdout if stdout is not None else sys.stdout
+    stderr = stderr if stderr is not None else sys.stderr
+    sock = _connect(path or default_socket_path())
+    if sock is None:
+        return None
+
+    request = {"argv": argv, "cwd": os.getcwd(), "encoding": locale.getpreferredencoding()}
+    try:
+        sock.sendall(json.dumps(request) + "\n")
+        for line in sock.makefile("rb"):
+            response = json.loads(line)
+            if "exit" in response:
+                return response["exit"]
+            for name, f in (("stdout", stdout), ("stderr", stderr)):
+                if name in response:
+                    f.write(response[name].encode("utf-8"))
+                    f.flush()
+    finally:
+        sock.close()
+    stderr.write("ref: error: the server closed the connection\n")
+    return 1
+
+
+class _Output(object):
+    """
+    File-like object sending what is written to it to a client as `{name: text}` responses
+
+    :param socket.socket conn: Connection to the client.
+    :param str name: "stdout" or "stderr".
+    """
+    encoding = "utf-8"
+
+    def __init__(self, conn, name):
+        self.conn = conn
+        self.name = name
+
+
+    def write(self, s):
+        if isinstance(s, str):
+            s = s.decode("utf-8", "replace")
+        if s:
+            self.conn.sendall(json.dumps({self.name: s}) + "\n")
+
+
+    def flush(self):
+        pass
+
+
+    def isatty(self):
+        return False
+
+
+def _exit_status(code):
+    """
+    Exit status for the argument of `sys.exit`, writing a message argument to `sys.stderr` as the interpreter does
+    """
+    if code is None:
+        return 0
+    if isinstance(code, (int, long)):
+        return code
+    sys.stderr.write(str(code) + "\n")
+    return 1
+
+
+class Server(object):
+    """
+    Server running `ref` commands received on a Unix socket
+
+    :param run: Function of command-line arguments and a default encoding running a command, such as `refmanage.run`.
+    :param str path: Path of the socket; defaults to `default_socket_path()`.
+    """
+    @property
+    def path(self):
+        """
+        Path of the socket (read-only)
+
+        :type: str
+        """
+        return self._path
+
+
+    def __init__(self, run, path=None):
+        self._run = run
+        self._path = path or default_socket_path()
+        self._sock = None
+
+
+    def listen(self):
+        """
+        Create and listen on the socket, accessible only to the current user
+
+        A socket file left behind by a server which has exited is replaced.
+
+        :raises socket.error: if another server is already listening on `self.path`.
+        """
+        if os.path.exists(self.path):
+            sock = _connect(self.path)
+            if sock is not None:
+                sock.close()
+                raise socket.error(errno.EADDRINUSE, "a server is already listening on " + self.path)
+            os.remove(self.path)
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)))
+        except OSError, e:
+            if e.errno != errno.EEXIST:
+                raise
+
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        old_umask = os.umask(0o077)
+        try:
+            self._sock.bind(self.path)
+        finally:
+            os.umask(old_umask)
+        self._sock.listen(16)
+
+
+    def handle(self, conn):
+        """
+        Run the command requested on `conn` and send its output and exit status
+        """
+        request = json.loads(conn.makefile("rb").readline())
+        old_cwd = os.getcwd()
+        old_streams = sys.stdout, sys.stderr
+        sys.stdout, sys.stderr = _Output(conn, "stdout"), _Output(conn, "stderr")
+        try:
+            os.chdir(request["cwd"])
+            status = self._run(request["argv"], request.get("encoding"))
+        except SystemExit, e:
+            status = _exit_status(e.code)
+        except Exception:
+            sys.stderr.write(traceback.format_exc())
+            status = 1
+        finally:
+            sys.stdout, sys.stderr = old_streams
+            os.chdir(old_cwd)
+        conn.sendall(json.dumps({"exit": status or 0}) + "\n")
+
+
+    def serve_forever(self):
+        """
+        Handle connections one at a time until interrupted or closed, then remove the socket
+
+        In the main thread SIGTERM interrupts the server as SIGINT does.
+        """
+        if self._sock is None:
+            self.listen()
+
+        def terminate(signum, frame):
+            raise KeyboardInterrupt()
+
+        main_thread = isinstance(threading.current_thread(), threading._MainThread)
+        if main_thread:
+            old_handler = signal.signal(signal.SIGTERM, terminate)
+        try:
+            while self._sock is not None:
+                try:
+                    conn, address = self._sock.accept()
+                except socket.error:
+                    if self._sock is None:
+                        # Closed by another thread
+                        break
+                    raise
+                try:
+                    self.handle(conn)
+                except (socket.error, ValueError):
+                    # The client went away or sent garbage
+                    pass
+                finally:
+                    conn.close()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            if main_thread:
+                signal.signal(signal.SIGTERM, old_handler)
+            self.close()
+
+
+    def close(self):
+        """
+        Stop listening and remove the socket
+        """
+        sock, self._sock = self._sock, None
+        if sock is not None:
+            try:
+                # Wakes up a thread blocked in accept
+                sock.shutdown(socket.SHUT_RDWR)
+            except socket.error:
+                pass
+            sock.close()
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
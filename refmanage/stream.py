@@ -0,0 +1,452 @@
+# -*- coding: utf-8 -*-
+"""
+Streaming parser (:mod:`refmanage.stream`)
+==========================================
+
+.. currentmodule:: refmanage.stream
+
+Parse BibTeX entry by entry instead of all at once.
+
+The source is split into chunks at the top-level `@` of each command, tracking braces, parentheses and quotes the way `pybtex.database.input.bibtex.BibTeXEntryIterator` nests them; each chunk is then parsed by pybtex on its own. `@string` macros and citation keys seen in earlier chunks carry over to later ones, so a file gives the same entries as a whole-file parse. Unlike a whole-file parse, an error spoils only the chunk it occurs in: parsing resumes at the next chunk, and every error is reported with its line number.
+
+An entry whose braces never balance swallows the rest of the file, so a chunk which fails to parse is split again at each `@` starting a line and followed by a command name and an opening delimiter, and the pieces are parsed instead. Such an `@` in a chunk which parses, in a field value for instance, does not start a command, as in a whole-file parse.
+"""
+
+import re
+import codecs
+import locale
+import StringIO
+import functools
+import collections
+from string import digits
+from pybtex.database import BibliographyDataError
+from pybtex.database.input import bibtex
+from pybtex.exceptions import PybtexError
+from pybtex.scanner import PybtexSyntaxError, PrematureEOF
+from pybtex.utils import CaseInsensitiveDict
+from reffile import decode_src_txt, error_info
+
+
+# Bytes read from a file at a time
+BLOCK_SIZE = 2**20
+
+# Characters of source per shard in `iter_shards`
+SHARD_SIZE = 2**20
+
+_NAME_CHARS = re.escape(bibtex.BibTeXEntryIterator.NAME_CHARS.encode("ascii"))
+_NAME = "[{0}][{1}]*".format(_NAME_CHARS, _NAME_CHARS + digits)
+
+# Command name and opening delimiter following an "@"
+HEADER = re.compile(r"\s*(" + _NAME + r")\s*([{(])")
+# "@", command name, opening delimiter and what may be an entry key
+KEY_HEADER = re.compile(r"@\s*(" + _NAME + r")\s*(?:\{\s*([^\s,}]+)|\(\s*([^\s,]+))")
+# Possibly incomplete header at the end of the available source
+PARTIAL_HEADER = re.compile(r"\s*(?:" + _NAME + r")?\s*\Z")
+# Entry keys, as `BibTeXEntryIterator.KEY_BRACE` and `KEY_PAREN` match them
+KEY_BRACE = re.compile(r"\s*[^\s,}]+")
+KEY_PAREN = re.compile(r"\s*[^\s,]+")
+# Characters which may end the body of a command delimited by braces or parentheses
+BRACE_BODY_SPECIALS = re.compile(r"[{}@]")
+PAREN_BODY_SPECIALS = re.compile(r"[{}\")@]")
+
+_OUTSIDE, _HEADER, _KEY, _BODY = range(4)
+
+
+class StreamEntry(collections.namedtuple("StreamEntry", "offset lineno key entry")):
+    """
+    Entry parsed from a stream
+
+    :param int offset: Offset of the "@" starting the entry, in bytes for files and characters for text.
+    :param int lineno: Line number of the "@" starting the entry.
+    :param unicode key: Citation key.
+    :param pybtex.database.Entry entry: Parsed entry.
+    """
+    __slots__ = ()
+
+
+class StreamError(collections.namedtuple("StreamError", "offset lineno error_type message context")):
+    """
+    Error parsing a chunk of a stream
+
+    :param int offset: Offset of the "@" starting the chunk, in bytes for files and characters for text.
+    :param int lineno: Line number of the error, or of the "@" starting the chunk if pybtex gives none.
+    :param str error_type: Type of parsing error, or `None`.
+    :param unicode message: Parsing error message.
+    :param unicode context: Source context of parsing error, or `None`.
+    """
+    __slots__ = ()
+
+
+def iter_chunks(blocks, split_lines=False):
+    """
+    Split BibTeX source into chunks, each starting at the "@" of a command
+
+    Text outside commands, and `@comment` commands, are dropped, as pybtex ignores them. Only the current chunk and the block being scanned are held in memory.
+
+    :param blocks: Iterable of consecutive pieces of the source, all `str` or all `unicode`.
+    :param bool split_lines: Whether an "@" starting a line and followed by a command name and an opening delimiter starts a new chunk even if the braces of the current chunk are not balanced.
+    :returns: offset of the chunk, line number of the chunk, chunk
+    :rtype: generator of tuple
+    """
+    blocks = iter(blocks)
+    buf = next(blocks, "")
+    base = 0            # offset of buf[0] within the source
+    counted = [0, 1]    # a position in buf and its line number
+    eof = False
+    state = _OUTSIDE
+    start = None        # position in buf of the current chunk
+    pos = 0
+    depth = 0
+    in_quote = False
+    parens = False
+
+    def lineno_at(i):
+        counted[1] += buf.count("\n", counted[0], i)
+        counted[0] = i
+        return counted[1]
+
+    while True:
+        if state == _OUTSIDE:
+            i = buf.find("@", pos)
+            if i >= 0:
+                if start is not None:
+                    yield base + start, lineno_at(start), buf[start:i]
+                start = i
+                pos = i + 1
+                state = _HEADER
+                continue
+            pos = len(buf)
+        elif state == _HEADER:
+            m = HEADER.match(buf, pos)
+            if m is not None:
+                pos = m.end()
+                command = m.group(1).lower()
+                parens = m.group(2) == "("
+                depth = 0 if parens else 1
+                in_quote = False
+                if command == "comment":
+                    # pybtex skips only the name and opening delimiter of a comment
+                    start = None
+                    state = _OUTSIDE
+                elif command in ("string", "preamble"):
+                    state = _BODY
+                else:
+                    state = _KEY
+                continue
+            if eof or not PARTIAL_HEADER.match(buf, pos):
+                # Malformed; the chunk runs to the next "@" and fails to parse
+                state = _OUTSIDE
+                continue
+        elif state == _KEY:
+            # Keys may contain braces and quotes which do not nest
+            m = (KEY_PAREN if parens else KEY_BRACE).match(buf, pos)
+            end = len(buf) if m is None else m.end()
+            if eof or end < len(buf) or (m is None and buf[pos:].strip()):
+                if m is not None:
+                    pos = m.end()
+                state = _BODY
+                continue
+        else:
+            specials = PAREN_BODY_SPECIALS if parens else BRACE_BODY_SPECIALS
+            m = specials.search(buf, pos)
+            if m is not None:
+                c = m.group()
+                pos = m.end()
+                end = False
+                if c == "{":
+                    depth += 1
+                elif c == "}":
+                    depth = max(depth - 1, 0)
+                    end = depth == 0 and not parens
+                elif c == '"':
+                    in_quote = in_quote != (depth == 0)
+                elif c == ")":
+                    end = depth == 0 and not in_quote
+                elif split_lines:
+                    line_start = buf.rfind("\n", start, m.start()) + 1
+                    if line_start > start and not buf[line_start:m.start()].strip():
+                        if HEADER.match(buf, pos):
+                            # A command starting a line ends an unbalanced chunk
+                            yield base + start, lineno_at(start), buf[start:m.start()]
+                            start = m.start()
+                            state = _HEADER
+                        elif not eof and PARTIAL_HEADER.match(buf, pos):
+                            # Look at this "@" again once more is read
+                            pos = m.start()
+                            m = None
+                if end:
+                    yield base + start, lineno_at(start), buf[start:pos]
+                    start = None
+                    state = _OUTSIDE
+                if m is not None:
+                    continue
+            else:
+                pos = len(buf)
+
+        # Read another block, dropping what is no longer needed
+        if eof:
+            break
+        block = next(blocks, None)
+        if block is None:
+            eof = True
+            continue
+        keep = start if start is not None else pos
+        lineno_at(keep)
+        base += keep
+        counted[0] = 0
+        buf = buf[keep:] + block
+        pos -= keep
+        if start is not None:
+            start -= keep
+
+    if start is not None:
+        yield base + start, lineno_at(start), buf[start:]
+
+
+def iter_parsed_chunks(chunks, decode=None, macros=None, keys=None):
+    """
+    Parse chunks from `iter_chunks` one by one
+
+    A chunk which fails to parse is parsed again in pieces, split at each command starting a line; see the `split_lines` parameter of `iter_chunks`.
+
+    :param chunks: Iterable of `(offset, lineno, chunk)` tuples.
+    :param decode: Function of a chunk, its offset and line number returning the chunk as unicode; chunks are used as they are by default.
+    :param macros: Macros defined before the first chunk; defaults to the month names. Updated as `@string` commands are parsed.
+    :param set keys: Lower-cased citation keys seen before the first chunk. Updated as entries are parsed.
+    :returns: Each entry, and each error in the order it occurs
+    :rtype: generator of `StreamEntry` and `StreamError`
+    """
+    if macros is None:
+        macros = CaseInsensitiveDict(bibtex.month_names)
+    if keys is None:
+        keys = set()
+    for offset, lineno, chunk in chunks:
+        src_txt = chunk if decode is None else decode(chunk, offset, lineno)
+        parser = bibtex.Parser()
+        parser.macros = macros
+        try:
+            data = parser.parse_stream(StringIO.StringIO(src_txt))
+        except PybtexError, e:
+            pieces = _split_lines(offset, lineno, chunk)
+            if pieces:
+                for item in iter_parsed_chunks(pieces, decode, macros, keys):
+                    yield item
+                continue
+            error_type, message, error_lineno, context = error_info(e)
+            if error_lineno is None:
+                error_lineno = 1
+            yield StreamError(offset, lineno + error_lineno - 1, error_type, message, context)
+            continue
+
+        for key, entry in data.entries.items():
+            if key.lower() in keys:
+                error_type, message, error_lineno, context = error_info(
+                    BibliographyDataError("repeated bibliograhpy entry: %s" % key))
+                yield StreamError(offset, lineno, error_type, message, context)
+            else:
+                keys.add(key.lower())
+                yield StreamEntry(offset, lineno, key, entry)
+
+
+def _split_lines(offset, lineno, chunk):
+    """
+    Pieces of `chunk` starting at each command which starts a line, as `(offset, lineno, chunk)` tuples, or an empty list if there is only one
+    """
+    pieces = [(offset + piece_offset, lineno + piece_lineno - 1, piece)
+              for piece_offset, piece_lineno, piece in iter_chunks([chunk], split_lines=True)]
+    return pieces if len(pieces) > 1 else []
+
+
+def iter_shards(src_txt, shard_size=SHARD_SIZE):
+    """
+    Split BibTeX text into shards of whole commands which can be parsed independently
+
+    Each shard is given with the `@string` macros defined before it, found by parsing only the `@string` commands, so that it parses as it would in place. Shards are split only between the chunks of `iter_chunks`; text dropped by `iter_chunks` is dropped from the shards.
+
+    :param unicode src_txt: BibTeX source.
+    :param int shard_size: Characters of source after which a shard is ended.
+    :returns: macros, shard
+    :rtype: generator of tuple
+    """
+    parser = bibtex.Parser()
+    macros = dict(parser.macros)
+    chunks = []
+    size = 0
+    for offset, lineno, chunk in iter_chunks([src_txt]):
+        if size >= shard_size:
+            yield macros, u"".join(chunks)
+            macros = dict(parser.macros)
+            chunks = []
+            size = 0
+        chunks.append(chunk)
+        size += len(chunk)
+
+        m = HEADER.match(chunk, 1)
+        if m is not None and m.group(1).lower() == "string":
+            try:
+                parser.parse_stream(StringIO.StringIO(chunk))
+            except PybtexError:
+                # The shard containing this chunk fails to parse too
+                pass
+
+    if chunks:
+        yield macros, u"".join(chunks)
+
+
+def is_ascii_compatible(encoding):
+    """
+    Whether every byte of ASCII means the same in `encoding` and no other byte can form part of an ASCII character
+
+    `iter_entries` can split the raw bytes of files only in such encodings: UTF-8 and single-byte encodings, but not UTF-16 or Shift JIS.
+
+    :param str encoding: Name of an encoding.
+    :rtype: bool
+    """
+    if codecs.lookup(encoding).name in ("utf-8", "ascii"):
+        return True
+    ascii = u"".join(unichr(i) for i in range(128))
+    decoded = "".join(chr(i) for i in range(256)).decode(encoding, "replace")
+    return len(decoded) == 256 and decoded[:128] == ascii
+
+
+def iter_text_entries(src_txt):
+    """
+    Parse BibTeX text entry by entry
+
+    :param unicode src_txt: BibTeX source.
+    :returns: Each entry, and each error in the order it occurs, with offsets in characters
+    :rtype: generator of `StreamEntry` and `StreamError`
+    """
+    return iter_parsed_chunks(iter_chunks([src_txt]))
+
+
+def iter_key_lines(src_txt):
+    """
+    Citation key and line number of everything that looks like the header of an entry in BibTeX text
+
+    Unlike `iter_chunks`, nesting is not tracked, so this is cheap enough to run on every file parsed; in exchange, text which merely looks like a header, in a field for instance, is included. Callers should keep only the keys of entries known to have been parsed.
+
+    :param unicode src_txt: BibTeX source.
+    :returns: key, line number
+    :rtype: generator of tuple
+    """
+    pos = 0
+    lineno = 1
+    for m in KEY_HEADER.finditer(src_txt):
+        if m.group(1).lower() in ("string", "preamble", "comment"):
+            continue
+        lineno += src_txt.count(u"\n", pos, m.start())
+        pos = m.start()
+        yield m.group(2) or m.group(3), lineno
+
+
+def _chunk_key(chunk):
+    """
+    Citation key of the entry in `chunk`, or `None` if it is another command
+    """
+    m = HEADER.match(chunk, 1)
+    if m is None or m.group(1).lower() in ("string", "preamble", "comment"):
+        return None
+    m = (KEY_PAREN if m.group(2) == "(" else KEY_BRACE).match(chunk, m.end())
+    return None if m is None else m.group().strip()
+
+
+def _chunks_after(chunks, start, keys):
+    """
+    Chunks starting after offset `start`, adding the keys of earlier entries to `keys`
+    """
+    for offset, lineno, chunk in chunks:
+        if offset > start:
+            yield offset, lineno, chunk
+            break
+        key = _chunk_key(chunk)
+        if key is not None and offset < start:
+            keys.add(key.lower())
+    for item in chunks:
+        yield item
+
+
+def iter_text_errors(src_txt, error=None):
+    """
+    Every error in BibTeX text, resuming at the next command after each
+
+    If `error`, the exception raised upon parsing the whole of `src_txt`, is given, it is the first error. If it is a syntax error other than a premature end of file, only the commands after the one it occurred in are parsed again, with the macros that parse defined; otherwise all of `src_txt` is parsed again, and the first error with the same message is taken to be `error` and skipped. A premature end of file, which pybtex reports without a line number, is given the line number of that error.
+
+    :param unicode src_txt: BibTeX source.
+    :param pybtex.exceptions.PybtexError error: Exception raised upon parsing `src_txt`, if known.
+    :returns: error type, message, line number, context of each error, in order
+    :rtype: generator of tuple
+    """
+    chunks = iter_chunks([src_txt])
+    macros = None
+    keys = set()
+    skip = None
+    # First error while its line number is looked for, and the errors found meanwhile
+    first = None
+    pending = []
+    if error is not None:
+        info = error_info(error)
+        if isinstance(error, PybtexSyntaxError) and not isinstance(error, PrematureEOF):
+            yield info
+            chunks = _chunks_after(chunks, error.error_context_info[0], keys)
+            macros = error.parser.macros
+        else:
+            skip = info[1]
+            if isinstance(error, PrematureEOF):
+                first = info
+            else:
+                yield info
+
+    for item in iter_parsed_chunks(chunks, macros=macros, keys=keys):
+        if isinstance(item, StreamError):
+            if item.message == skip:
+                skip = None
+                if first is not None:
+                    yield first[:2] + (item.lineno,) + first[3:]
+                    first = None
+                    for info in pending:
+                        yield info
+                    pending = []
+            elif first is not None:
+                pending.append((item.error_type, item.message, item.lineno, item.context))
+            else:
+                yield (item.error_type, item.message, item.lineno, item.context)
+
+    if first is not None:
+        yield first
+        for info in pending:
+            yield info
+
+
+def _iter_file_entries(path, encoding, block_size):
+    """
+    Implementation of `iter_entries`
+    """
+    def decode(chunk, offset, lineno):
+        return decode_src_txt(chunk, encoding, path, offset, lineno)
+
+    with path.open("rb") as f:
+        blocks = iter(functools.partial(f.read, block_size), b"")
+        for item in iter_parsed_chunks(iter_chunks(blocks), decode):
+            yield item
+
+
+def iter_entries(path, encoding=None, block_size=BLOCK_SIZE):
+    """
+    Parse the file at `path` entry by entry
+
+    The file is read `block_size` bytes at a time and each chunk is decoded on its own, so memory use is bounded by the largest entry rather than the size of the file, unless the braces of an entry never balance.
+
+    :param pathlib.Path path: Path to file containing BibTeX.
+    :param str encoding: Encoding of the file; defaults to the locale's preferred encoding.
+    :param int block_size: Bytes read at a time.
+    :returns: Each entry, and each error in the order it occurs, with offsets in bytes
+    :rtype: generator of `StreamEntry` and `StreamError`
+    :raises ValueError: if `encoding` is not ASCII-compatible; see `is_ascii_compatible`.
+    :raises UndecodableFileError: if the file is not valid in `encoding`.
+    """
+    if encoding is None:
+        encoding = locale.getpreferredencoding()
+    if not is_ascii_compatible(encoding):
+        raise ValueError("cannot stream files in {0}, which is not ASCII-compatible".format(encoding))
+    return _iter_file_entries(path, encoding, block_size)
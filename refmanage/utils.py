@@ -8,54 +8,265 @@ Utility functions (:mod:`refmanage.fs_utils`)
 
 import os
 import glob
+import json
+import Queue
+import StringIO
+import hashlib
+import fnmatch
+import functools
+import itertools
+import collections
+import multiprocessing
 import pathlib2 as pathlib
+try:
+    from os import scandir
+except ImportError:
+    from scandir import scandir
+from pybtex.database import BibliographyData, BibliographyDataError
 from pybtex.database.input import bibtex
 from pybtex.exceptions import PybtexError
 from pybtex.scanner import TokenRequired
-from reffile import BibFile, NonbibFile
-from ref_exceptions import UnparseableBibtexError
+import hooks
+import stream
+from reffile import RefFile, BibFile, NonbibFile, ParseResult, parse_bib_txt, decode_src_txt, mapped
+from cache import cache_key
+from prescan import quick_scan
 
 
-def handle_files_args(*paths_args):
+# Name of files listing patterns of paths to skip when walking directories
+IGNORE_FILENAME = ".refmanageignore"
+
+# Maximum number of files in flight per worker process in `iter_parse_results`
+PARSE_WINDOW_PER_JOB = 4
+
+# Maximum number of shards in flight per worker process in `parse_sharded`
+SHARD_WINDOW_PER_JOB = 2
+
+# Number of results between writes to the cache in `iter_parse_results`
+CACHE_UPDATE_BATCH = 1000
+
+
+def _read_ignore_patterns(directory):
     """
-    Handle file(s) arguments from command line
+    Patterns listed in the `IGNORE_FILENAME` file in `directory`
 
-    This method takes the string(s) which were passed to the cli which indicate the files on which to operate. It expands the path arguments and creates a list of `pathlib.Path` objects which unambiguously point to the files indicated by the cli arguments.
+    Blank lines and lines starting with "#" are skipped.
 
-    :param str *paths_args: Paths to files.
+    :param str directory: Directory possibly containing an `IGNORE_FILENAME` file.
     :rtype: list
     """
-    paths = []
+    try:
+        with open(os.path.join(directory, IGNORE_FILENAME)) as f:
+            lines = [line.strip() for line in f]
+    except IOError:
+        return []
+    return [line for line in lines if line and not line.startswith("#")]
+
+
+def _matches_any(name, rel_path, patterns):
+    """
+    Whether `name` or `rel_path` matches any `(base, pattern)` in `patterns`
+
+    Each pattern is matched against paths relative to its `base`, a "/"-terminated prefix of `rel_path`.
+    """
+    for base, pattern in patterns:
+        if rel_path.startswith(base):
+            if fnmatch.fnmatch(name, pattern) or fnmatch.fnmatch(rel_path[len(base):], pattern):
+                return True
+    return False
+
+
+def walk_files(top, include=None, exclude=None):
+    """
+    Lazily walk the directory tree rooted at `top`
+
+    Files are yielded in sorted order, each directory's files before its subdirectories. Hidden directories and symbolic links to directories are not descended into. A file is yielded if its name matches any of the `include` patterns and neither its name nor its path relative to `top` matches any of the `exclude` patterns. Directories matching an `exclude` pattern are skipped, as are directories which cannot be listed, as by `os.walk`. Patterns in an `IGNORE_FILENAME` file act as `exclude` patterns relative to the directory containing it.
+
+    :param str top: Directory to walk.
+    :param list include: Shell-style patterns of file names to include; defaults to `["*.bib"]`.
+    :param list exclude: Shell-style patterns of names or paths to exclude.
+    :rtype: generator of `pathlib.Path`
+    """
+    if include is None:
+        include = ["*.bib"]
+    exclude = [("", pattern) for pattern in (exclude or [])]
+
+    stack = [(top, "", exclude)]
+    while stack:
+        directory, rel_dir, patterns = stack.pop()
+        patterns = patterns + [(rel_dir, pattern) for pattern in _read_ignore_patterns(directory)]
+
+        try:
+            entries = sorted(scandir(directory), key=lambda entry: entry.name)
+        except OSError:
+            # Unreadable, or removed since its parent was listed
+            continue
+
+        subdirs = []
+        for entry in entries:
+            rel_path = rel_dir + entry.name
+            if entry.is_dir(follow_symlinks=False):
+                if not entry.name.startswith(".") and not _matches_any(entry.name, rel_path, patterns):
+                    subdirs.append((entry.path, rel_path + "/", patterns))
+            elif any(fnmatch.fnmatch(entry.name, pattern) for pattern in include):
+                if not _matches_any(entry.name, rel_path, patterns):
+                    yield pathlib.Path(entry.path)
 
+        stack.extend(reversed(subdirs))
+
+
+def _file_id(path):
+    """
+    Identity of the file at `path`: its device and inode, or its resolved path if it cannot be stat-ed
+
+    :param str path: Path to file.
+    :rtype: tuple
+    """
+    try:
+        st = os.stat(path)
+    except OSError:
+        return (os.path.realpath(path),)
+    return (st.st_dev, st.st_ino)
+
+
+def iter_files_args(paths_args, recursive=False, include=None, exclude=None):
+    """
+    Lazily handle file(s) arguments from command line
+
+    Generator version of `handle_files_args`; each path is yielded as soon as its wildcard expansion produces it. If `recursive`, directories are walked with `walk_files`. Each file is yielded only once, however many arguments, symbolic links or hard links lead to it.
+
+    :param list paths_args: Paths to files.
+    :param bool recursive: Whether to walk directories.
+    :param list include: Patterns passed to `walk_files`.
+    :param list exclude: Patterns passed to `walk_files`.
+    :rtype: generator of `pathlib.Path`
+    """
+    return hooks.timed_iter("glob", _iter_files_args(paths_args, recursive, include, exclude))
+
+
+def _iter_files_args(paths_args, recursive, include, exclude):
+    """
+    Implementation of `iter_files_args`
+    """
+    seen = set()
     for paths_arg in paths_args:
         # Handle paths implicitly rooted at user home dir
         paths_arg = os.path.expanduser(paths_arg)
 
         # Expand wildcards
-        paths_arg = glob.glob(paths_arg)
+        for path_arg in glob.iglob(paths_arg):
+            if recursive and os.path.isdir(path_arg):
+                paths = walk_files(path_arg, include, exclude)
+            else:
+                paths = [pathlib.Path(path_arg)]
+
+            for path in paths:
+                file_id = _file_id(str(path))
+                if file_id not in seen:
+                    seen.add(file_id)
+                    yield path
+
 
-        # Create list of pathlib.Path objects
-        paths.extend([pathlib.Path(path_arg) for path_arg in paths_arg])
+def handle_files_args(*paths_args):
+    """
+    Handle file(s) arguments from command line
+
+    This method takes the string(s) which were passed to the cli which indicate the files on which to operate. It expands the path arguments and creates a list of `pathlib.Path` objects which unambiguously point to the files indicated by the cli arguments.
 
+    :param str *paths_args: Paths to files.
+    :rtype: list
+    """
+    paths = list(iter_files_args(paths_args))
     return paths
 
 
-def reffile_factory(path):
+def reffile_factory(path, src_txt=None, encoding=None):
     """
     Factory method to return child of RefFile
 
     This method returns either a BibFile or NonbibFile object depending on which is appropriate based on if the `path` arg points to a file containing valid BibTeX or invalid BibTeX, respectively.
 
+    The file is read and parsed exactly once; the result of the parse is handed to the appropriate class rather than re-parsed on failure.
+
     :param pathlib.Path path: Path to file possibly containing BibTeX data.
+    :param unicode src_txt: Contents of `path`, if already read.
+    :param str encoding: Encoding of `path`, if `src_txt` is not given; defaults to the locale's preferred encoding.
     :rtype: BibFile or NonbibFile depending on input.
+    :raises UndecodableFileError: if `path` is not valid in `encoding`.
     """
-    try:
-        b = BibFile(path)
-    except UnparseableBibtexError:
-        b = NonbibFile(path)
+    if src_txt is None:
+        with hooks.phase("read", path=path) as timing:
+            with path.open("rb") as f:
+                with mapped(f) as data:
+                    timing.set(bytes=len(data))
+                    src_txt = decode_src_txt(data, encoding, path)
+    return _classify(path, src_txt)
+
+
+def reffile_from_bytes(data, name=u"<bytes>", encoding=None):
+    """
+    BibFile or NonbibFile for the raw contents of a file held in memory
+
+    Like `reffile_factory`, but the filesystem is not touched; `name` stands in for the path in messages and hook events.
+
+    :param str data: Raw contents possibly containing BibTeX data.
+    :param unicode name: Name of the content.
+    :param str encoding: Encoding of `data`; defaults to the locale's preferred encoding.
+    :rtype: BibFile or NonbibFile depending on input.
+    :raises UndecodableFileError: if `data` is not valid in `encoding`.
+    """
+    with hooks.phase("read", path=name, bytes=len(data)):
+        src_txt = decode_src_txt(data, encoding, name)
+    return _classify(None, src_txt, name)
+
+
+def reffile_from_stream(fileobj, name=None, encoding=None):
+    """
+    BibFile or NonbibFile for the contents of an open file or file-like object, read to its end
+
+    :param fileobj: Object whose `read` method returns `str`, to be decoded, or `unicode`.
+    :param unicode name: Name of the content; defaults to `fileobj.name`, or "<stream>".
+    :param str encoding: Encoding of the contents if they are `str`; defaults to the locale's preferred encoding.
+    :rtype: BibFile or NonbibFile depending on input.
+    :raises UndecodableFileError: if the contents are not valid in `encoding`.
+    """
+    if name is None:
+        name = getattr(fileobj, "name", u"<stream>")
+    data = fileobj.read()
+    if isinstance(data, unicode):
+        return _classify(None, data, name)
+    return reffile_from_bytes(data, name, encoding)
+
+
+def _classify(path, src_txt, name=None):
+    """
+    Parse `src_txt` once and construct the appropriate child of RefFile, emitting hook events
+    """
+    with hooks.phase("parse", path=path if name is None else name):
+        bib = parse_bib_txt(src_txt)
+
+    b = _reffile(path, src_txt, bib, name)
+    hooks.emit("file", path=path if name is None else name, bib_type=b.bib_type, cached=False)
     return b
 
 
+def _reffile(path, src_txt, bib, name=None):
+    """
+    BibFile or NonbibFile for an already parsed file
+
+    :param pathlib.Path path: Path to file possibly containing BibTeX data, or `None`.
+    :param unicode src_txt: Contents of `path`.
+    :param bib: Result of parsing `src_txt`.
+    :type bib: `pybtex.database.BibliographyData` or `pybtex.exceptions.PybtexError`
+    :param unicode name: Name of content given in memory.
+    :rtype: BibFile or NonbibFile
+    """
+    if isinstance(bib, PybtexError):
+        return NonbibFile(path, src_txt, bib, name=name)
+    else:
+        return BibFile(path, src_txt, bib, name=name)
+
+
 def construct_bibfile_data(*paths):
     """
     List of data corresponding to individual bib files
@@ -67,30 +278,461 @@ def construct_bibfile_data(*paths):
     return bibs
 
 
+def _parse_result(path, cache=None, prescan=False, timed=False, encoding=None, jobs=1, details=False, keys=False):
+    """
+    Parse the file at `path` and summarize it as a `ParseResult`
+
+    Module-level so that it can be dispatched to worker processes. If a `cache` is given it is consulted before parsing; the cache itself is not written, since that is left to the calling process. Only the first error of an unparseable file is collected unless `details`, and the keys of a parseable file only if `keys`; a cached result lacking what is asked for counts as a miss, and the file is parsed again.
+
+    If `prescan`, `prescan.quick_scan` is tried before the full parser. A file it accepts gets a result with the number of entries it counted, which is cached like any other. A file it rejects gets a result with `PybtexError` as its `bib_type` but no error details; such results are given a `None` cache key so that they are not cached.
+
+    No hook events are emitted here, since this may run in a worker process. If `timed`, the phases are timed instead and returned for the calling process to emit.
+
+    :param pathlib.Path path: Path to file possibly containing BibTeX data.
+    :param ParseCache cache: Cache of previous results.
+    :param bool prescan: Whether only the parseability of the file is needed.
+    :param bool timed: Whether to time the phases of work.
+    :param str encoding: Encoding of `path`; defaults to the locale's preferred encoding.
+    :param int jobs: Number of worker processes parsing shards of the file; see `parse_sharded`. Must be 1 in worker processes, which cannot start their own.
+    :param bool details: Whether the result must be `ParseResult.complete`.
+    :param bool keys: Whether the result must have the `ParseResult.keys` of a parseable file.
+    :returns: result, cache key (or `None` without a cache), whether the result came from the cache, `(name, wall, cpu, bytes)` tuples of phases (or `None` unless `timed`)
+    :rtype: tuple
+    """
+    phases = [] if timed else None
+    last = [hooks.clock()] if timed else None
+
+    def lap(name, num_bytes=0):
+        if timed:
+            now = hooks.clock()
+            phases.append((name, now[0] - last[0][0], now[1] - last[0][1], num_bytes))
+            last[0] = now
+
+    with path.open("rb") as f:
+        with mapped(f) as data:
+            num_bytes = len(data)
+            if cache is not None:
+                key = cache_key(path, os.fstat(f.fileno()), data, encoding)
+                result = cache.get(key)
+                if result is not None and _has_details(result, details, keys):
+                    lap("read", num_bytes)
+                    return result.with_path(path), key, True, phases
+            else:
+                key = None
+            src_txt = decode_src_txt(data, encoding, path)
+    lap("read", num_bytes)
+
+    if prescan:
+        verdict, num_entries = quick_scan(src_txt)
+        lap("prescan")
+        if verdict is True and not keys:
+            return ParseResult(path, BibliographyData, num_entries=num_entries), key, False, phases
+        elif verdict is False and not details:
+            return ParseResult(path, PybtexError), None, False, phases
+
+    result = ParseResult.from_reffile(_reffile(path, src_txt, parse_sharded(src_txt, jobs)), details, keys)
+    lap("parse")
+    return result, key, False, phases
+
+
+def _has_details(result, details=False, keys=False):
+    """
+    Whether `result` has what `_parse_result` is asked for by `details` and `keys`
+    """
+    if details and not result.complete:
+        return False
+    return not keys or result.keys is not None or not issubclass(result.bib_type, BibliographyData)
+
+
+class _Guarded(object):
+    """
+    Picklable wrapper returning `(exception, None)` or `(None, result)` instead of raising
+
+    `multiprocessing.pool.Pool.apply_async` calls its callback only on success, so results must not be raised in the worker for the callback to see them.
+    """
+    def __init__(self, func):
+        self.func = func
+
+    def __call__(self, *args):
+        try:
+            return None, self.func(*args)
+        except Exception, e:
+            return e, None
+
+
+def resolve_jobs(jobs):
+    """
+    Number of worker processes to start
+
+    :param int jobs: Number requested, or `None` for the number of CPUs.
+    :rtype: int
+    :raises ValueError: if `jobs` is less than 1.
+    """
+    if jobs is None:
+        jobs = multiprocessing.cpu_count()
+    if jobs < 1:
+        raise ValueError("jobs must be at least 1")
+    return jobs
+
+
+def _imap_bounded(pool, func, iterable, window, ordered=True):
+    """
+    Apply `func` to each item of `iterable` in `pool`
+
+    Unlike `multiprocessing.pool.Pool.imap`, `iterable` is consumed only as fast as results are taken, with at most `window` items in flight, so neither the input nor the output is ever materialized. Completed results are yielded as soon as possible: in input order if `ordered`, else in completion order.
+
+    :param multiprocessing.pool.Pool pool: Worker processes.
+    :param func: Picklable callable of one argument.
+    :param iterable: Arguments to `func`.
+    :param int window: Maximum number of items in flight.
+    :param bool ordered: Whether to yield results in input order.
+    :rtype: generator
+    """
+    guarded = _Guarded(func)
+    done = Queue.Queue()
+    pending = collections.deque()
+
+    def take():
+        if ordered:
+            error, result = pending.popleft().get()
+        else:
+            error, result = done.get()
+            pending.pop()
+        if error is not None:
+            raise error
+        return result
+
+    def ready():
+        if ordered:
+            return pending and pending[0].ready()
+        return not done.empty()
+
+    for item in iterable:
+        pending.append(pool.apply_async(guarded, (item,), callback=None if ordered else done.put))
+        if len(pending) >= window:
+            yield take()
+        while ready():
+            yield take()
+
+    while pending:
+        yield take()
+
+
+def _parse_shard(shard):
+    """
+    Parse a shard from `stream.iter_shards`
+
+    :param tuple shard: macros, shard.
+    :returns: Bibliography data, or `None` if the shard fails to parse
+    :rtype: `pybtex.database.BibliographyData`
+    """
+    macros, src_txt = shard
+    parser = bibtex.Parser(macros=macros)
+    try:
+        return parser.parse_stream(StringIO.StringIO(src_txt))
+    except PybtexError:
+        return None
+
+
+def parse_sharded(src_txt, jobs=None, shard_size=None):
+    """
+    Parse a string containing BibTeX in shards, in a pool of worker processes
+
+    The source is split between commands by `stream.iter_shards` and the parsed shards are merged in order, so the result is identical to that of `parse_bib_txt`, including keys repeated in different shards. If any shard fails to parse, or a key is repeated, the whole source is parsed again serially so that the error is exactly the one `parse_bib_txt` gives.
+
+    :param unicode src_txt: BibTeX source.
+    :param int jobs: Number of worker processes; defaults to the number of CPUs.
+    :param int shard_size: Characters of source per shard; defaults to `stream.SHARD_SIZE`.
+    :returns: Bibliography data, or the exception raised upon parsing.
+    :rtype: `pybtex.database.BibliographyData` or `pybtex.exceptions.PybtexError`
+    """
+    jobs = resolve_jobs(jobs)
+
+    # Don't start worker processes for a single shard
+    if shard_size is None:
+        shard_size = stream.SHARD_SIZE
+    shards = stream.iter_shards(src_txt, shard_size)
+    head = list(itertools.islice(shards, 2))
+    if jobs == 1 or len(head) < 2:
+        return parse_bib_txt(src_txt)
+    shards = itertools.chain(head, shards)
+
+    bib = BibliographyData()
+    pool = multiprocessing.Pool(jobs)
+    try:
+        for data in _imap_bounded(pool, _parse_shard, shards, SHARD_WINDOW_PER_JOB * jobs):
+            if data is None:
+                return parse_bib_txt(src_txt)
+            try:
+                for key, entry in data.entries.iteritems():
+                    bib.add_entry(key, entry)
+            except BibliographyDataError:
+                return parse_bib_txt(src_txt)
+            bib.add_to_preamble(*data._preamble)
+    finally:
+        pool.terminate()
+        pool.join()
+    return bib
+
+
+def content_digest(path):
+    """
+    SHA-1 digest of the contents of the file at `path`
+
+    :param pathlib.Path path: Path to file.
+    :rtype: str
+    """
+    digest = hashlib.sha1()
+    with path.open("rb") as f:
+        for block in iter(lambda: f.read(2**16), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _dedupe_content(paths, parse, ordered=True):
+    """
+    Parse files with identical contents only once
+
+    Only the first of each set of byte-identical files in `paths` is passed to `parse`; its result is shared, via `ParseResult.with_path`, by the others. Duplicates are given a `None` cache key and no phase timings.
+
+    :param paths: Iterable of `pathlib.Path`s.
+    :param parse: Function from an iterable of paths to an iterable of `(result, key, hit, phases)` tuples, such as `_parse_result` applied to each path.
+    :param bool ordered: Whether `parse` preserves order; if so, so does this function.
+    :rtype: generator of tuple
+    """
+    seen = set()
+    results = {}
+    first_digests = {}
+    order = collections.deque()
+    waiting = collections.defaultdict(list)
+    ready = []
+
+    def unique_paths():
+        for path in paths:
+            digest = content_digest(path)
+            first = digest not in seen
+            seen.add(digest)
+            if ordered:
+                order.append((path, digest, first))
+            elif not first:
+                if digest in results:
+                    ready.append((results[digest].with_path(path), None, None, None))
+                else:
+                    waiting[digest].append(path)
+            if first:
+                first_digests[path] = digest
+                yield path
+
+    for item in parse(unique_paths()):
+        result = item[0]
+        digest = first_digests.pop(result.path)
+        results[digest] = result
+
+        if ordered:
+            # Duplicates preceding this file
+            while not order[0][2]:
+                path, dup_digest, first = order.popleft()
+                yield results[dup_digest].with_path(path), None, None, None
+            order.popleft()
+            yield item
+            while order and not order[0][2] and order[0][1] in results:
+                path, dup_digest, first = order.popleft()
+                yield results[dup_digest].with_path(path), None, None, None
+        else:
+            yield item
+            for path in waiting.pop(digest, []):
+                yield result.with_path(path), None, None, None
+            while ready:
+                yield ready.pop(0)
+
+    for path, digest, first in order:
+        yield results[digest].with_path(path), None, None, None
+    for item in ready:
+        yield item
+
+
+def iter_parse_results(paths, jobs=None, cache=None, ordered=True, dedupe_content=False, prescan=False, encoding=None, details=False, keys=False):
+    """
+    Generator of `ParseResult`s corresponding to individual bib files
+
+    Files are parsed in a pool of `jobs` worker processes, or if there is only one file, its shards are; see `parse_sharded`. `paths` is consumed lazily and each result is yielded as soon as it is known; in the same order as `paths` if `ordered`, else in order of completion. Files whose results are found in `cache` are not parsed again, and new results are added to `cache` in batches.
+
+    If `dedupe_content`, each file is hashed before parsing and only the first of several byte-identical files is parsed; the others share its result. This keeps one result per distinct file content in memory.
+
+    If anything is subscribed to `refmanage.hooks` when iteration starts, the phases of work on each file are timed, in the worker processes if any, and emitted as hook events in this process.
+
+    :param paths: Iterable of `pathlib.Path`s to files possibly containing BibTeX data.
+    :param int jobs: Number of worker processes; defaults to the number of CPUs.
+    :param ParseCache cache: Cache of results; defaults to no caching.
+    :param bool ordered: Whether to yield results in the order of `paths`.
+    :param bool dedupe_content: Whether to parse byte-identical files only once.
+    :param bool prescan: Whether only the parseability of each file is needed, in which case the results of unparseable files may lack error details. See `_parse_result`.
+    :param str encoding: Encoding of the files; defaults to the locale's preferred encoding.
+    :param bool details: Whether every result must be `ParseResult.complete`, with every error of an unparseable file rather than only the first; cached results which are not are ignored.
+    :param bool keys: Whether to collect the `ParseResult.keys` of parseable files; cached results without them are ignored.
+    :rtype: generator of `ParseResult`
+    :raises UndecodableFileError: if a file is not valid in `encoding`.
+    """
+    jobs = resolve_jobs(jobs)
+
+    # A single file is parsed in shards instead of in a pool of files
+    paths = iter(paths)
+    head = list(itertools.islice(paths, 2))
+    shard_jobs = 1
+    if len(head) < 2:
+        jobs, shard_jobs = 1, jobs
+    paths = itertools.chain(head, paths)
+
+    parse = functools.partial(_parse_result, cache=cache, prescan=prescan, timed=hooks.active(), encoding=encoding, jobs=shard_jobs,
+        details=details, keys=keys)
+
+    pool = None
+    if jobs == 1:
+        parse_all = functools.partial(itertools.imap, parse)
+    else:
+        pool = multiprocessing.Pool(jobs)
+        parse_all = lambda paths: _imap_bounded(pool, parse, paths, PARSE_WINDOW_PER_JOB * jobs, ordered)
+
+    if dedupe_content:
+        parsed = _dedupe_content(paths, parse_all, ordered)
+    else:
+        parsed = parse_all(paths)
+
+    hits = []
+    misses = []
+    try:
+        for result, key, hit, phases in parsed:
+            for name, wall, cpu, num_bytes in phases or ():
+                hooks.emit("phase", name=name, wall=wall, cpu=cpu, path=result.path, bytes=num_bytes)
+            hooks.emit("file", path=result.path, bib_type=result.bib_type, cached=bool(hit))
+            if cache is not None and key is not None:
+                if hit:
+                    hits.append(key)
+                else:
+                    misses.append((key, result))
+                if len(hits) + len(misses) >= CACHE_UPDATE_BATCH:
+                    cache.update(hits, misses)
+                    hits, misses = [], []
+            yield result
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+        if cache is not None and (hits or misses):
+            cache.update(hits, misses)
+
+
+def construct_parse_results(*paths, **kwargs):
+    """
+    List of `ParseResult`s corresponding to individual bib files
+
+    Files are parsed in a pool of `jobs` worker processes. The returned list is in the same order as `paths` regardless of the number of processes. Files whose results are found in `cache` are not parsed again, and new results are added to `cache`.
+
+    :param pathlib.Path *paths: Path to file possibly containing BibTeX data.
+    :param int jobs: Number of worker processes; defaults to the number of CPUs.
+    :param ParseCache cache: Cache of results; defaults to no caching.
+    :param str encoding: Encoding of the files; defaults to the locale's preferred encoding.
+    :rtype: list
+    """
+    jobs = kwargs.pop("jobs", None)
+    cache = kwargs.pop("cache", None)
+    encoding = kwargs.pop("encoding", None)
+    if kwargs:
+        raise TypeError("Unexpected keyword argument(s): " + ", ".join(kwargs))
+
+    results = list(iter_parse_results(paths, jobs, cache, encoding=encoding))
+    return results
+
+
 def bib_sublist(bibfile_data, val_type):
     """
     Sublist of bibfile_data whos elements are val_type
 
     This method examines each bib_dict element of a bibfile_data list and returns the subset which can be classified according to val_type.
 
-    :param list bibfile_data: List containing `RefFile`s.
+    :param list bibfile_data: List containing `RefFile`s or `ParseResult`s.
     :param type val_type:
     :rtype: list
     """
-    sublist = [bibfile for bibfile in bibfile_data if isinstance(bibfile.bib, val_type)]
+    sublist = [bibfile for bibfile in bibfile_data if issubclass(bibfile.bib_type, val_type)]
     return sublist
 
 
+def iter_stdout_test_msg(bibfile_data, verbose=False):
+    """
+    Generate appropriate message for STDOUT piece by piece
+
+    Generator version of `gen_stdout_test_msg`; joining the yielded strings gives the same message, but each file's line is available as soon as the file is.
+
+    :param bibfile_data: Iterable of `RefFile`s or `ParseResult`s.
+    :param bool verbose: Directive to construct verbose/terse STDOUT string.
+    :rtype: generator of unicode
+    """
+    bibfile_data = iter(bibfile_data)
+    for bibfile in itertools.islice(bibfile_data, 1):
+        with hooks.phase("message", path=bibfile.path):
+            msg = bibfile.test_msg(verbose)
+        yield msg
+    for bibfile in bibfile_data:
+        with hooks.phase("message", path=bibfile.path):
+            msg = "\n" + bibfile.test_msg(verbose)
+        yield msg
+
+
+def test_record(bibfile, times=None):
+    """
+    Machine-readable summary of a tested file
+
+    :param bibfile: `RefFile` or `ParseResult`.
+    :param tuple times: Seconds prescanning and parsing, bytes read and whether the result was cached, as from `hooks.FileTimes.pop`, if known.
+    :returns: Mapping of "path" (the name of content given in memory), "parseable", "entries", "error_type", "message", "lineno", "context", "errors", "seconds", "bytes" and "cached" to values, `None` where unknown
+    :rtype: dict
+    """
+    if isinstance(bibfile, RefFile):
+        bibfile = ParseResult.from_reffile(bibfile)
+    seconds, num_bytes, cached = times if times is not None else (None, None, None)
+    return {"path": bibfile.terse_msg(),
+            "parseable": issubclass(bibfile.bib_type, BibliographyData),
+            "entries": bibfile.num_entries,
+            "error_type": bibfile.error_type,
+            "message": bibfile.message,
+            "lineno": bibfile.lineno,
+            "context": bibfile.context,
+            "errors": [{"error_type": error_type, "message": message, "lineno": lineno, "context": context}
+                       for error_type, message, lineno, context in bibfile.errors],
+            "seconds": seconds,
+            "bytes": num_bytes,
+            "cached": cached}
+
+
+def iter_stdout_test_jsonl(bibfile_data, file_times=None):
+    """
+    Generate JSON Lines for STDOUT, one line per file
+
+    Each line is the JSON object of `test_record`, written as soon as its file is available.
+
+    :param bibfile_data: Iterable of `RefFile`s or `ParseResult`s.
+    :param hooks.FileTimes file_times: Subscriber which recorded the times of the files, if any.
+    :rtype: generator of str
+    """
+    for bibfile in bibfile_data:
+        with hooks.phase("message", path=bibfile.path):
+            times = file_times.pop(bibfile.path) if file_times is not None else None
+            line = json.dumps(test_record(bibfile, times), sort_keys=True) + "\n"
+        yield line
+
+
 def gen_stdout_test_msg(bibfile_data, verbose=False):
     """
     Generate appropriate message for STDOUT
 
     This method creates the string to be printed to STDOUT from the items of the `bibfile_data` list argument. It generates either a terse or verbose message based on the state of the `verbose` argument.
 
-    :param list bibfile_data: List containing `RefFile`s.
+    :param list bibfile_data: List containing `RefFile`s or `ParseResult`s.
     :param bool verbose: Directive to construct verbose/terse STDOUT string.
     :rtype: str
     """
-    msg_list = [bibfile.test_msg(verbose) for bibfile in bibfile_data]
-    msg = "\n".join(msg_list)
+    with hooks.phase("message"):
+        msg_list = [bibfile.test_msg(verbose) for bibfile in bibfile_data]
+        msg = "\n".join(msg_list)
     return msg
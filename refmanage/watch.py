@@ -0,0 +1,277 @@
+# -*- coding: utf-8 -*-
+"""
+Watching files for changes (:mod:`refmanage.watch`)
+===================================================
+
+.. currentmodule:: refmanage.watch
+
+A `Watcher` keeps the size and modification time of every file matched by a set of path arguments and reports which files were created, modified or removed. It is woken up by inotify on Linux and otherwise polls at a fixed interval; either way the matched files are compared with the last snapshot before anything is reported, so a change is reported once however many notifications it caused.
+"""
+
+import os
+import glob
+import time
+import errno
+import select
+import struct
+
+
+# Seconds between snapshots when polling, and the longest wait between checks for inotify events
+POLL_INTERVAL = 1.0
+
+# Seconds files must stay unchanged before a change is reported
+DEBOUNCE = 0.2
+
+# inotify event masks, from <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_IGNORED = 0x00008000
+
+INOTIFY_MASK = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO |
+                IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF)
+
+# struct inotify_event without its variable-length name
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+class PollNotifier(object):
+    """
+    Notifier which reports that anything may have changed each time its timeout expires
+    """
+    def watch(self, directories):
+        """
+        Do nothing; polling needs no watches
+        """
+        pass
+
+
+    def wait(self, timeout):
+        """
+        Sleep for `timeout` seconds
+
+        :param float timeout: Seconds to sleep.
+        :returns: `True`, since anything may have changed
+        :rtype: bool
+        """
+        time.sleep(timeout)
+        return True
+
+
+    def close(self):
+        pass
+
+
+class InotifyNotifier(object):
+    """
+    Notifier using the Linux inotify API through `ctypes`
+
+    Directories rather than files are watched, so that files created, or replaced by renaming as many editors do, are noticed.
+
+    :raises OSError: if inotify is not available.
+    """
+    def __init__(self):
+        import ctypes
+        import ctypes.util
+
+        libc_name = ctypes.util.find_library("c")
+        try:
+            libc = ctypes.CDLL(libc_name, use_errno=True)
+            self._add_watch = libc.inotify_add_watch
+            init = libc.inotify_init
+        except (OSError, AttributeError):
+            raise OSError(errno.ENOSYS, "inotify is not available")
+        self._add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self._fd = init()
+        if self._fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+        self._watches = {}
+
+
+    def watch(self, directories):
+        """
+        Watch `directories` in addition to those already watched
+
+        Directories which cannot be watched, for instance because they no longer exist, are skipped.
+
+        :param directories: Iterable of paths to directories.
+        """
+        watched = set(self._watches.values())
+        for directory in directories:
+            if directory not in watched:
+                wd = self._add_watch(self._fd, directory.encode("utf-8") if isinstance(directory, unicode) else directory, INOTIFY_MASK)
+                if wd >= 0:
+                    self._watches[wd] = directory
+                    watched.add(directory)
+
+
+    def _drain(self):
+        """
+        Read all pending events, forgetting watches which the kernel removed
+        """
+        while select.select([self._fd], [], [], 0)[0]:
+            buf = os.read(self._fd, 2**16)
+            pos = 0
+            while pos < len(buf):
+                wd, mask, cookie, name_len = _EVENT_HEADER.unpack_from(buf, pos)
+                pos += _EVENT_HEADER.size + name_len
+                if mask & IN_IGNORED:
+                    self._watches.pop(wd, None)
+
+
+    def wait(self, timeout):
+        """
+        Wait up to `timeout` seconds for events in the watched directories
+
+        :param float timeout: Seconds to wait.
+        :returns: Whether there were any events
+        :rtype: bool
+        """
+        if not select.select([self._fd], [], [], timeout)[0]:
+            return False
+        self._drain()
+        return True
+
+
+    def close(self):
+        """
+        Stop watching
+        """
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+
+def default_notifier():
+    """
+    `InotifyNotifier` if inotify is available, else `PollNotifier`
+    """
+    try:
+        return InotifyNotifier()
+    except OSError:
+        return PollNotifier()
+
+
+class Watcher(object):
+    """
+    Snapshot of the files matched by path arguments, updated as they change
+
+    The files are found as by `utils.iter_files_args`. Iterate over `changes` to wait for and receive the differences from the previous snapshot.
+
+    :param list paths_args: Paths to files, possibly with wildcards.
+    :param bool recursive: Whether to walk directories.
+    :param list include: Patterns passed to `utils.walk_files`.
+    :param list exclude: Patterns passed to `utils.walk_files`.
+    :param notifier: `InotifyNotifier` or `PollNotifier`; defaults to `default_notifier()`.
+    :param float interval: Seconds between snapshots when polling.
+    :param float debounce: Seconds files must stay unchanged before a change is reported.
+    """
+    @property
+    def paths(self):
+        """
+        Paths of the files in the current snapshot, in the order `utils.iter_files_args` found them (read-only)
+
+        :type: list of `pathlib.Path`
+        """
+        return list(self._paths)
+
+
+    def __init__(self, paths_args, recursive=False, include=None, exclude=None,
+                 notifier=None, interval=POLL_INTERVAL, debounce=DEBOUNCE):
+        self._paths_args = paths_args
+        self._recursive = recursive
+        self._include = include
+        self._exclude = exclude
+        self._notifier = notifier if notifier is not None else default_notifier()
+        self._interval = interval
+        self._debounce = debounce
+        self._paths, self._snapshot = self._take_snapshot()
+
+
+    def _directories(self, paths):
+        """
+        Directories to watch for changes to `paths` and for new files matching the path arguments
+
+        :rtype: set
+        """
+        directories = set(str(path.parent) for path in paths)
+        for paths_arg in self._paths_args:
+            paths_arg = os.path.expanduser(paths_arg)
+            directories.update(glob.glob(os.path.dirname(paths_arg) or os.curdir))
+            if self._recursive:
+                for top in glob.glob(paths_arg):
+                    for directory, subdirs, files in os.walk(top):
+                        directories.add(directory)
+        return set(os.path.normpath(directory) for directory in directories)
+
+
+    def _take_snapshot(self):
+        """
+        Find the matched files and watch their directories
+
+        :returns: paths, mapping of each path to its modification time in nanoseconds and size
+        :rtype: tuple
+        """
+        import utils
+
+        paths = []
+        snapshot = {}
+        for path in utils.iter_files_args(self._paths_args, self._recursive, self._include, self._exclude):
+            try:
+                st = os.stat(str(path))
+            except OSError:
+                continue
+            paths.append(path)
+            snapshot[path] = (int(st.st_mtime * 10**9), st.st_size)
+        self._notifier.watch(self._directories(paths))
+        return paths, snapshot
+
+
+    def _settle(self):
+        """
+        Take snapshots until one equals the previous one, waiting `self.debounce` seconds in between
+
+        :returns: paths, snapshot
+        :rtype: tuple
+        """
+        paths, snapshot = self._take_snapshot()
+        while self._notifier.wait(self._debounce):
+            later_paths, later_snapshot = self._take_snapshot()
+            if later_snapshot == snapshot:
+                break
+            paths, snapshot = later_paths, later_snapshot
+        return paths, snapshot
+
+
+    def changes(self):
+        """
+        Wait for changes and generate them
+
+        Each item is reported once the files have stayed unchanged for `debounce` seconds.
+
+        :returns: paths of created or modified files, paths of removed files
+        :rtype: generator of tuple
+        """
+        while True:
+            if not self._notifier.wait(self._interval):
+                continue
+            paths, snapshot = self._settle()
+            modified = [path for path in paths if snapshot[path] != self._snapshot.get(path)]
+            removed = [path for path in self._paths if path not in snapshot]
+            self._paths, self._snapshot = paths, snapshot
+            if modified or removed:
+                yield modified, removed
+
+
+    def close(self):
+        """
+        Stop watching
+        """
+        self._notifier.close()
@@ -18,5 +18,6 @@ setup(name="refmanage",
                    "Topic :: Text Processing",
                    "Natural Language :: English", ],
       install_requires=["pybtex",
-                        "pathlib2", ],
+                        "pathlib2",
+                        "scandir", ],
       entry_points={"console_scripts": "ref=refmanage.refmanage:main"},)
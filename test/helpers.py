@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+"""
+Helpers shared by tests
+"""
+from pybtex.database.input import bibtex
+
+
+def count_parses(test_case):
+    """
+    Replace `bibtex.Parser`, until `test_case` is cleaned up, with a subclass which counts calls to `parse_stream` in `test_case.parse_count`
+
+    :param unittest.TestCase test_case: Test case to count calls for, from its `setUp`.
+    """
+    test_case.parse_count = 0
+    old_parser = bibtex.Parser
+
+    class CountingParser(old_parser):
+        def parse_stream(self, stream):
+            test_case.parse_count += 1
+            return super(CountingParser, self).parse_stream(stream)
+
+    bibtex.Parser = CountingParser
+    test_case.addCleanup(setattr, bibtex, "Parser", old_parser)
+
+
+class ParseCounting(object):
+    """
+    Mixin of test cases counting calls to `parse_stream` in `parse_count`; see `count_parses`
+    """
+    def setUp(self):
+        super(ParseCounting, self).setUp()
+        count_parses(self)
+
+
+def update_reopened(test_case, store, paths):
+    """
+    Update `store` with `paths`, then update it again as opened anew from its file, as a later run would
+
+    :param unittest.TestCase test_case: Test case closing the store opened anew when cleaned up.
+    :param store: Store whose `update` takes paths, jobs and an encoding, such as a `KeyIndex`.
+    :param list paths: `pathlib.Path`s to bib files.
+    :returns: the store opened anew, what the first update returned, what the second update returned
+    :rtype: tuple
+    """
+    first = store.update(paths, jobs=1, encoding="utf-8")
+    store.close()
+    reopened = type(store)(store.path)
+    test_case.addCleanup(reopened.close)
+    return reopened, first, reopened.update(paths, jobs=1, encoding="utf-8")
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+import threading
+import unittest
+import pathlib2 as pathlib
+from multiprocessing.pool import ThreadPool
+from refmanage import background, utils
+from refmanage.ref_exceptions import ParseCancelledError, UndecodableFileError
+from pybtex.database import BibliographyData
+from pybtex.exceptions import PybtexError
+
+
+class Base(unittest.TestCase):
+    """
+    Base class for tests
+
+    Creates a pool of threads to run background tasks in.
+    """
+    def setUp(self):
+        self.paths = [pathlib.Path("test/controls/one.bib"), pathlib.Path("test/controls/invalid.bib"),
+                      pathlib.Path("test/controls/two.bib")]
+        self.pool = ThreadPool(2)
+
+    def tearDown(self):
+        self.pool.terminate()
+        self.pool.join()
+
+    def expected(self):
+        return [result.test_msg(True) for result in utils.construct_parse_results(*self.paths, jobs=1)]
+
+
+class Results(Base):
+    """
+    Tests results of refmanage.background.submit
+    """
+    def test_results_threads(self):
+        """
+        refmanage.background.ParseTask.results should match construct_parse_results when run in threads
+        """
+        task = background.submit(self.paths, pool=self.pool)
+        self.assertEqual([result.test_msg(True) for result in task.results()], self.expected())
+        self.assertTrue(task.done())
+
+    def test_results_processes(self):
+        """
+        refmanage.background.ParseTask.results should match construct_parse_results when run in its own processes
+        """
+        task = background.submit(self.paths, jobs=2)
+        self.assertEqual([result.test_msg(True) for result in task.results()], self.expected())
+
+    def test_iter_completed(self):
+        """
+        refmanage.background.ParseTask.iter_completed should generate every result
+        """
+        task = background.submit(self.paths, pool=self.pool, limit=1)
+        self.assertEqual(sorted(result.test_msg(True) for result in task.iter_completed()), sorted(self.expected()))
+
+    def test_callback(self):
+        """
+        refmanage.background.submit should call the callback with every result
+        """
+        seen = []
+        task = background.submit(self.paths, pool=self.pool, callback=seen.append)
+        task.wait()
+        self.assertEqual(sorted(result.path for result in seen), sorted(self.paths))
+
+    def test_in_memory(self):
+        """
+        refmanage.background.submit should parse contents given in memory
+        """
+        items = [(u"upload.bib", b"@article{one,}\n"), (u"bad.bib", b"@journal article{bad,}")]
+        results = background.submit(items, pool=self.pool).results()
+        self.assertTrue(issubclass(results[0].bib_type, BibliographyData))
+        self.assertTrue(issubclass(results[1].bib_type, PybtexError))
+        self.assertEqual(results[0].terse_msg(), u"upload.bib")
+        self.assertIsNone(results[0].path)
+
+    def test_undecodable(self):
+        """
+        refmanage.background.ParseTask.results should raise the error of an undecodable file
+        """
+        task = background.submit([(u"upload.bib", b"@article{\xff,}")], pool=self.pool, encoding="utf-8")
+        self.assertRaises(UndecodableFileError, task.results)
+
+
+class Cancellation(Base):
+    """
+    Tests cancelling tasks from refmanage.background.submit
+    """
+    def test_cancel(self):
+        """
+        refmanage.background.ParseTask.cancel should stop dispatching items
+        """
+        started = threading.Event()
+        release = threading.Event()
+
+        def items():
+            yield self.paths[0]
+            started.set()
+            release.wait(10)
+            for path in self.paths[1:]:
+                yield path
+
+        task = background.submit(items(), pool=self.pool, limit=1)
+        started.wait(10)
+        self.assertTrue(task.cancel())
+        release.set()
+        self.assertTrue(task.wait(10))
+        self.assertTrue(task.cancelled())
+        self.assertRaises(ParseCancelledError, task.results)
+        self.assertRaises(ParseCancelledError, list, task.iter_completed())
+
+    def test_cancel_finished(self):
+        """
+        refmanage.background.ParseTask.cancel should not cancel a finished task
+        """
+        task = background.submit(self.paths, pool=self.pool)
+        task.wait()
+        self.assertFalse(task.cancel())
+        self.assertEqual(len(task.results()), len(self.paths))
+
+    def test_wait_timeout(self):
+        """
+        refmanage.background.ParseTask.wait should return False if the task does not finish in time
+        """
+        release = threading.Event()
+
+        def items():
+            release.wait(10)
+            yield self.paths[0]
+
+        task = background.submit(items(), pool=self.pool)
+        self.assertFalse(task.wait(0.01))
+        release.set()
+        self.assertTrue(task.wait(10))
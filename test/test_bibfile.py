@@ -1,9 +1,16 @@
 # -*- coding: utf-8 -*-
+import io
+import os
+import shutil
+import tempfile
 import unittest
 import pathlib2 as pathlib
 from refmanage import BibFile
+from refmanage.offsets import OffsetIndex
 from refmanage.ref_exceptions import UnparseableBibtexError
 from pybtex.database import BibliographyData
+from pybtex.exceptions import PybtexError
+from helpers import count_parses
 
 
 # Base classes
@@ -52,6 +59,13 @@ class Instantiation(Base):
         with self.assertRaises(UnparseableBibtexError):
             BibFile(self.one_valid_one_invalid)
 
+    def test_unparseable_bib_argument(self):
+        """
+        refmanage.BibFile should raise UnparseableBibtexError if instantiated with a `PybtexError` as the `bib` argument
+        """
+        with self.assertRaises(UnparseableBibtexError):
+            BibFile(self.one, bib=PybtexError("error"))
+
 
 class Attributes(Base):
     """
@@ -201,3 +215,136 @@ class MethodsReturnValues(Base):
         """
         b = BibFile(self.two)
         self.assertEqual(len(b.verbose_msg()), 0)
+
+
+class InMemory(unittest.TestCase):
+    """
+    Tests constructing BibFiles from content in memory
+    """
+    def setUp(self):
+        with open("test/controls/two.bib", "rb") as f:
+            self.data = f.read()
+
+    def test_from_bytes(self):
+        """
+        refmanage.BibFile.from_bytes should parse content without a path and name it in messages
+        """
+        b = BibFile.from_bytes(self.data, name=u"upload.bib")
+        self.assertIsNone(b.path)
+        self.assertEqual(len(b.bib.entries), 2)
+        self.assertEqual(b.terse_msg(), u"upload.bib")
+        self.assertEqual(b.test_msg(True), u"upload.bib\n\n")
+
+    def test_from_bytes_unparseable(self):
+        """
+        refmanage.BibFile.from_bytes should raise UnparseableBibtexError for invalid BibTeX
+        """
+        with self.assertRaises(UnparseableBibtexError):
+            BibFile.from_bytes(b"@journal article{invalid,}")
+
+    def test_from_stream(self):
+        """
+        refmanage.BibFile.from_stream should read bytes or text and default to the name of the stream
+        """
+        with open("test/controls/two.bib", "rb") as f:
+            b = BibFile.from_stream(f)
+        self.assertEqual(b.terse_msg(), u"test/controls/two.bib")
+        b = BibFile.from_stream(io.StringIO(self.data.decode("utf-8")))
+        self.assertEqual((b.terse_msg(), len(b.bib.entries)), (u"<stream>", 2))
+
+
+class Open(unittest.TestCase):
+    """
+    Tests opening BibFiles for access to single entries
+    """
+    src_txt = (u"@string{cj = {The Computer Journal}}\n\n"
+               u"@article{Knuth1984,\n  title = {Literate Programming},\n  journal = cj,\n}\n\n"
+               u"@inproceedings{child,\n  title = {Child},\n  crossref = {parent},\n}\n\n"
+               u"@proceedings{parent,\n  title = {Parent},\n  year = {2001},\n}\n")
+
+    def setUp(self):
+        """
+        Write a bib file, and count parses
+        """
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = pathlib.Path(self.tmpdir, "refs.bib")
+        with self.path.open("w", encoding="utf-8") as f:
+            f.write(self.src_txt)
+        self.index = OffsetIndex(os.path.join(self.tmpdir, "cache", "offsets.sqlite"))
+
+        count_parses(self)
+
+    def tearDown(self):
+        self.index.close()
+        shutil.rmtree(self.tmpdir)
+
+    def test_first_open_parses(self):
+        """
+        refmanage.BibFile.open should parse a file it does not know to be parseable
+        """
+        b = BibFile.open(self.path, "utf-8", self.index)
+        self.assertEqual(self.parse_count, 1)
+        self.assertEqual(b.get_entry(u"knuth1984").fields["journal"], u"The Computer Journal")
+        self.assertEqual(self.parse_count, 1)
+
+    def test_get_entry(self):
+        """
+        refmanage.BibFile.get_entry should parse only the macros and the entries needed once the file is known to be parseable
+        """
+        BibFile.open(self.path, "utf-8", self.index)
+        b = BibFile.open(self.path, "utf-8", self.index)
+        self.assertEqual(self.parse_count, 1)
+        self.assertEqual(b.get_entry(u"KNUTH1984").fields["journal"], u"The Computer Journal")
+        self.assertEqual(self.parse_count, 3)
+        child = b.get_entry(u"child")
+        self.assertEqual(child.fields["year"], u"2001")
+        self.assertEqual(self.parse_count, 5)
+        self.assertEqual(b.get_entry(u"parent").fields["title"], u"Parent")
+        self.assertEqual(self.parse_count, 5)
+        self.assertRaises(KeyError, b.get_entry, u"nope")
+
+    def test_lazy_bib(self):
+        """
+        refmanage.BibFile.bib should be parsed when first used by a BibFile opened without parsing
+        """
+        BibFile.open(self.path, "utf-8", self.index)
+        b = BibFile.open(self.path, "utf-8", self.index)
+        self.assertIs(b.bib_type, BibliographyData)
+        self.assertEqual(self.parse_count, 1)
+        self.assertEqual(list(b.bib.entries), [u"Knuth1984", u"child", u"parent"])
+        self.assertEqual(b.src_txt, self.src_txt)
+        self.assertEqual(self.parse_count, 2)
+
+    def test_changed_file(self):
+        """
+        refmanage.BibFile.open should parse a file again once it changes
+        """
+        BibFile.open(self.path, "utf-8", self.index)
+        with self.path.open("w", encoding="utf-8") as f:
+            f.write(u"@misc{renamed,}\n")
+        b = BibFile.open(self.path, "utf-8", self.index)
+        self.assertEqual(self.parse_count, 2)
+        self.assertEqual(list(b.bib.entries), [u"renamed"])
+
+    def test_changed_span(self):
+        """
+        refmanage.BibFile.get_entry should parse the whole file if an entry changed without its modification time or size changing
+        """
+        # Whole seconds survive `os.utime` exactly
+        os.utime(str(self.path), (1000000000, 1000000000))
+        BibFile.open(self.path, "utf-8", self.index)
+        with self.path.open("w", encoding="utf-8") as f:
+            f.write(self.src_txt.replace(u"Literate", u"Iterated"))
+        os.utime(str(self.path), (1000000000, 1000000000))
+        b = BibFile.open(self.path, "utf-8", self.index)
+        self.assertEqual(self.parse_count, 1)
+        self.assertEqual(b.get_entry(u"Knuth1984").fields["title"], u"Iterated Programming")
+        self.assertEqual(self.parse_count, 2)
+
+    def test_unparseable(self):
+        """
+        refmanage.BibFile.open should raise UnparseableBibtexError for an unparseable file, and not record it
+        """
+        with self.assertRaises(UnparseableBibtexError):
+            BibFile.open(pathlib.Path("test/controls/invalid.bib"), "utf-8", self.index)
+        self.assertEqual(len(self.index), 0)
@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import tempfile
+import unittest
+import pathlib2 as pathlib
+from refmanage import utils
+from refmanage.cache import ParseCache, cache_key
+from pybtex.exceptions import PybtexError
+from helpers import ParseCounting
+
+
+# Base classes
+# ============
+class Base(unittest.TestCase):
+    """
+    Base class for tests
+
+    This class is intended to be subclassed so that the same `setUp` method does not have to be rewritten for each class containing tests.
+    """
+    def setUp(self):
+        """
+        Create a `ParseCache` in a temporary directory and copies of control data
+        """
+        self.tmpdir = tempfile.mkdtemp()
+        self.cache = ParseCache(os.path.join(self.tmpdir, "cache", "parse_results.sqlite"))
+
+        self.one = pathlib.Path(self.tmpdir, "one.bib")
+        self.invalid = pathlib.Path(self.tmpdir, "invalid.bib")
+        shutil.copy("test/controls/one.bib", str(self.one))
+        shutil.copy("test/controls/invalid.bib", str(self.invalid))
+
+    def tearDown(self):
+        """
+        Remove temporary directory
+        """
+        self.cache.close()
+        shutil.rmtree(self.tmpdir)
+
+    def key(self, path):
+        """
+        Cache key of `path`
+        """
+        with path.open("rb") as f:
+            data = f.read()
+        return cache_key(path, os.stat(str(path)), data)
+
+
+class Instantiation(Base):
+    """
+    Test all aspects of instantiating an object
+
+    Includes input of wrong type, input outside of a bound, etc.
+    """
+    def test_creates_directory(self):
+        """
+        refmanage.cache.ParseCache should create the directory containing its database
+        """
+        len(self.cache)
+        self.assertTrue(os.path.isfile(self.cache.path))
+
+
+class MethodsReturnValues(Base):
+    """
+    Tests values of methods against known values
+    """
+    def test_get_empty(self):
+        """
+        refmanage.cache.ParseCache.get should return None for a key not in the cache
+        """
+        self.assertIsNone(self.cache.get(self.key(self.one)))
+
+    def test_get_stored(self):
+        """
+        refmanage.cache.ParseCache.get should return a result stored with `update`
+        """
+        result, key, hit, phases = utils._parse_result(self.invalid, self.cache)
+        self.cache.update(misses=[(key, result)])
+        cached = self.cache.get(key)
+        self.assertEqual(cached.test_msg(True), result.test_msg(True))
+        self.assertTrue(issubclass(cached.bib_type, PybtexError))
+
+    def test_get_modified(self):
+        """
+        refmanage.cache.ParseCache.get should return None after the file has been modified
+        """
+        result, key, hit, phases = utils._parse_result(self.one, self.cache)
+        self.cache.update(misses=[(key, result)])
+        with self.one.open("ab") as f:
+            f.write(b"@article{three,}\n")
+        self.assertIsNone(self.cache.get(self.key(self.one)))
+
+    def test_get_other_pybtex_version(self):
+        """
+        refmanage.cache.ParseCache.get should return None for an entry stored by a different pybtex version
+        """
+        result, key, hit, phases = utils._parse_result(self.one, self.cache)
+        self.cache.update(misses=[(key[:-1] + ("0.0",), result)])
+        self.assertIsNone(self.cache.get(key))
+
+    def test_get_other_encoding(self):
+        """
+        refmanage.cache.ParseCache.get should return None for an entry stored for a different encoding
+        """
+        result, key, hit, phases = utils._parse_result(self.one, self.cache, encoding="utf-8")
+        self.cache.update(misses=[(key, result)])
+        other_key = utils._parse_result(self.one, self.cache, encoding="latin-1")[1]
+        self.assertIsNone(self.cache.get(other_key))
+
+    def test_eviction(self):
+        """
+        refmanage.cache.ParseCache should evict the least recently used entry beyond `max_entries`
+        """
+        cache = ParseCache(self.cache.path, max_entries=1)
+        one, one_key, hit, phases = utils._parse_result(self.one, cache)
+        invalid, invalid_key, hit, phases = utils._parse_result(self.invalid, cache)
+        cache.update(misses=[(one_key, one)])
+        cache.update(misses=[(invalid_key, invalid)])
+        self.assertEqual(len(cache), 1)
+        self.assertIsNone(cache.get(one_key))
+        self.assertIsNotNone(cache.get(invalid_key))
+        cache.close()
+
+    def test_clear(self):
+        """
+        refmanage.cache.ParseCache.clear should remove all entries
+        """
+        utils.construct_parse_results(self.one, self.invalid, jobs=1, cache=self.cache)
+        self.cache.clear()
+        self.assertEqual(len(self.cache), 0)
+
+    def test_other_schema_version(self):
+        """
+        refmanage.cache.ParseCache should be emptied when opened with another `SCHEMA_VERSION`
+        """
+        utils.construct_parse_results(self.one, self.invalid, jobs=1, cache=self.cache)
+        self.cache.close()
+
+        class OtherCache(ParseCache):
+            SCHEMA_VERSION = ParseCache.SCHEMA_VERSION + 1
+
+        cache = OtherCache(self.cache.path)
+        self.assertEqual(len(cache), 0)
+        cache.close()
+
+
+class CachedParsing(ParseCounting, Base):
+    """
+    Tests parsing with a cache
+    """
+    def test_unchanged_files_not_reparsed(self):
+        """
+        refmanage.utils.construct_parse_results should not parse unchanged files found in the cache
+        """
+        first = utils.construct_parse_results(self.one, self.invalid, jobs=1, cache=self.cache)
+        second = utils.construct_parse_results(self.one, self.invalid, jobs=1, cache=self.cache)
+        self.assertEqual(self.parse_count, 2)
+        self.assertEqual([r.test_msg(True) for r in first], [r.test_msg(True) for r in second])
+
+    def test_cache_hit_path(self):
+        """
+        refmanage.utils.construct_parse_results should report the path it was given for a cached result
+        """
+        utils.construct_parse_results(self.one, jobs=1, cache=self.cache)
+        relative = pathlib.Path(os.path.relpath(str(self.one)))
+        result, = utils.construct_parse_results(relative, jobs=1, cache=self.cache)
+        self.assertEqual(result.path, relative)
+
+    def test_parallel(self):
+        """
+        refmanage.utils.construct_parse_results should use the cache when parsing in parallel
+        """
+        utils.construct_parse_results(self.one, self.invalid, jobs=2, cache=self.cache)
+        self.assertEqual(len(self.cache), 2)
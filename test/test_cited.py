@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+import shutil
+import tempfile
+import unittest
+import pathlib2 as pathlib
+from refmanage.cited import read_aux, cited_entries
+from refmanage.offsets import OffsetIndex
+from helpers import ParseCounting
+
+
+class Base(unittest.TestCase):
+    """
+    Base class for tests
+
+    Creates .aux and bib files in a temporary directory.
+    """
+    files = [
+        ("paper.aux", u"\\relax\n\\citation{knuth1984}\n\\citation{child,Knuth1984}\n\\@input{chap.aux}\n"
+                      u"\\@input{missing.aux}\n\\bibstyle{plain}\n\\bibdata{refs,more.bib}\n"),
+        ("chap.aux", u"\\citation{nowhere}\n\\@input{paper.aux}\n"),
+        ("refs.bib", u"@string{cj = {The Computer Journal}}\n\n"
+                     u"@article{Knuth1984,\n  title = {Literate Programming},\n  journal = cj,\n}\n\n"
+                     u"@inproceedings{child,\n  title = {Child},\n  crossref = {parent},\n}\n\n"
+                     u"@misc{unused,\n  title = {Not cited},\n}\n"),
+        ("more.bib", u"@preamble{\"more\"}\n\n@proceedings{parent,\n  title = {Parent},\n}\n\n"
+                     u"@misc{knuth1984,\n  title = {Shadowed},\n}\n"),
+    ]
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.paths = {}
+        for name, src_txt in self.files:
+            path = pathlib.Path(self.tmpdir, name)
+            with path.open("w", encoding="utf-8") as f:
+                f.write(src_txt)
+            self.paths[name] = path
+        self.index = OffsetIndex(":memory:")
+        self.names = self.index.update([self.paths["refs.bib"], self.paths["more.bib"]], jobs=1, encoding="utf-8")
+
+    def tearDown(self):
+        self.index.close()
+        shutil.rmtree(self.tmpdir)
+
+
+class Aux(Base):
+    """
+    Tests refmanage.cited.read_aux
+    """
+    def test_read_aux(self):
+        """
+        refmanage.cited.read_aux should collect citations without repeats through input files, and the BibTeX files
+        """
+        data = read_aux(self.paths["paper.aux"], "utf-8")
+        self.assertEqual(data.citations, [u"knuth1984", u"child", u"nowhere"])
+        self.assertEqual(data.bibdata, [pathlib.Path(self.tmpdir, "refs.bib"), pathlib.Path(self.tmpdir, "more.bib")])
+
+
+class Entries(ParseCounting, Base):
+    """
+    Tests refmanage.cited.cited_entries
+    """
+    def test_cited_entries(self):
+        """
+        refmanage.cited.cited_entries should give macros and preambles, then the first entry of each key, then cross-referenced entries
+        """
+        cited = cited_entries(self.index, self.names, [u"knuth1984", u"child", u"nowhere"], "utf-8")
+        self.assertEqual(cited.commands, [b"@string{cj = {The Computer Journal}}", b'@preamble{"more"}',
+                                          b"@article{Knuth1984,\n  title = {Literate Programming},\n  journal = cj,\n}",
+                                          b"@inproceedings{child,\n  title = {Child},\n  crossref = {parent},\n}",
+                                          b"@proceedings{parent,\n  title = {Parent},\n}"])
+        self.assertEqual(cited.missing, [u"nowhere"])
+        self.assertEqual(cited.errors, [])
+
+    def test_only_cited_parsed(self):
+        """
+        refmanage.cited.cited_entries should parse only the macros, preambles and entries extracted
+        """
+        cited_entries(self.index, self.names, [u"child"], "utf-8")
+        self.assertEqual(self.parse_count, 4)
+
+    def test_crossref_cited(self):
+        """
+        refmanage.cited.cited_entries should place a cited entry after the entries cross-referencing it
+        """
+        cited = cited_entries(self.index, self.names, [u"parent", u"child"], "utf-8")
+        self.assertEqual([command.split(b",")[0] for command in cited.commands[2:]],
+                         [b"@inproceedings{child", b"@proceedings{parent"])
+
+    def test_all(self):
+        """
+        refmanage.cited.cited_entries should give every entry of the files for "*"
+        """
+        cited = cited_entries(self.index, self.names, [u"*"], "utf-8")
+        self.assertEqual([command.split(b",")[0] for command in cited.commands[2:]],
+                         [b"@article{Knuth1984", b"@inproceedings{child", b"@misc{unused", b"@proceedings{parent"])
+
+    def test_errors(self):
+        """
+        refmanage.cited.cited_entries should report errors parsing the entries extracted
+        """
+        with self.paths["refs.bib"].open("a", encoding="utf-8") as f:
+            f.write(u"\n@misc{broken,\n  title = undefined,\n}\n")
+        names = self.index.update([self.paths["refs.bib"]], jobs=1, encoding="utf-8")
+        cited = cited_entries(self.index, names, [u"broken"], "utf-8")
+        self.assertEqual(cited.commands[2:], [])
+        self.assertEqual(cited.missing, [u"broken"])
+        self.assertEqual(len(cited.errors), 1)
+        self.assertTrue(cited.errors[0].startswith(u"{0}:17: ".format(names[0])))
+
+    def test_command_in_field(self):
+        """
+        refmanage.cited.cited_entries should extract an entry with a command starting a line in a field value whole, and not the command
+        """
+        path = pathlib.Path(self.tmpdir, "field.bib")
+        with path.open("w", encoding="utf-8") as f:
+            f.write(u"@article{k1, note = {see\n@book{y, title={z}}\n}}\n@article{k2, title={t}}\n")
+        names = self.index.update([path], jobs=1, encoding="utf-8")
+        cited = cited_entries(self.index, names, [u"k1", u"y"], "utf-8")
+        self.assertEqual(cited.commands, [b"@article{k1, note = {see\n@book{y, title={z}}\n}}"])
+        self.assertEqual(cited.missing, [u"y"])
+        self.assertEqual(cited.errors, [])
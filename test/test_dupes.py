@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+import shutil
+import tempfile
+import unittest
+import pathlib2 as pathlib
+from refmanage import dupes
+from refmanage.dupes import Fingerprint
+from refmanage.reffile import parse_bib_txt
+
+
+def fingerprints(src_txt):
+    """
+    Fingerprints of the entries of BibTeX text
+    """
+    return [Fingerprint.from_entry(key, entry) for key, entry in parse_bib_txt(src_txt).entries.items()]
+
+
+class Normalization(unittest.TestCase):
+    """
+    Tests fields normalized by refmanage.dupes.Fingerprint.from_entry
+    """
+    def test_fingerprint(self):
+        """
+        refmanage.dupes.Fingerprint.from_entry should strip LaTeX, accents, punctuation, case and DOI prefixes
+        """
+        fingerprint, = fingerprints(u'@article{k, title = {The {\\"O}ber \\emph{Theory}: Part~2.}, '
+                                    u'author = {van der M\\"uller, Jan and Doe, J.}, year = 2001, doi = {https://doi.org/10.1/AbC}}')
+        self.assertEqual(fingerprint, Fingerprint(u"k", None, None, u"10.1/abc", u"the ober theory part 2", u"muller", u"2001"))
+
+    def test_missing_fields(self):
+        """
+        refmanage.dupes.Fingerprint.from_entry should give empty strings for missing fields
+        """
+        fingerprint, = fingerprints(u"@misc{k,}")
+        self.assertEqual(fingerprint, Fingerprint(u"k", None, None, u"", u"", u"", u""))
+
+
+class Similarity(unittest.TestCase):
+    """
+    Tests refmanage.dupes.similarity
+    """
+    def setUp(self):
+        self.a, self.b, self.c, self.d, self.e = fingerprints(u"""
+            @article{a, title = {Synthetic Widgets}, author = {Smith, J.}, year = 2001, doi = {10.1/x}}
+            @article{b, title = {Something else}, author = {Doe, J.}, year = 1999, doi = {10.1/X}}
+            @article{c, title = {Synthetic widget}, author = {Smith, John}}
+            @article{d, title = {Synthetic widgets}, author = {Smith, J.}, year = 2002}
+            @article{e, title = {Synthetic widgets}, author = {Smith, J.}, doi = {10.1/y}}
+            """)
+
+    def test_doi(self):
+        """
+        refmanage.dupes.similarity should decide by DOI when both entries have one
+        """
+        self.assertEqual(dupes.similarity(self.a, self.b), 1.)
+        self.assertEqual(dupes.similarity(self.a, self.e), 0.)
+
+    def test_title(self):
+        """
+        refmanage.dupes.similarity should score similar titles highly when years and surnames do not differ
+        """
+        self.assertGreater(dupes.similarity(self.a, self.c), dupes.THRESHOLD)
+
+    def test_year(self):
+        """
+        refmanage.dupes.similarity should score entries of different years 0
+        """
+        self.assertEqual(dupes.similarity(self.a, self.d), 0.)
+
+
+class Duplicates(unittest.TestCase):
+    """
+    Tests refmanage.dupes.find_duplicates
+    """
+    def test_groups(self):
+        """
+        refmanage.dupes.find_duplicates should group entries similar to any entry of the group
+        """
+        found = dupes.find_duplicates(fingerprints(u"""
+            @article{a, title = {The Theory of Synthetic Widgets}, year = 2001}
+            @article{b, title = {Theory of synthetic widgets.}, year = 2001}
+            @article{c, title = {A theory of synthetic widget}}
+            @article{d, title = {Analytic gadgets}, doi = {10.1/x}}
+            @article{e, title = {Analytic gadgets, revisited}, doi = {10.1/y}}
+            @article{f, title = {Unrelated}, doi = {doi:10.1/X}}
+            """))
+        self.assertEqual([[fingerprint.key for fingerprint in group] for group in found],
+                         [[u"a", u"b", u"c"], [u"d", u"f"]])
+
+    def test_large_bucket(self):
+        """
+        refmanage.dupes.candidate_pairs should split buckets larger than max_bucket by surname and year
+        """
+        found = fingerprints(u"".join(u"@misc{k%d, title = {Introduction}, year = %d}\n" % (i, 2000 + i % 3)
+                                      for i in range(30)))
+        pairs = dupes.candidate_pairs(found, max_bucket=10)
+        self.assertTrue(pairs)
+        self.assertTrue(all(found[i].year == found[j].year for i, j in pairs))
+
+
+class Files(unittest.TestCase):
+    """
+    Tests refmanage.dupes.iter_fingerprints
+    """
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.paths = []
+        for name, src_txt in [("a.bib", u"@article{a,\n title = {Synthetic widgets}}\n"),
+                              ("b.bib", u"\n@article{b, title = {Synthetic widgets.}}\n"),
+                              ("invalid.bib", u"@article{c, title = }\n")]:
+            path = pathlib.Path(self.tmpdir, name)
+            with path.open("w", encoding="utf-8") as f:
+                f.write(src_txt)
+            self.paths.append(path)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_iter_fingerprints(self):
+        """
+        refmanage.dupes.iter_fingerprints should give the path and line of the entries of parseable files
+        """
+        found = sorted(dupes.iter_fingerprints(self.paths, jobs=1, encoding="utf-8"))
+        self.assertEqual([(fingerprint.key, fingerprint.path, fingerprint.lineno) for fingerprint in found],
+                         [(u"a", unicode(self.paths[0].resolve()), 1), (u"b", unicode(self.paths[1].resolve()), 2)])
+
+    def test_parallel(self):
+        """
+        refmanage.dupes.iter_fingerprints should give the same fingerprints in parallel
+        """
+        self.assertEqual(sorted(dupes.iter_fingerprints(self.paths, jobs=2, encoding="utf-8")),
+                         sorted(dupes.iter_fingerprints(self.paths, jobs=1, encoding="utf-8")))
@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+import os
+import time
+import shutil
+import tempfile
+import unittest
+import pathlib2 as pathlib
+from refmanage.entrystore import EntryStore, StoredEntry, parse_query
+from helpers import ParseCounting, update_reopened
+
+
+class Base(unittest.TestCase):
+    """
+    Base class for tests
+
+    Creates an `EntryStore` and bib files in a temporary directory.
+    """
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.store = EntryStore(os.path.join(self.tmpdir, "cache", "entries.sqlite"))
+        self.paths = []
+        for name, src_txt in [("a.bib", u"@article{Knuth1984,\n    author = {Donald E. Knuth},\n    title = {Literate Programming},\n"
+                                        u"    journal = {The Computer Journal},\n    year = {1984},\n"
+                                        u"    abstract = {Programs as works of literature.},\n}\n"),
+                              ("b.bib", u"% comment\n@book{Lamport1994,\n    author = {Leslie Lamport and Ren{\\'e} Müller},\n"
+                                        u"    title = {A Document Preparation System},\n    year = {1994},\n}\n"),
+                              ("invalid.bib", u"@misc{other, title = }\n")]:
+            path = pathlib.Path(self.tmpdir, name)
+            with path.open("w", encoding="utf-8") as f:
+                f.write(src_txt)
+            self.paths.append(path)
+        self.a, self.b = [unicode(path.resolve()) for path in self.paths[:2]]
+        self.knuth = StoredEntry(u"Knuth1984", self.a, 1, u"article", u"Literate Programming", u"1984",
+                                 u"The Computer Journal", u"Knuth, Donald E.")
+        self.lamport = StoredEntry(u"Lamport1994", self.b, 2, u"book", u"A Document Preparation System", u"1994",
+                                   u"", u"Lamport, Leslie and Müller, Ren{\\'e}")
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.tmpdir)
+
+
+class Query(Base):
+    """
+    Tests refmanage.entrystore.EntryStore.query
+    """
+    def setUp(self):
+        super(Query, self).setUp()
+        self.store.update(self.paths, jobs=1, encoding="utf-8")
+
+    def test_all(self):
+        """
+        refmanage.entrystore.EntryStore.query should give all the entries of the parseable files without conditions
+        """
+        self.assertEqual(self.store.query(), [self.knuth, self.lamport])
+        self.assertEqual(len(self.store), 2)
+
+    def test_fields(self):
+        """
+        refmanage.entrystore.EntryStore.query should match keys, authors, journals and types ignoring case
+        """
+        self.assertEqual(self.store.query(key=u"KNUTH1984"), [self.knuth])
+        self.assertEqual(self.store.query(author=u"lamport"), [self.lamport])
+        self.assertEqual(self.store.query(author=u"Muller"), [self.lamport])
+        self.assertEqual(self.store.query(journal=u"the computer journal"), [self.knuth])
+        self.assertEqual(self.store.query(type=u"Book"), [self.lamport])
+        self.assertEqual(self.store.query(author=u"knuth", type=u"book"), [])
+
+    def test_year(self):
+        """
+        refmanage.entrystore.EntryStore.query should match a year or a range of years
+        """
+        self.assertEqual(self.store.query(year=u"1994"), [self.lamport])
+        self.assertEqual(self.store.query(year=u"1980-1990"), [self.knuth])
+        self.assertEqual(self.store.query(year=u"1980-2000"), [self.knuth, self.lamport])
+
+    def test_text(self):
+        """
+        refmanage.entrystore.EntryStore.query should match words found in titles or abstracts
+        """
+        self.assertEqual(self.store.query(text=[u"literature"]), [self.knuth])
+        self.assertEqual(self.store.query(text=[u"document", u"system"]), [self.lamport])
+        self.assertEqual(self.store.query(text=[u"document", u"literature"]), [])
+        self.assertEqual(self.store.query(text=[u'"quoted"']), [])
+
+    def test_limit(self):
+        """
+        refmanage.entrystore.EntryStore.query should give at most `limit` entries
+        """
+        self.assertEqual(self.store.query(limit=1), [self.knuth])
+
+    def test_parse_query(self):
+        """
+        refmanage.entrystore.parse_query should separate fields from words
+        """
+        self.assertEqual(parse_query(u'Author:knuth "literate programming" year:1984 essay'),
+                         {"author": u"knuth", "year": u"1984", "text": [u"literate programming", u"essay"]})
+        self.assertEqual(parse_query(u"journal:\"The Computer Journal\""), {"journal": u"The Computer Journal"})
+        self.assertEqual(parse_query(u"title:literate"), {"text": [u"title:literate"]})
+        self.assertRaises(ValueError, parse_query, u"year:1984 year:1985")
+
+
+class Persistence(ParseCounting, Base):
+    """
+    Tests the store persisted by refmanage.entrystore.EntryStore
+    """
+    def test_unchanged_files_not_reparsed(self):
+        """
+        refmanage.entrystore.EntryStore.update should not parse files unchanged since they were stored
+        """
+        store, first, second = update_reopened(self, self.store, self.paths)
+        self.assertEqual((first, second), (3, 0))
+        self.assertEqual(self.parse_count, 3)
+        self.assertEqual(store.query(), [self.knuth, self.lamport])
+
+    def test_touched_file_not_reparsed(self):
+        """
+        refmanage.entrystore.EntryStore.update should not parse a file whose modification time changed but not its contents
+        """
+        self.store.update(self.paths, jobs=1, encoding="utf-8")
+        later = time.time() + 10
+        os.utime(str(self.paths[0]), (later, later))
+        self.assertEqual(self.store.update(self.paths, jobs=1, encoding="utf-8"), 0)
+        self.assertEqual(self.parse_count, 3)
+
+    def test_changed_file(self):
+        """
+        refmanage.entrystore.EntryStore.update should replace the entries of a file once it changes
+        """
+        self.store.update(self.paths, jobs=1, encoding="utf-8")
+        with self.paths[1].open("w", encoding="utf-8") as f:
+            f.write(u"@misc{renamed,\n    title = {Preparation of documents},\n}\n")
+        self.assertEqual(self.store.update(self.paths, jobs=1, encoding="utf-8"), 1)
+        self.assertEqual(self.store.query(key=u"Lamport1994"), [])
+        self.assertEqual(self.store.query(author=u"lamport"), [])
+        self.assertEqual([entry.key for entry in self.store.query(text=[u"preparation"])], [u"renamed"])
+
+    def test_removed_file(self):
+        """
+        refmanage.entrystore.EntryStore.update should forget files removed since they were stored
+        """
+        self.store.update(self.paths, jobs=1, encoding="utf-8")
+        self.paths[1].unlink()
+        self.store.update(self.paths[:1], jobs=1, encoding="utf-8")
+        self.assertEqual(self.store.query(), [self.knuth])
+        self.assertEqual(self.store.query(text=[u"document"]), [])
+
+    def test_clear(self):
+        """
+        refmanage.entrystore.EntryStore.clear should remove all entries, so that files are parsed again
+        """
+        self.store.update(self.paths, jobs=1, encoding="utf-8")
+        self.store.clear()
+        self.assertEqual(len(self.store), 0)
+        self.assertEqual(self.store.update(self.paths, jobs=1, encoding="utf-8"), 3)
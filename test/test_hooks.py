@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+import unittest
+import pathlib2 as pathlib
+from refmanage import hooks, utils
+
+
+class Base(unittest.TestCase):
+    """
+    Base class for tests
+
+    Subscribes a callback recording events, and unsubscribes it afterwards.
+    """
+    def setUp(self):
+        self.paths = [pathlib.Path("test/controls/one.bib"), pathlib.Path("test/controls/invalid.bib")]
+        self.events = []
+        self.record = lambda event, info: self.events.append((event, info))
+        hooks.subscribe(self.record)
+
+    def tearDown(self):
+        hooks.unsubscribe(self.record)
+
+    def phase_names(self):
+        return [info["name"] for event, info in self.events if event == "phase"]
+
+    def file_paths(self):
+        return [info["path"] for event, info in self.events if event == "file"]
+
+
+class Events(Base):
+    """
+    Tests events emitted by library functions
+    """
+    def test_construct_bibfile_data(self):
+        """
+        refmanage.utils.construct_bibfile_data should emit "read", "parse" and "file" events for each file
+        """
+        utils.construct_bibfile_data(*self.paths)
+        self.assertEqual(self.phase_names(), ["read", "parse"] * 2)
+        self.assertEqual(self.file_paths(), self.paths)
+
+    def test_iter_parse_results_parallel(self):
+        """
+        refmanage.utils.iter_parse_results should emit events in the calling process when parsing in parallel
+        """
+        list(utils.iter_parse_results(self.paths, jobs=2))
+        self.assertEqual(self.phase_names(), ["read", "parse"] * 2)
+        self.assertEqual(self.file_paths(), self.paths)
+
+    def test_read_bytes(self):
+        """
+        refmanage.utils.iter_parse_results should report the bytes read from each file
+        """
+        list(utils.iter_parse_results(self.paths, jobs=1))
+        num_bytes = sum(info["bytes"] for event, info in self.events if event == "phase")
+        self.assertEqual(num_bytes, sum(path.stat().st_size for path in self.paths))
+
+    def test_iter_files_args(self):
+        """
+        refmanage.utils.iter_files_args should emit a "glob" event for each path and one for exhaustion
+        """
+        list(utils.iter_files_args(["test/controls/one.bib", "test/controls/two.bib"]))
+        self.assertEqual(self.phase_names(), ["glob"] * 3)
+
+    def test_unsubscribe(self):
+        """
+        refmanage.hooks.unsubscribe should stop events reaching the callback
+        """
+        hooks.unsubscribe(self.record)
+        utils.construct_bibfile_data(*self.paths)
+        hooks.subscribe(self.record)
+        self.assertEqual(self.events, [])
+
+
+class StatsValues(Base):
+    """
+    Tests values accumulated by refmanage.hooks.Stats
+    """
+    def setUp(self):
+        Base.setUp(self)
+        self.stats = hooks.Stats(slowest=1)
+        hooks.subscribe(self.stats)
+        list(utils.iter_parse_results(self.paths, jobs=1))
+        hooks.unsubscribe(self.stats)
+        self.stats.stop()
+
+    def test_counts(self):
+        """
+        refmanage.hooks.Stats should count files by type of parsed data
+        """
+        stats = self.stats.as_dict()
+        self.assertEqual(stats["files"], 2)
+        self.assertEqual(stats["bib_types"], {"BibliographyData": 1, "TokenRequired": 1})
+        self.assertEqual(stats["phases"]["parse"]["count"], 2)
+
+    def test_slowest(self):
+        """
+        refmanage.hooks.Stats should keep only the requested number of slowest files
+        """
+        self.assertEqual(len(self.stats.as_dict()["slowest"]), 1)
+
+    def test_format(self):
+        """
+        refmanage.hooks.Stats.format should return unicode
+        """
+        self.assertIsInstance(self.stats.format(), unicode)
+
+
+class FileTimesValues(Base):
+    """
+    Tests values recorded by refmanage.hooks.FileTimes
+    """
+    def test_pop(self):
+        """
+        refmanage.hooks.FileTimes.pop should give the bytes read from each file once
+        """
+        file_times = hooks.FileTimes()
+        hooks.subscribe(file_times)
+        list(utils.iter_parse_results(self.paths, jobs=1))
+        hooks.unsubscribe(file_times)
+        for path in self.paths:
+            seconds, num_bytes, cached = file_times.pop(path)
+            self.assertGreaterEqual(seconds, 0)
+            self.assertEqual(num_bytes, path.stat().st_size)
+            self.assertFalse(cached)
+            self.assertIsNone(file_times.pop(path))
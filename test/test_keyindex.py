@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import tempfile
+import unittest
+import pathlib2 as pathlib
+from refmanage import utils
+from refmanage.cache import ParseCache
+from refmanage.keyindex import KeyIndex, KeyLocation, collisions
+from helpers import ParseCounting, update_reopened
+
+
+class Base(unittest.TestCase):
+    """
+    Base class for tests
+
+    Creates a `KeyIndex` and bib files defining a key in several spellings in a temporary directory.
+    """
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.index = KeyIndex(os.path.join(self.tmpdir, "cache", "keys.sqlite"))
+        self.paths = []
+        for name, src_txt in [("a.bib", u"@article{Smith2000,\n}\n\n@book{other,}\n"),
+                              ("b.bib", u"% comment\n@misc{smith2000,}\n@misc{unique,}\n"),
+                              ("invalid.bib", u"@misc{other, title = }\n")]:
+            path = pathlib.Path(self.tmpdir, name)
+            with path.open("w", encoding="utf-8") as f:
+                f.write(src_txt)
+            self.paths.append(path)
+        self.a, self.b = [unicode(path.resolve()) for path in self.paths[:2]]
+
+    def tearDown(self):
+        self.index.close()
+        shutil.rmtree(self.tmpdir)
+
+
+class Collisions(Base):
+    """
+    Tests keys collected by refmanage.keyindex.KeyIndex.update
+    """
+    def test_update(self):
+        """
+        refmanage.keyindex.KeyIndex.update should give the locations of the keys of the parseable files
+        """
+        index = self.index.update(self.paths, jobs=1, encoding="utf-8")
+        self.assertEqual(sorted(index), [u"other", u"smith2000", u"unique"])
+        self.assertEqual(index[u"other"], [KeyLocation(u"other", self.a, 4)])
+
+    def test_case_insensitive(self):
+        """
+        refmanage.keyindex.collisions should report keys differing only in case
+        """
+        index = self.index.update(self.paths, jobs=1, encoding="utf-8")
+        self.assertEqual(collisions(index),
+                         [(u"smith2000", [KeyLocation(u"Smith2000", self.a, 1), KeyLocation(u"smith2000", self.b, 2)])])
+
+    def test_repeated_path(self):
+        """
+        refmanage.keyindex.KeyIndex.update should collect the keys of a path given twice once
+        """
+        index = self.index.update(self.paths[:1] * 2, jobs=1, encoding="utf-8")
+        self.assertEqual(collisions(index), [])
+
+    def test_prescanned_cache(self):
+        """
+        refmanage.keyindex.KeyIndex.update should collect keys from files whose cached results come from a prescan
+        """
+        cache = ParseCache(os.path.join(self.tmpdir, "cache", "parse_results.sqlite"))
+        try:
+            list(utils.iter_parse_results(self.paths, jobs=1, cache=cache, prescan=True, encoding="utf-8"))
+            index = self.index.update(self.paths, jobs=1, cache=cache, encoding="utf-8")
+        finally:
+            cache.close()
+        self.assertEqual(index[u"other"], [KeyLocation(u"other", self.a, 4)])
+
+
+class Persistence(ParseCounting, Base):
+    """
+    Tests the index persisted by refmanage.keyindex.KeyIndex
+    """
+    def test_unchanged_files_not_reparsed(self):
+        """
+        refmanage.keyindex.KeyIndex.update should not parse files unchanged since they were indexed
+        """
+        first, second = update_reopened(self, self.index, self.paths)[1:]
+        self.assertEqual(self.parse_count, 3)
+        self.assertEqual(first, second)
+
+    def test_changed_file(self):
+        """
+        refmanage.keyindex.KeyIndex.update should index a file again once it changes
+        """
+        self.index.update(self.paths, jobs=1, encoding="utf-8")
+        with self.paths[1].open("w", encoding="utf-8") as f:
+            f.write(u"@misc{renamed,}\n")
+        index = self.index.update(self.paths, jobs=1, encoding="utf-8")
+        self.assertEqual(collisions(index), [])
+        self.assertEqual(self.index.lookup(u"renamed"), [KeyLocation(u"renamed", self.b, 1)])
+
+    def test_lookup(self):
+        """
+        refmanage.keyindex.KeyIndex.lookup should find a key in any case among the files indexed, without parsing
+        """
+        self.index.update(self.paths, jobs=1, encoding="utf-8")
+        count = self.parse_count
+        self.assertEqual(self.index.lookup(u"SMITH2000"),
+                         [KeyLocation(u"Smith2000", self.a, 1), KeyLocation(u"smith2000", self.b, 2)])
+        self.assertEqual(self.index.lookup(u"nope"), [])
+        self.assertEqual(self.parse_count, count)
+
+    def test_lookup_removed_file(self):
+        """
+        refmanage.keyindex.KeyIndex.lookup should leave out files removed since they were indexed
+        """
+        self.index.update(self.paths, jobs=1, encoding="utf-8")
+        self.paths[1].unlink()
+        self.assertEqual(self.index.lookup(u"unique"), [])
@@ -2,7 +2,9 @@
 import unittest
 import pathlib2 as pathlib
 from refmanage import NonbibFile
+from refmanage.reffile import parse_bib_txt, format_error_msg
 from refmanage.ref_exceptions import UnparseableBibtexError, ParseableBibtexError
+from pybtex.database import BibliographyData
 from pybtex.exceptions import PybtexError
 
 
@@ -54,6 +56,13 @@ class Instantiation(Base):
         except UnparseableBibtexError:
             self.fail("Instantiation failed though input was valid")
 
+    def test_parseable_bib_argument(self):
+        """
+        refmanage.NonbibFile should raise ParseableBibtexError if instantiated with `BibliographyData` as the `bib` argument
+        """
+        with self.assertRaises(ParseableBibtexError):
+            NonbibFile(self.invalid, bib=BibliographyData())
+
 
 class Attributes(Base):
     """
@@ -189,3 +198,45 @@ class MethodsReturnValues(Base):
         b = NonbibFile(p)
         target = u'Invalid name format: Knauff, , Markus AND Nejasmic, , Jelica'
         self.assertEqual(target, b.verbose_msg())
+
+
+class AllErrors(unittest.TestCase):
+    """
+    Tests reporting every error in a file
+    """
+    def setUp(self):
+        self.src_txt = (u"@string{m = \"M\"}\n@article{one, title = m}\n\n@article{two title = ,}\n\n"
+                        u"@article{three, title = m}\n@book{ONE,}\n\n@article{four, title = {x}\n\n@article{five, title = m}\n")
+        self.b = NonbibFile(pathlib.Path("several_invalid.bib"), self.src_txt, parse_bib_txt(self.src_txt))
+
+    def test_errors(self):
+        """
+        refmanage.NonbibFile.errors() should list every error in order, with line numbers
+        """
+        errors = self.b.errors()
+        self.assertEqual(errors[0], self.b.error_info())
+        self.assertEqual([lineno for error_type, message, lineno, context in errors], [4, 7, 9])
+        self.assertEqual([message for error_type, message, lineno, context in errors[1:]],
+                         [u"repeated bibliograhpy entry: ONE", u"premature end of file"])
+
+    def test_errors_macros(self):
+        """
+        refmanage.NonbibFile.errors() should expand macros defined before the first error
+        """
+        self.assertFalse(any(u"m" == message for error_type, message, lineno, context in self.b.errors()))
+
+    def test_errors_single(self):
+        """
+        refmanage.NonbibFile.errors() should list the single error of a file with one error
+        """
+        b = NonbibFile(pathlib.Path("test/controls/invalid.bib"))
+        self.assertEqual(b.errors(), [b.error_info()])
+
+    def test_verbose_msg(self):
+        """
+        refmanage.NonbibFile.verbose_msg() should include every error
+        """
+        msg = self.b.verbose_msg()
+        self.assertTrue(msg.startswith(format_error_msg(*self.b.error_info())))
+        self.assertIn(u"repeated bibliograhpy entry: ONE (line 7)", msg)
+        self.assertIn(u"premature end of file (line 9)", msg)
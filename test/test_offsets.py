@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import hashlib
+import tempfile
+import unittest
+import pathlib2 as pathlib
+from refmanage.offsets import OffsetIndex, Span, scan_file, file_state, ENTRY, STRING, PREAMBLE
+
+
+class Base(unittest.TestCase):
+    """
+    Base class for tests
+
+    Creates an `OffsetIndex` and bib files in a temporary directory.
+    """
+    src_txt = (u"% héader\n@string{j = {Jöurnal}}\n@comment{@misc{commented,}}\n"
+               u"@article{Smith2000,\n    title = {Ünicode {nested} title},\n    journal = j,\n}\n"
+               u"@preamble{\"x\"}\n@misc(paren, title = \"}\")\n")
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.index = OffsetIndex(os.path.join(self.tmpdir, "cache", "offsets.sqlite"))
+        self.path = pathlib.Path(self.tmpdir, "a.bib")
+        with self.path.open("w", encoding="utf-8") as f:
+            f.write(self.src_txt)
+        self.name = unicode(self.path.resolve())
+        self.data = self.src_txt.encode("utf-8")
+
+    def tearDown(self):
+        self.index.close()
+        shutil.rmtree(self.tmpdir)
+
+
+class Scan(Base):
+    """
+    Tests refmanage.offsets.scan_file
+    """
+    def test_spans(self):
+        """
+        refmanage.offsets.scan_file should give the byte spans of entries, strings and preambles, as pybtex reads them
+        """
+        spans = scan_file(self.path, "utf-8")
+        self.assertEqual([(span.kind, span.key, span.lineno) for span in spans],
+                         [(STRING, None, 2), (ENTRY, u"commented", 3), (ENTRY, u"Smith2000", 4),
+                          (PREAMBLE, None, 8), (ENTRY, u"paren", 9)])
+        self.assertEqual(spans[2].offset, self.data.index(b"@article"))
+
+    def test_read(self):
+        """
+        refmanage.offsets.Span.read should give the raw contents of the command
+        """
+        spans = scan_file(self.path, "utf-8")
+        with self.path.open("rb") as f:
+            contents = [span.read(f) for span in spans]
+        self.assertEqual(contents[2], u"@article{Smith2000,\n    title = {Ünicode {nested} title},\n    journal = j,\n}".encode("utf-8"))
+        self.assertEqual(contents[4], b'@misc(paren, title = "}")')
+
+    def test_not_ascii_compatible(self):
+        """
+        refmanage.offsets.scan_file should refuse encodings whose bytes it cannot split
+        """
+        self.assertRaises(ValueError, scan_file, self.path, "utf-16")
+
+
+class Index(Base):
+    """
+    Tests refmanage.offsets.OffsetIndex
+    """
+    def test_lookup(self):
+        """
+        refmanage.offsets.OffsetIndex.lookup should find the span of a key in any case
+        """
+        self.index.update([self.path], jobs=1, encoding="utf-8")
+        spans = self.index.lookup(u"SMITH2000")
+        self.assertEqual(len(spans), 1)
+        self.assertEqual((spans[0].path, spans[0].key, spans[0].offset),
+                         (self.name, u"Smith2000", self.data.index(b"@article")))
+        self.assertEqual(self.index.lookup(u"nope"), [])
+
+    def test_lookup_paths(self):
+        """
+        refmanage.offsets.OffsetIndex.lookup should give spans in the order of the paths, leaving out other files
+        """
+        other = pathlib.Path(self.tmpdir, "b.bib")
+        with other.open("w", encoding="utf-8") as f:
+            f.write(u"@misc{smith2000,}\n")
+        names = self.index.update([other, self.path, other], jobs=1, encoding="utf-8")
+        self.assertEqual(names, [unicode(other.resolve()), self.name])
+        self.assertEqual([span.key for span in self.index.lookup(u"smith2000", names)], [u"smith2000", u"Smith2000"])
+        self.assertEqual([span.key for span in self.index.lookup(u"smith2000", [self.name])], [u"Smith2000"])
+
+    def test_changed_file(self):
+        """
+        refmanage.offsets.OffsetIndex.update should index a file again once it changes, and only then
+        """
+        self.index.update([self.path], jobs=1, encoding="utf-8")
+        self.index.close()
+        index = OffsetIndex(self.index.path)
+        index.update([self.path], jobs=1, encoding="utf-8")
+        self.assertEqual(len(index.spans(self.name)), 5)
+        with self.path.open("w", encoding="utf-8") as f:
+            f.write(u"@misc{renamed,}\n")
+        index.update([self.path], jobs=1, encoding="utf-8")
+        self.assertEqual(index.spans(self.name), [Span(self.name, ENTRY, u"renamed", 0, 15, 1, hashlib.sha1(b"@misc{renamed,}").hexdigest())])
+        self.assertEqual(index.lookup(u"smith2000"), [])
+        index.close()
+
+    def test_record(self):
+        """
+        refmanage.offsets.OffsetIndex.file_spans should give the spans recorded for a file until it changes
+        """
+        self.index.update([self.path], jobs=1, encoding="utf-8")
+        self.assertIsNone(self.index.file_spans(self.path, "utf-8"))
+        spans = scan_file(self.path, "utf-8")
+        self.index.record(self.path, spans, file_state(self.path, "utf-8"))
+        self.assertEqual(self.index.file_spans(self.path, "utf-8"), spans)
+        self.assertIsNone(self.index.file_spans(self.path, "latin-1"))
+        self.index.update([self.path], jobs=1, encoding="utf-8")
+        self.assertEqual(self.index.file_spans(self.path, "utf-8"), spans)
+        with self.path.open("a", encoding="utf-8") as f:
+            f.write(u"\n")
+        self.assertIsNone(self.index.file_spans(self.path, "utf-8"))
@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+import unittest
+import pickle
+import pathlib2 as pathlib
+from refmanage import ParseResult
+from refmanage import utils
+from pybtex.database import BibliographyData
+from pybtex.exceptions import PybtexError
+
+
+# Base classes
+# ============
+class Base(unittest.TestCase):
+    """
+    Base class for tests
+
+    This class is intended to be subclassed so that the same `setUp` method does not have to be rewritten for each class containing tests.
+    """
+    def setUp(self):
+        """
+        Create `ParseResult`s from various control data
+        """
+        self.two = ParseResult.from_reffile(utils.reffile_factory(pathlib.Path("test/controls/two.bib")))
+        self.invalid = ParseResult.from_reffile(utils.reffile_factory(pathlib.Path("test/controls/invalid.bib")))
+
+
+class Instantiation(Base):
+    """
+    Test all aspects of instantiating an object
+
+    Includes input of wrong type, input outside of a bound, etc.
+    """
+    def test_no_input(self):
+        """
+        refmanage.ParseResult should raise TypeError if instantiated with no input
+        """
+        with self.assertRaises(TypeError):
+            ParseResult()
+
+    def test_pickle(self):
+        """
+        refmanage.ParseResult should survive a pickle round trip
+        """
+        for protocol in range(pickle.HIGHEST_PROTOCOL + 1):
+            result = pickle.loads(pickle.dumps(self.invalid, protocol))
+            self.assertEqual(result.verbose_msg(), self.invalid.verbose_msg())
+
+
+class Attributes(Base):
+    """
+    Test attributes of ParseResult
+
+    These tests include type checks, setting immutable attributes, etc.
+    """
+    def test_path_type(self):
+        """
+        refmanage.ParseResult.path should be of type `pathlib.Path`
+        """
+        self.assertIsInstance(self.two.path, pathlib.Path)
+
+    def test_bib_type_parseable(self):
+        """
+        refmanage.ParseResult.bib_type should be `BibliographyData` for a parseable file
+        """
+        self.assertTrue(issubclass(self.two.bib_type, BibliographyData))
+
+    def test_bib_type_unparseable(self):
+        """
+        refmanage.ParseResult.bib_type should be a subclass of `PybtexError` for an unparseable file
+        """
+        self.assertTrue(issubclass(self.invalid.bib_type, PybtexError))
+
+    def test_no_source_data(self):
+        """
+        refmanage.ParseResult should reference neither source text nor bibliography data
+        """
+        self.assertFalse(hasattr(self.two, "__dict__"))
+        self.assertFalse(hasattr(self.two, "src_txt"))
+        self.assertFalse(hasattr(self.two, "bib"))
+
+    def test_bib_type_immutability(self):
+        """
+        Attempting to set `refmanage.ParseResult.bib_type` should raise AttributeError
+        """
+        with self.assertRaises(AttributeError):
+            self.two.bib_type = PybtexError
+
+
+class MethodsReturnValues(Base):
+    """
+    Tests values of methods against known values
+    """
+    def test_verbose_msg_parseable(self):
+        """
+        refmanage.ParseResult.verbose_msg() should return a str of zero length for a parseable file
+        """
+        self.assertEqual(len(self.two.verbose_msg()), 0)
+
+    def test_verbose_msg_unparseable(self):
+        """
+        refmanage.ParseResult.verbose_msg() should match `NonbibFile.verbose_msg()`
+        """
+        b = utils.reffile_factory(pathlib.Path("test/controls/invalid.bib"))
+        self.assertEqual(self.invalid.verbose_msg(), b.verbose_msg())
+
+    def test_test_msg(self):
+        """
+        refmanage.ParseResult.test_msg() should match `RefFile.test_msg()`
+        """
+        b = utils.reffile_factory(pathlib.Path("test/controls/invalid.bib"))
+        self.assertEqual(self.invalid.test_msg(True), b.test_msg(True))
+
+    def test_errors(self):
+        """
+        refmanage.ParseResult.errors should match `NonbibFile.errors()` and survive a pickle round trip
+        """
+        src_txt = u"@article{one title = ,}\n@article{two, title = {x}\n"
+        b = utils._reffile(pathlib.Path("several_invalid.bib"), src_txt, utils.parse_bib_txt(src_txt))
+        result = ParseResult.from_reffile(b)
+        self.assertEqual(result.errors, b.errors())
+        self.assertEqual(len(result.errors), 2)
+        self.assertEqual(pickle.loads(pickle.dumps(result)).errors, result.errors)
+        self.assertEqual(result.with_path(self.two.path).verbose_msg(), b.verbose_msg())
+
+    def test_errors_parseable(self):
+        """
+        refmanage.ParseResult.errors should be empty for a parseable file
+        """
+        self.assertEqual(self.two.errors, [])
+
+    def test_num_entries(self):
+        """
+        refmanage.ParseResult.num_entries should count the entries of a parseable file only
+        """
+        self.assertEqual(self.two.num_entries, 2)
+        self.assertEqual(self.two.with_path(self.invalid.path).num_entries, 2)
+        self.assertIsNone(self.invalid.num_entries)
+
+    def test_keys(self):
+        """
+        refmanage.ParseResult.keys should give the key and line number of each entry of a parseable file only, if asked for
+        """
+        two = ParseResult.from_reffile(utils.reffile_factory(pathlib.Path("test/controls/two.bib")), keys=True)
+        self.assertEqual(two.keys, [(u"one", 1), (u"two", 5)])
+        self.assertEqual(two.with_path(self.invalid.path).keys, [(u"one", 1), (u"two", 5)])
+        self.assertIsNone(self.two.keys)
+        self.assertIsNone(self.invalid.keys)
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+import io
+import glob
+import random
+import unittest
+from refmanage.prescan import quick_verdict, quick_scan, MAX_BRACE_DEPTH
+from refmanage.reffile import parse_bib_txt
+from pybtex.database import BibliographyData
+
+
+def pybtex_verdict(src_txt):
+    """
+    Whether pybtex parses `src_txt`, or "error" if pybtex fails with an exception other than `PybtexError`
+    """
+    try:
+        return isinstance(parse_bib_txt(src_txt), BibliographyData)
+    except Exception:
+        return "error"
+
+
+# Inputs exercising the parts of the BibTeX grammar which the control files do not
+CASES = [
+    u"@string{foo = \"Foo\" # jan}\n@preamble{\"x\" # foo}\n@article(k1, author = \"A and B, C\", title = foo # {x{y}})\n",
+    u"@comment{ junk @article{k1, title = {x}} }",
+    u"@comment{ junk @ }",
+    u"@article{k1, title = undefined}",
+    u"@article{k1,}\n@book{K1,}",
+    u"@article{k1, author = {Smith, John, Jr, Extra}}",
+    u"@article{k1, author = {Smith, John, Jr}}",
+    u"@article{k1, author = {, John}}",
+    u"@article{k1, author = {A and ~ and B}}",
+    u"@article{k1, title = 2014abc}",
+    u"@article{abc = {x}}",
+    u"@article{k1 title = {x}}",
+    u"@article{k1,,, title = {x},,}",
+    u"@article{k1, title = {x}",
+    u"@article{k1, title = \"x}\"}",
+    u"@article{k1, title = \"x{\"}\"}",
+    u"@article{k1, title = " + u"{" * (MAX_BRACE_DEPTH + 3) + u"x" + u"}" * (MAX_BRACE_DEPTH + 3) + u"}",
+    u"text with an email@address.com in it",
+    u"@",
+    u"@article",
+]
+
+FUZZ_ALPHABET = u"{}\"@,=#() \n\tabcAND and,0123~\xa0"
+
+
+class Conformance(unittest.TestCase):
+    """
+    Tests that quick_verdict agrees with pybtex whenever it gives a verdict
+    """
+    def assertConforms(self, src_txt):
+        verdict = quick_verdict(src_txt)
+        if verdict is not None:
+            self.assertEqual(verdict, pybtex_verdict(src_txt), repr(src_txt))
+        if verdict is True:
+            self.assertEqual(quick_scan(src_txt), (True, len(parse_bib_txt(src_txt).entries)), repr(src_txt))
+
+    def test_controls(self):
+        """
+        refmanage.prescan.quick_verdict should give pybtex's verdict for each control file
+        """
+        for path in glob.glob("test/controls/*.bib"):
+            with io.open(path) as f:
+                src_txt = f.read()
+            self.assertIsNotNone(quick_verdict(src_txt), path)
+            self.assertConforms(src_txt)
+
+    def test_cases(self):
+        """
+        refmanage.prescan.quick_verdict should agree with pybtex on assorted corner cases
+        """
+        for src_txt in CASES:
+            self.assertConforms(src_txt)
+
+    def test_deep_braces_uncertain(self):
+        """
+        refmanage.prescan.quick_verdict should return None for braces nested deeper than MAX_BRACE_DEPTH
+        """
+        self.assertIsNone(quick_verdict(CASES[16]))
+
+    def test_fuzz(self):
+        """
+        refmanage.prescan.quick_verdict should agree with pybtex on randomly mutated inputs
+        """
+        seeds = [io.open(path).read() for path in sorted(glob.glob("test/controls/*.bib"))] + CASES
+        rng = random.Random(0)
+        for i in range(3000):
+            chars = list(rng.choice(seeds))
+            for j in range(rng.randint(1, 4)):
+                pos = rng.randint(0, len(chars))
+                op = rng.random()
+                if op < 0.4 or not chars:
+                    chars.insert(pos, rng.choice(FUZZ_ALPHABET))
+                elif op < 0.7:
+                    del chars[min(pos, len(chars) - 1)]
+                else:
+                    chars[min(pos, len(chars) - 1)] = rng.choice(FUZZ_ALPHABET)
+            self.assertConforms(u"".join(chars))
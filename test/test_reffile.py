@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+import shutil
+import tempfile
+import unittest
+import pathlib2 as pathlib
+from refmanage import BibFile
+from refmanage.reffile import load_src_txt, decode_src_txt
+from refmanage.ref_exceptions import UndecodableFileError
+
+
+class Base(unittest.TestCase):
+    """
+    Base class for tests
+
+    Creates files with assorted encodings and line endings in a temporary directory.
+    """
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.latin1 = self.write("latin1.bib", u"@article{k, title = {caf\xe9}}\n".encode("latin-1"))
+        self.crlf = self.write("crlf.bib", b"@article{k,\r\n title = {x}}\r\n\r")
+        self.empty = pathlib.Path("test/controls/empty.bib")
+        self.one = pathlib.Path("test/controls/one.bib")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def write(self, name, data):
+        path = pathlib.Path(self.tmpdir, name)
+        with path.open("wb") as f:
+            f.write(data)
+        return path
+
+
+class MethodsReturnValues(Base):
+    """
+    Tests values of functions against known values
+    """
+    def test_load_src_txt_text_mode(self):
+        """
+        refmanage.reffile.load_src_txt should return what reading in text mode returns
+        """
+        for path in [self.one, self.empty, self.crlf]:
+            with path.open() as f:
+                self.assertEqual(load_src_txt(path), f.read())
+
+    def test_load_src_txt_encoding(self):
+        """
+        refmanage.reffile.load_src_txt should decode with the given encoding
+        """
+        self.assertEqual(load_src_txt(self.latin1, "latin-1"), u"@article{k, title = {caf\xe9}}\n")
+
+    def test_load_src_txt_undecodable(self):
+        """
+        refmanage.reffile.load_src_txt should raise UndecodableFileError naming the file and offset of an invalid byte
+        """
+        with self.assertRaisesRegexp(UndecodableFileError, "latin1.bib is not valid utf-8: byte 0xe9 at offset 24"):
+            load_src_txt(self.latin1, "utf-8")
+
+    def test_decode_src_txt_newlines(self):
+        """
+        refmanage.reffile.decode_src_txt should translate all newlines to "\\n"
+        """
+        self.assertEqual(decode_src_txt(b"a\r\nb\rc\n", "ascii"), u"a\nb\nc\n")
+
+    def test_bibfile_encoding(self):
+        """
+        refmanage.BibFile should read its file with the given encoding
+        """
+        bibfile = BibFile(self.latin1, encoding="latin-1")
+        self.assertEqual(bibfile.bib.entries["k"].fields["title"], u"caf\xe9")
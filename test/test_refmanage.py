@@ -1,9 +1,16 @@
 # -*- coding: utf-8 -*-
+import os
+import shutil
+import tempfile
 import unittest
 import pathlib2 as pathlib
 import refmanage
 import sys
+import json
 import StringIO
+import subprocess
+from refmanage import hooks
+from refmanage.cache import ParseCache
 
 
 class Base(unittest.TestCase):
@@ -59,6 +66,17 @@ class TestFunctionality(Base):
     """
     Test "test" functionality
     """
+    def set_cache_home(self, path):
+        """
+        Point `$XDG_CACHE_HOME` at `path` until the test ends
+        """
+        old_cache_home = os.environ.get("XDG_CACHE_HOME")
+        os.environ["XDG_CACHE_HOME"] = path
+        if old_cache_home is None:
+            self.addCleanup(os.environ.pop, "XDG_CACHE_HOME")
+        else:
+            self.addCleanup(os.environ.__setitem__, "XDG_CACHE_HOME", old_cache_home)
+
     def test_no_args(self):
         """
         `ref test` without additonal arguments should print the help text
@@ -112,6 +130,117 @@ class TestFunctionality(Base):
 
         self.assertEqual(output_text, self.stdout.getvalue())
 
+    def test_parseable_jsonl(self):
+        """
+        `ref test -p --format jsonl *.bib` should print a JSON object per parseable file
+        """
+        args = self.parser.parse_args(["-t", "-p", "--format", "jsonl", "--no-cache", "test/controls/*.bib"])
+        refmanage.cli_args_dispatcher(args)
+        records = [json.loads(line) for line in self.stdout.getvalue().splitlines()]
+
+        self.assertEqual(sorted((record["path"].rsplit("/", 1)[1], record["entries"]) for record in records),
+                         [("empty.bib", 0), ("one.bib", 1), ("two.bib", 2)])
+        self.assertTrue(all(record["parseable"] for record in records))
+
+    def test_jsonl_filtered_times(self):
+        """
+        `ref test -p --format jsonl` should not keep the times of the files left out
+        """
+        subscribers = []
+        file_times = hooks.FileTimes
+
+        class Recorded(file_times):
+            def __init__(self):
+                super(Recorded, self).__init__()
+                subscribers.append(self)
+
+        hooks.FileTimes = Recorded
+        self.addCleanup(setattr, hooks, "FileTimes", file_times)
+        refmanage.run(["-t", "-p", "--format", "jsonl", "--no-cache", "test/controls/one.bib", "test/controls/invalid.bib"])
+        self.assertEqual(len(self.stdout.getvalue().splitlines()), 1)
+        self.assertEqual(subscribers[0]._done, {})
+
+    def test_jsonl_after_test(self):
+        """
+        `ref test --format jsonl *.bib` should print the same records after `ref test *.bib` has filled the cache as without a cache
+        """
+        cache_home = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_home)
+        self.set_cache_home(cache_home)
+        for flag in ["-p", "-u"]:
+            refmanage.cli_args_dispatcher(self.parser.parse_args(["-t", flag, "test/controls/*.bib"]))
+            records = []
+            for argv in [["--no-cache"], []]:
+                self.stdout.seek(0)
+                self.stdout.truncate()
+                refmanage.cli_args_dispatcher(self.parser.parse_args(["-t", flag, "--format", "jsonl", "test/controls/*.bib"] + argv))
+                records.append([json.loads(line) for line in self.stdout.getvalue().splitlines()])
+                for record in records[-1]:
+                    del record["seconds"], record["cached"]
+            self.assertEqual(records[0], records[1])
+
+    def test_watch_vanished_files(self):
+        """
+        `ref test -p --watch` should treat files removed before they are parsed as removed
+        """
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        path = pathlib.Path(tmp_dir) / u"one.bib"
+        shutil.copy("test/controls/one.bib", str(path))
+        missing = pathlib.Path(tmp_dir) / u"missing.bib"
+
+        class Vanishing(object):
+            """
+            Watcher whose files are removed between its snapshots and their parsing
+            """
+            def __init__(self, *args, **kwargs):
+                self.paths = [path, missing]
+
+            def changes(self):
+                path.unlink()
+                yield [missing, path], []
+
+            def close(self):
+                pass
+
+        module = sys.modules["refmanage.refmanage"]
+        self.addCleanup(setattr, module, "Watcher", module.Watcher)
+        module.Watcher = Vanishing
+        for jobs in ["1", "2"]:
+            shutil.copy("test/controls/one.bib", str(path))
+            self.stdout.truncate(0)
+            refmanage.cli_args_dispatcher(self.parser.parse_args(["-t", "-p", "--watch", "--no-cache", "-j", jobs, tmp_dir]))
+            self.assertEqual(self.stdout.getvalue().splitlines(), [unicode(path.resolve()), u"- " + unicode(path.resolve())])
+
+    def test_unusable_cache(self):
+        """
+        `ref test *.bib` should warn and go on without a cache if the cache directory cannot be created
+        """
+        cache_home = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_home)
+        self.set_cache_home(os.path.join(cache_home, "not_a_directory"))
+        open(os.environ["XDG_CACHE_HOME"], "w").close()
+        refmanage.cli_args_dispatcher(self.parser.parse_args(["-t", "-p", "test/controls/one.bib"]))
+        refmanage.cli_args_dispatcher(self.parser.parse_args(["-k", "test/controls/one.bib"]))
+
+        self.assertEqual(self.stdout.getvalue(), unicode(pathlib.Path("test/controls/one.bib").resolve()))
+        self.assertEqual(self.stderr.getvalue().count("ref: warning: cannot open"), 3)
+
+    def test_run_with_cache(self):
+        """
+        `refmanage.run` should use the parse cache it is given instead of opening one
+        """
+        cache_home = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_home)
+        self.set_cache_home(os.path.join(cache_home, "default"))
+        cache = ParseCache(os.path.join(cache_home, "server", "parse_results.sqlite"))
+        self.addCleanup(cache.close)
+        for n in range(2):
+            refmanage.run(["-t", "-p", "--format", "jsonl", "test/controls/one.bib"], cache=cache)
+        self.assertEqual([json.loads(line)["cached"] for line in self.stdout.getvalue().splitlines()], [False, True])
+        self.assertEqual(len(cache), 1)
+        self.assertFalse(os.path.exists(os.path.join(cache_home, "default")))
+
     def test_unparseable_with_parseable_file(self):
         """
         `ref test -u parseable.bib` should return nothing
@@ -138,3 +267,34 @@ class TestFunctionality(Base):
         """
         with self.assertRaises(SystemExit):
             args = self.parser.parse_args(["-t", "-p", "-u", "test/controls/*.bib"])
+
+    def test_no_jobs(self):
+        """
+        `ref test -j 0 one.bib` should exit with an error
+        """
+        with self.assertRaises(SystemExit):
+            refmanage.run(["-t", "-j", "0", "test/controls/one.bib"])
+        self.assertIn("--jobs must be at least 1", self.stderr.getvalue())
+
+
+class Startup(unittest.TestCase):
+    """
+    Tests modules imported by `ref` at startup
+    """
+    def test_version_without_pybtex(self):
+        """
+        `ref --version` should not import pybtex
+        """
+        output = subprocess.check_output([sys.executable, "-c",
+            "import sys; from refmanage.refmanage import main; sys.argv = ['ref', '--version']; main(); "
+            "print(sorted(name for name in sys.modules if name.split('.')[0] == 'pybtex'))"])
+        self.assertEqual(output.splitlines(), [refmanage.__version__, "[]"])
+
+    def test_star_import(self):
+        """
+        `from refmanage import *` should import the file classes and `utils`
+        """
+        namespace = {}
+        exec "from refmanage import *" in namespace
+        for name in ["RefFile", "BibFile", "NonbibFile", "ParseResult", "utils", "main"]:
+            self.assertIs(namespace[name], getattr(refmanage, name))
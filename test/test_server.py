@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+import io
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import unittest
+from refmanage import server
+
+
+def run(argv, encoding=None):
+    """
+    Command run by the test server: echoes its arguments and exits with the status given by the first
+    """
+    import sys
+    sys.stdout.write(u"argv: {0}\n".format(u" ".join(argv)))
+    sys.stderr.write("cwd: {0}\n".format(os.getcwd()))
+    if argv[0] == "raise":
+        raise RuntimeError("boom")
+    sys.exit(int(argv[0]))
+
+
+class Base(unittest.TestCase):
+    """
+    Base class for tests
+
+    Runs a `Server` of `run` on a socket in a temporary directory.
+    """
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "server.sock")
+        self.server = server.Server(run, self.path)
+        self.server.listen()
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def tearDown(self):
+        self.server.close()
+        shutil.rmtree(self.directory)
+
+    def forward(self, argv):
+        stdout, stderr = io.BytesIO(), io.BytesIO()
+        status = server.forward(argv, self.path, stdout, stderr)
+        return status, stdout.getvalue(), stderr.getvalue()
+
+
+class Forwarding(Base):
+    """
+    Tests commands forwarded by refmanage.server.forward
+    """
+    def test_output(self):
+        """
+        refmanage.server.forward should write the output of the command
+        """
+        status, stdout, stderr = self.forward(["0", u"ünïcode"])
+        self.assertEqual(stdout.decode("utf-8"), u"argv: 0 ünïcode\n")
+        self.assertEqual(stderr, "cwd: {0}\n".format(os.getcwd()))
+
+    def test_exit_status(self):
+        """
+        refmanage.server.forward should return the exit status of the command
+        """
+        self.assertEqual(self.forward(["3"])[0], 3)
+        self.assertEqual(self.forward(["0"])[0], 0)
+
+    def test_exception(self):
+        """
+        refmanage.server.forward should return 1 and the traceback if the command raises
+        """
+        status, stdout, stderr = self.forward(["raise"])
+        self.assertEqual(status, 1)
+        self.assertIn("RuntimeError: boom", stderr)
+
+    def test_no_server(self):
+        """
+        refmanage.server.forward should return None if no server is listening
+        """
+        self.assertIsNone(server.forward(["0"], os.path.join(self.directory, "none.sock")))
+
+
+class Listening(Base):
+    """
+    Tests refmanage.server.Server.listen
+    """
+    def test_already_listening(self):
+        """
+        refmanage.server.Server.listen should raise socket.error if a server is listening on the socket
+        """
+        with self.assertRaises(socket.error):
+            server.Server(run, self.path).listen()
+
+    def test_stale_socket(self):
+        """
+        refmanage.server.Server.listen should replace a socket left behind by a server which has exited
+        """
+        path = os.path.join(self.directory, "stale.sock")
+        stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        stale.bind(path)
+        stale.close()
+        replacement = server.Server(run, path)
+        replacement.listen()
+        try:
+            self.assertTrue(os.path.exists(path))
+        finally:
+            replacement.close()
+        self.assertFalse(os.path.exists(path))
@@ -0,0 +1,229 @@
+# -*- coding: utf-8 -*-
+import glob
+import random
+import shutil
+import tempfile
+import unittest
+import pathlib2 as pathlib
+from refmanage import stream
+from refmanage.reffile import parse_bib_txt
+from pybtex.database import BibliographyData
+
+
+# Inputs exercising the parts of the BibTeX grammar which the control files do not
+CASES = [
+    u"@string{foo = \"Foo\" # jan}\n@preamble{\"x\" # foo}\n@article(k1, author = \"A and B, C\", title = foo # {x{y}})\n",
+    u"@comment{ junk @article{k1, title = {x}} }",
+    u"@article(k1, title = \"x)\" # {y)})\n@book{k2,}",
+    u"@article{k{1, title = {x}}\n@book{k2,}",
+    u"junk before @article{k1,} junk @ between\n@book{k2,}",
+    u"@article{k1,}\n@book{K1,}",
+    u"@article{k1, note = {see\n@book{y, title={z}}\n}}\n@article{k2, title={t}}\n",
+]
+
+FUZZ_ALPHABET = u"{}\"@,=#() \n\tabc0123"
+
+
+def entries(items):
+    """
+    Keys and fields of the entries among `items`
+    """
+    return [(item.key, dict(item.entry.fields)) for item in items if isinstance(item, stream.StreamEntry)]
+
+
+def errors(items):
+    """
+    Line numbers and types of the errors among `items`
+    """
+    return [(item.lineno, item.error_type) for item in items if isinstance(item, stream.StreamError)]
+
+
+class Base(unittest.TestCase):
+    """
+    Base class for tests
+
+    Creates a temporary directory for files to stream.
+    """
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, src_txt, encoding="utf-8"):
+        path = pathlib.Path(self.directory) / "stream.bib"
+        with path.open("wb") as f:
+            f.write(src_txt.encode(encoding))
+        return path
+
+
+class Conformance(Base):
+    """
+    Tests that streaming gives the same entries as a whole-file parse
+    """
+    def assertConforms(self, src_txt):
+        bib = parse_bib_txt(src_txt)
+        items = list(stream.iter_text_entries(src_txt))
+        if isinstance(bib, BibliographyData):
+            self.assertEqual(errors(items), [], repr(src_txt))
+            self.assertEqual(entries(items), [(key, dict(entry.fields)) for key, entry in bib.entries.items()], repr(src_txt))
+        else:
+            self.assertNotEqual(errors(items), [], repr(src_txt))
+
+    def test_controls(self):
+        """
+        refmanage.stream.iter_text_entries should agree with pybtex for each control file
+        """
+        for path in glob.glob("test/controls/*.bib"):
+            with open(path, "rb") as f:
+                self.assertConforms(f.read().decode("utf-8"))
+
+    def test_cases(self):
+        """
+        refmanage.stream.iter_text_entries should agree with pybtex for each case
+        """
+        for src_txt in CASES:
+            self.assertConforms(src_txt)
+
+    def test_command_in_field(self):
+        """
+        refmanage.stream.iter_text_entries should not start a command at an "@" starting a line in a field value
+        """
+        src_txt = u"@article{k1, note = {see\n@book{y, title={z}}\n}}\n@article{k2, title={t}}\n"
+        items = list(stream.iter_text_entries(src_txt))
+        self.assertEqual(errors(items), [])
+        self.assertEqual(entries(items), [(u"k1", {u"note": u"see @book{y, title={z}}"}), (u"k2", {u"title": u"t"})])
+
+    def test_fuzz(self):
+        """
+        refmanage.stream.iter_text_entries should agree with pybtex for random inputs
+        """
+        rng = random.Random(0)
+        for i in range(500):
+            src_txt = u"".join(rng.choice(FUZZ_ALPHABET) for j in range(rng.randint(0, 40)))
+            self.assertConforms(u"@article{" + src_txt)
+
+    def test_block_size(self):
+        """
+        refmanage.stream.iter_entries should give the same results whatever the block size
+        """
+        src_txt = u"\n".join(CASES) + u"\n@article{ü, title = {ß}}\n"
+        path = self.write(src_txt)
+        expected = list(stream.iter_text_entries(src_txt))
+        for block_size in [1, 7, stream.BLOCK_SIZE]:
+            items = list(stream.iter_entries(path, "utf-8", block_size))
+            self.assertEqual(entries(items), entries(expected))
+            self.assertEqual(errors(items), errors(expected))
+
+
+class Positions(Base):
+    """
+    Tests offsets and line numbers reported by refmanage.stream.iter_entries
+    """
+    def test_one_valid_one_invalid(self):
+        """
+        refmanage.stream.iter_entries should report the entry and the error with their positions
+        """
+        items = list(stream.iter_entries(pathlib.Path("test/controls/one_valid_one_invalid.bib"), "utf-8", 5))
+        self.assertEqual([(item.offset, item.lineno) for item in items], [(0, 1), (22, 5)])
+        self.assertEqual(items[0].key, "one")
+        self.assertEqual(items[1].error_type, "syntax error")
+
+    def test_byte_offsets(self):
+        """
+        refmanage.stream.iter_entries should report offsets in bytes
+        """
+        path = self.write(u"@article{ü,}\n@article{k2,}\n")
+        self.assertEqual([item.offset for item in stream.iter_entries(path, "utf-8")], [0, 14])
+
+    def test_every_error(self):
+        """
+        refmanage.stream.iter_entries should report every bad entry and parse the rest
+        """
+        path = self.write(u"@article{k1,}\n@article{bad, title = }\n@article{k2,}\n\n@article{k3, title = {x}\n@article{k4,}\n")
+        items = list(stream.iter_entries(path, "utf-8"))
+        self.assertEqual([key for key, fields in entries(items)], ["k1", "k2", "k4"])
+        self.assertEqual([lineno for lineno, error_type in errors(items)], [2, 5])
+
+
+class State(Base):
+    """
+    Tests state carried between chunks by refmanage.stream.iter_parsed_chunks
+    """
+    def test_macros(self):
+        """
+        refmanage.stream.iter_text_entries should expand macros defined in earlier chunks
+        """
+        items = list(stream.iter_text_entries(u"@string{foo = \"Foo\"}\n@article{k1, title = foo}\n"))
+        self.assertEqual(entries(items), [("k1", {"title": "Foo"})])
+
+    def test_repeated_key(self):
+        """
+        refmanage.stream.iter_text_entries should report keys repeated in later chunks, ignoring case
+        """
+        items = list(stream.iter_text_entries(u"@article{k1,}\n@book{K1,}\n"))
+        self.assertEqual([key for key, fields in entries(items)], ["k1"])
+        self.assertEqual(errors(items), [(2, None)])
+
+
+class Encodings(Base):
+    """
+    Tests encodings accepted by refmanage.stream.iter_entries
+    """
+    def test_latin_1(self):
+        """
+        refmanage.stream.iter_entries should stream files in single-byte encodings
+        """
+        path = self.write(u"@article{k1, title = {ß}}\n", "latin-1")
+        self.assertEqual(entries(stream.iter_entries(path, "latin-1")), [("k1", {"title": u"ß"})])
+
+    def test_utf_16(self):
+        """
+        refmanage.stream.iter_entries should refuse encodings which are not ASCII-compatible
+        """
+        self.assertRaises(ValueError, stream.iter_entries, self.write(u"@article{k1,}", "utf-16"), "utf-16")
+
+
+class Errors(unittest.TestCase):
+    """
+    Tests refmanage.stream.iter_text_errors
+    """
+    def test_resume_after_syntax_error(self):
+        """
+        refmanage.stream.iter_text_errors should resume after the command of a syntax error, knowing earlier keys
+        """
+        src_txt = u"@article{k1,}\n@article{k2 title = ,}\n@book{K1,}\n@article{k3, title = {x}\n"
+        errors = list(stream.iter_text_errors(src_txt, parse_bib_txt(src_txt)))
+        self.assertEqual([(lineno, error_type) for error_type, message, lineno, context in errors],
+                         [(2, "syntax error"), (3, None), (4, None)])
+
+    def test_other_error(self):
+        """
+        refmanage.stream.iter_text_errors should give an error other than a syntax error once
+        """
+        src_txt = u"@article{k1,}\n@book{K1,}\n@article{k2 title = ,}\n"
+        error = parse_bib_txt(src_txt)
+        errors = list(stream.iter_text_errors(src_txt, error))
+        self.assertEqual([message for error_type, message, lineno, context in errors],
+                         [error.message, u"field value expected"])
+
+    def test_premature_eof_lineno(self):
+        """
+        refmanage.stream.iter_text_errors should give a premature end of file the line number of the unbalanced command
+        """
+        src_txt = u"".join(u"@misc{{k{0},}}\n".format(n) for n in range(50)) + u"@misc{bad, title = {x\n@misc{k0,}\n"
+        errors = list(stream.iter_text_errors(src_txt, parse_bib_txt(src_txt)))
+        self.assertEqual([(message, lineno) for error_type, message, lineno, context in errors],
+                         [(u"premature end of file", 51), (u"repeated bibliograhpy entry: k0", 52)])
+
+
+class KeyLines(unittest.TestCase):
+    """
+    Tests refmanage.stream.iter_key_lines
+    """
+    def test_key_lines(self):
+        """
+        refmanage.stream.iter_key_lines should give the key and line of each entry header, skipping other commands
+        """
+        src_txt = u'@string{s = "x"}\n@article{k1,}\n% @comment{c}\n\n@BOOK ( k2 , title = s)\n@preamble{"p"}\n@misc{ k3}\n'
+        self.assertEqual(list(stream.iter_key_lines(src_txt)), [(u"k1", 2), (u"k2", 5), (u"k3", 7)])
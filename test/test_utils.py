@@ -1,9 +1,16 @@
 # -*- coding: utf-8 -*-
+import os
+import json
+import types
+import shutil
+import tempfile
 import unittest
 import pathlib2 as pathlib
 from refmanage import utils
+from refmanage import BibFile, NonbibFile
 from pybtex.database import BibliographyData
 from pybtex.exceptions import PybtexError
+from helpers import ParseCounting, count_parses
 
 
 # Base classes
@@ -43,12 +50,36 @@ class MethodsReturnType(Base):
         """
         self.assertIsInstance(utils.handle_files_args(""), list)
 
+    def test_iter_files_args(self):
+        """
+        refmanage.utils.iter_files_args should return a generator
+        """
+        self.assertIsInstance(utils.iter_files_args([""]), types.GeneratorType)
+
+    def test_iter_parse_results(self):
+        """
+        refmanage.utils.iter_parse_results should return a generator
+        """
+        self.assertIsInstance(utils.iter_parse_results([self.empty]), types.GeneratorType)
+
+    def test_iter_stdout_test_msg(self):
+        """
+        refmanage.utils.iter_stdout_test_msg should return a generator
+        """
+        self.assertIsInstance(utils.iter_stdout_test_msg([]), types.GeneratorType)
+
     def test_construct_bibfile_data(self):
         """
         refmanage.utils.construct_bibfile_data should return a list
         """
         self.assertIsInstance(utils.construct_bibfile_data(self.empty), list)
 
+    def test_construct_parse_results(self):
+        """
+        refmanage.utils.construct_parse_results should return a list
+        """
+        self.assertIsInstance(utils.construct_parse_results(self.empty, jobs=1), list)
+
     def test_bib_sublist(self):
         """
         refmanage.utils.bib_sublist should return a list
@@ -72,3 +103,371 @@ class MethodsReturnValues(Base):
         """
         """
         pass
+
+    def test_construct_parse_results_order(self):
+        """
+        refmanage.utils.construct_parse_results should preserve the order of its arguments when parsing in parallel
+        """
+        paths = [self.invalid, self.empty, self.one_valid_one_invalid, self.two, self.one]
+        results = utils.construct_parse_results(*paths, jobs=2)
+        self.assertEqual([result.path for result in results], paths)
+
+    def test_construct_parse_results_parallel(self):
+        """
+        refmanage.utils.construct_parse_results should give the same results in parallel as serially
+        """
+        paths = [self.invalid, self.empty, self.one_valid_one_invalid, self.two, self.one]
+        serial = utils.construct_parse_results(*paths, jobs=1)
+        parallel = utils.construct_parse_results(*paths, jobs=3)
+        self.assertEqual([r.bib_type for r in serial], [r.bib_type for r in parallel])
+        self.assertEqual([r.test_msg(True) for r in serial], [r.test_msg(True) for r in parallel])
+
+    def test_construct_parse_results_invalid_jobs(self):
+        """
+        refmanage.utils.construct_parse_results should raise ValueError if `jobs` is less than 1
+        """
+        with self.assertRaises(ValueError):
+            utils.construct_parse_results(self.empty, jobs=0)
+
+    def test_iter_files_args(self):
+        """
+        refmanage.utils.iter_files_args should yield the same paths as refmanage.utils.handle_files_args
+        """
+        paths_args = ["test/controls/*.bib", "test/controls/one.bib"]
+        self.assertEqual(list(utils.iter_files_args(paths_args)), utils.handle_files_args(*paths_args))
+
+    def test_handle_files_args_duplicates(self):
+        """
+        refmanage.utils.handle_files_args should return each file once for overlapping arguments
+        """
+        paths = utils.handle_files_args("test/controls/one.bib", "test/controls/*.bib", "./test/controls/one.bib")
+        self.assertEqual(len(paths), len(set(path.resolve() for path in paths)))
+        self.assertEqual(paths[0], self.one)
+
+    def test_iter_parse_results_unordered(self):
+        """
+        refmanage.utils.iter_parse_results should yield a result for every path when unordered
+        """
+        paths = [self.invalid, self.empty, self.one_valid_one_invalid, self.two, self.one]
+        results = utils.iter_parse_results(iter(paths), jobs=2, ordered=False)
+        self.assertEqual(sorted(result.path for result in results), sorted(paths))
+
+    def test_iter_parse_results_error(self):
+        """
+        refmanage.utils.iter_parse_results should raise errors from worker processes
+        """
+        paths = [self.empty, pathlib.Path("test/controls/nonexistent.bib"), self.one]
+        for ordered in [True, False]:
+            with self.assertRaises(IOError):
+                list(utils.iter_parse_results(paths, jobs=2, ordered=ordered))
+
+    def test_iter_parse_results_prescan(self):
+        """
+        refmanage.utils.iter_parse_results should classify files, and count the entries of parseable files, the same with and without `prescan`
+        """
+        paths = utils.handle_files_args("test/controls/*.bib")
+        full = utils.iter_parse_results(paths, jobs=1)
+        prescanned = utils.iter_parse_results(paths, jobs=1, prescan=True)
+        for a, b in zip(full, prescanned):
+            self.assertEqual(issubclass(a.bib_type, PybtexError), issubclass(b.bib_type, PybtexError))
+            if issubclass(a.bib_type, BibliographyData):
+                self.assertEqual(a.num_entries, b.num_entries)
+
+    def test_iter_stdout_test_msg(self):
+        """
+        refmanage.utils.iter_stdout_test_msg should yield pieces of the message from refmanage.utils.gen_stdout_test_msg
+        """
+        bibfile_data = utils.construct_parse_results(self.invalid, self.empty, self.one_valid_one_invalid, jobs=1)
+        for verbose in [True, False]:
+            msg = u"".join(utils.iter_stdout_test_msg(bibfile_data, verbose))
+            self.assertEqual(msg, utils.gen_stdout_test_msg(bibfile_data, verbose))
+
+    def test_reffile_from_bytes(self):
+        """
+        refmanage.utils.reffile_from_bytes should classify content in memory under its name
+        """
+        with open(str(self.invalid), "rb") as f:
+            b = utils.reffile_from_bytes(f.read(), u"upload.bib")
+        self.assertIsInstance(b, NonbibFile)
+        self.assertEqual(b.test_msg(True), utils.reffile_factory(self.invalid).test_msg(True).replace(
+            unicode(self.invalid.resolve()), u"upload.bib"))
+        self.assertEqual(utils.test_record(b)["path"], u"upload.bib")
+
+    def test_reffile_from_stream(self):
+        """
+        refmanage.utils.reffile_from_stream should classify the contents of a stream
+        """
+        with self.two.open("rb") as f:
+            b = utils.reffile_from_stream(f, u"upload.bib")
+        self.assertIsInstance(b, BibFile)
+        self.assertEqual(b.name, u"upload.bib")
+
+    def test_test_record(self):
+        """
+        refmanage.utils.test_record should summarize parseable and unparseable files
+        """
+        record = utils.test_record(utils.reffile_factory(self.two), (0.5, 44, False))
+        self.assertEqual((record["parseable"], record["entries"], record["errors"]), (True, 2, []))
+        self.assertEqual((record["seconds"], record["bytes"], record["cached"]), (0.5, 44, False))
+        record = utils.test_record(utils.reffile_factory(self.invalid))
+        self.assertEqual((record["parseable"], record["entries"], record["lineno"]), (False, None, 1))
+        self.assertEqual(record["error_type"], record["errors"][0]["error_type"])
+        self.assertIsNone(record["bytes"])
+
+    def test_iter_stdout_test_jsonl(self):
+        """
+        refmanage.utils.iter_stdout_test_jsonl should yield a line of JSON per file
+        """
+        results = utils.construct_parse_results(self.one, self.invalid, jobs=1)
+        lines = list(utils.iter_stdout_test_jsonl(results))
+        self.assertEqual(len(lines), 2)
+        self.assertTrue(all(line.endswith("\n") for line in lines))
+        self.assertEqual([json.loads(line)["path"] for line in lines],
+                         [unicode(self.one.resolve()), unicode(self.invalid.resolve())])
+
+    def test_bib_sublist_parse_results(self):
+        """
+        refmanage.utils.bib_sublist should select `ParseResult`s by type
+        """
+        results = utils.construct_parse_results(self.empty, self.invalid, jobs=1)
+        sublist = utils.bib_sublist(results, PybtexError)
+        self.assertEqual([result.path for result in sublist], [self.invalid])
+
+
+class ParserInvocations(ParseCounting, Base):
+    """
+    Tests number of times files are parsed
+    """
+    def test_reffile_factory_parseable(self):
+        """
+        refmanage.utils.reffile_factory should parse a parseable file once
+        """
+        b = utils.reffile_factory(self.two)
+        self.assertIsInstance(b, BibFile)
+        self.assertEqual(self.parse_count, 1)
+
+    def test_reffile_factory_unparseable(self):
+        """
+        refmanage.utils.reffile_factory should parse an unparseable file once
+        """
+        b = utils.reffile_factory(self.invalid)
+        self.assertIsInstance(b, NonbibFile)
+        self.assertEqual(self.parse_count, 1)
+
+    def test_construct_bibfile_data(self):
+        """
+        refmanage.utils.construct_bibfile_data should parse each file once
+        """
+        utils.construct_bibfile_data(self.empty, self.one, self.invalid, self.one_valid_one_invalid)
+        self.assertEqual(self.parse_count, 4)
+
+    def test_construct_parse_results_repeated_key(self):
+        """
+        refmanage.utils.construct_parse_results should parse a file with a repeated key once, listing every error only with `details`
+        """
+        directory = tempfile.mkdtemp()
+        try:
+            path = pathlib.Path(directory) / "repeated.bib"
+            with path.open("w") as f:
+                f.write(u"".join(u"@misc{{k{0}, title = {{x}}}}\n".format(n) for n in range(200)) + u"@misc{k0,}\n")
+            result, = utils.construct_parse_results(path, jobs=1)
+            self.assertFalse(result.complete)
+            self.assertEqual(self.parse_count, 1)
+            result, = utils.iter_parse_results([path], jobs=1, details=True)
+            self.assertTrue(result.complete)
+            self.assertEqual(len(result.errors), 1)
+        finally:
+            shutil.rmtree(directory)
+
+
+class WalkFiles(unittest.TestCase):
+    """
+    Tests walking directory trees
+    """
+    def setUp(self):
+        """
+        Create a directory tree in a temporary directory
+        """
+        self.tmpdir = tempfile.mkdtemp()
+        for rel_path in ["a.bib", "notes.txt", "sub/b.bib", "sub/deep/c.bib",
+                         ".hidden/d.bib", "skipped/e.bib", "sub/f.bib"]:
+            path = os.path.join(self.tmpdir, rel_path)
+            if not os.path.isdir(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+            open(path, "w").close()
+        with open(os.path.join(self.tmpdir, "sub", utils.IGNORE_FILENAME), "w") as f:
+            f.write("# comment\nf.bib\n")
+
+    def tearDown(self):
+        """
+        Remove temporary directory
+        """
+        shutil.rmtree(self.tmpdir)
+
+    def rel_paths(self, paths):
+        """
+        Paths relative to the temporary directory
+        """
+        return [os.path.relpath(str(path), self.tmpdir) for path in paths]
+
+    def test_walk_files(self):
+        """
+        refmanage.utils.walk_files should yield BibTeX files outside hidden directories, honoring ignore files
+        """
+        paths = utils.walk_files(self.tmpdir)
+        self.assertIsInstance(paths, types.GeneratorType)
+        self.assertEqual(self.rel_paths(paths), ["a.bib", "skipped/e.bib", "sub/b.bib", "sub/deep/c.bib"])
+
+    def test_walk_files_vanished_directory(self):
+        """
+        refmanage.utils.walk_files should skip a directory which cannot be listed
+        """
+        paths = utils.walk_files(self.tmpdir)
+        self.assertEqual(self.rel_paths([next(paths)]), ["a.bib"])
+        shutil.rmtree(os.path.join(self.tmpdir, "sub"))
+        self.assertEqual(self.rel_paths(paths), ["skipped/e.bib"])
+
+    def test_walk_files_include(self):
+        """
+        refmanage.utils.walk_files should yield only files matching `include`
+        """
+        paths = utils.walk_files(self.tmpdir, include=["*.txt"])
+        self.assertEqual(self.rel_paths(paths), ["notes.txt"])
+
+    def test_walk_files_exclude(self):
+        """
+        refmanage.utils.walk_files should skip files and directories matching `exclude`
+        """
+        paths = utils.walk_files(self.tmpdir, exclude=["skipped", "sub/deep/*"])
+        self.assertEqual(self.rel_paths(paths), ["a.bib", "sub/b.bib"])
+
+    def test_iter_files_args_recursive(self):
+        """
+        refmanage.utils.iter_files_args should walk directories only if `recursive`
+        """
+        self.assertEqual(list(utils.iter_files_args([self.tmpdir])), [pathlib.Path(self.tmpdir)])
+        paths = utils.iter_files_args([self.tmpdir], recursive=True)
+        self.assertEqual(self.rel_paths(paths), ["a.bib", "skipped/e.bib", "sub/b.bib", "sub/deep/c.bib"])
+
+
+class Dedupe(unittest.TestCase):
+    """
+    Tests handling of duplicate paths and files
+    """
+    def setUp(self):
+        """
+        Create copies of control data and a symbolic link to a directory in a temporary directory
+
+        Replace `bibtex.Parser` with a subclass which counts calls to `parse_stream`.
+        """
+        self.tmpdir = tempfile.mkdtemp()
+        self.paths = []
+        for name, control in [("a.bib", "one.bib"), ("b.bib", "invalid.bib"), ("c.bib", "one.bib"),
+                              ("d.bib", "two.bib"), ("e.bib", "invalid.bib"), ("f.bib", "one.bib")]:
+            path = pathlib.Path(self.tmpdir, name)
+            shutil.copy(os.path.join("test/controls", control), str(path))
+            self.paths.append(path)
+        os.symlink(self.tmpdir, os.path.join(self.tmpdir, "link"))
+
+        count_parses(self)
+
+    def tearDown(self):
+        """
+        Remove temporary directory
+        """
+        shutil.rmtree(self.tmpdir)
+
+    def test_symlinked_directory(self):
+        """
+        refmanage.utils.handle_files_args should return files reached through a symbolic link only once
+        """
+        paths = utils.handle_files_args(os.path.join(self.tmpdir, "*.bib"), os.path.join(self.tmpdir, "link", "*.bib"))
+        self.assertEqual(sorted(paths), self.paths)
+
+    def test_dedupe_content(self):
+        """
+        refmanage.utils.iter_parse_results should parse byte-identical files once and keep their order
+        """
+        expected = [result.test_msg(True) for result in utils.iter_parse_results(self.paths, jobs=1)]
+        for jobs in [1, 2]:
+            results = list(utils.iter_parse_results(self.paths, jobs=jobs, dedupe_content=True))
+            self.assertEqual([result.path for result in results], self.paths)
+            self.assertEqual([result.test_msg(True) for result in results], expected)
+
+    def test_dedupe_content_parse_count(self):
+        """
+        refmanage.utils.iter_parse_results should parse each distinct file content once
+        """
+        list(utils.iter_parse_results(self.paths, jobs=1, dedupe_content=True))
+        self.assertEqual(self.parse_count, 3)
+
+    def test_dedupe_content_unordered(self):
+        """
+        refmanage.utils.iter_parse_results should yield a result for every path when deduping unordered
+        """
+        results = list(utils.iter_parse_results(self.paths, jobs=2, ordered=False, dedupe_content=True))
+        self.assertEqual(sorted(result.path for result in results), self.paths)
+
+
+class Sharding(unittest.TestCase):
+    """
+    Tests parsing single files in shards with refmanage.utils.parse_sharded
+    """
+    def setUp(self):
+        self.src_txt = u"".join(
+            u"@string{{m{0} = \"Macro {0}\"}}\n@preamble{{\"p{0}\"}}\n"
+            u"@article{{k{0}, author = \"Smith, J. and Doe, A.\", title = m{0} # {{ {{x}}}}, journal = jan}}\n"
+            u"% junk between entries\n".format(i) for i in range(40))
+
+    def assertSameAsSerial(self, src_txt):
+        serial = utils.parse_bib_txt(src_txt)
+        sharded = utils.parse_sharded(src_txt, jobs=2, shard_size=100)
+        if isinstance(serial, BibliographyData):
+            self.assertEqual(sharded, serial)
+            self.assertEqual(sharded.entries.keys(), serial.entries.keys())
+        else:
+            self.assertIs(type(sharded), type(serial))
+            self.assertEqual(sharded.message, serial.message)
+
+    def test_parse_sharded(self):
+        """
+        refmanage.utils.parse_sharded should give the same data as a serial parse, with macros defined in earlier shards
+        """
+        self.assertGreater(len(list(utils.stream.iter_shards(self.src_txt, 100))), 2)
+        self.assertSameAsSerial(self.src_txt)
+
+    def test_parse_sharded_repeated_key(self):
+        """
+        refmanage.utils.parse_sharded should give the serial error for keys repeated in different shards
+        """
+        self.assertSameAsSerial(self.src_txt + u"@book{K0,}\n")
+
+    def test_parse_sharded_error(self):
+        """
+        refmanage.utils.parse_sharded should give the serial error for unparseable shards
+        """
+        self.assertSameAsSerial(self.src_txt.replace(u"@article{k20,", u"@article{k20 title = ,"))
+
+    def test_parse_sharded_entry_owner(self):
+        """
+        refmanage.utils.parse_sharded should give entries belonging to the merged data
+        """
+        bib = utils.parse_sharded(self.src_txt, jobs=2, shard_size=100)
+        self.assertTrue(all(entry.collection is bib for entry in bib.entries.values()))
+
+    def test_iter_parse_results_single_file(self):
+        """
+        refmanage.utils.iter_parse_results should give the same result for a single file parsed in shards
+        """
+        directory = tempfile.mkdtemp()
+        try:
+            path = pathlib.Path(directory) / "large.bib"
+            with path.open("wb") as f:
+                f.write(self.src_txt.encode("ascii"))
+            old_size = utils.stream.SHARD_SIZE
+            utils.stream.SHARD_SIZE = 100
+            results = [list(utils.iter_parse_results([path], jobs=jobs))[0] for jobs in [1, 2]]
+            self.assertEqual(results[0].test_msg(True), results[1].test_msg(True))
+        finally:
+            utils.stream.SHARD_SIZE = old_size
+            shutil.rmtree(directory)
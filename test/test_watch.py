@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import tempfile
+import unittest
+import pathlib2 as pathlib
+from refmanage import watch
+
+
+class Base(unittest.TestCase):
+    """
+    Base class for tests
+
+    Creates a directory of bib files and a `Watcher` polling it.
+    """
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.one = os.path.join(self.directory, "one.bib")
+        self.two = os.path.join(self.directory, "two.bib")
+        shutil.copy("test/controls/one.bib", self.one)
+        shutil.copy("test/controls/two.bib", self.two)
+        self.watcher = watch.Watcher([os.path.join(self.directory, "*.bib")],
+            notifier=self.notifier(), interval=0.01, debounce=0.01)
+
+    def tearDown(self):
+        self.watcher.close()
+        shutil.rmtree(self.directory)
+
+    def notifier(self):
+        return watch.PollNotifier()
+
+
+class Changes(Base):
+    """
+    Tests changes reported by refmanage.watch.Watcher when polling
+    """
+    def test_paths(self):
+        """
+        refmanage.watch.Watcher.paths should list the matched files
+        """
+        self.assertEqual(sorted(self.watcher.paths), [pathlib.Path(self.one), pathlib.Path(self.two)])
+
+    def test_modified(self):
+        """
+        refmanage.watch.Watcher.changes should report modified files
+        """
+        with open(self.one, "a") as f:
+            f.write("\n@article{three,}\n")
+        self.assertEqual(next(self.watcher.changes()), ([pathlib.Path(self.one)], []))
+
+    def test_created(self):
+        """
+        refmanage.watch.Watcher.changes should report created files
+        """
+        three = os.path.join(self.directory, "three.bib")
+        shutil.copy("test/controls/invalid.bib", three)
+        self.assertEqual(next(self.watcher.changes()), ([pathlib.Path(three)], []))
+
+    def test_removed(self):
+        """
+        refmanage.watch.Watcher.changes should report removed files
+        """
+        os.remove(self.two)
+        self.assertEqual(next(self.watcher.changes()), ([], [pathlib.Path(self.two)]))
+
+    def test_replaced(self):
+        """
+        refmanage.watch.Watcher.changes should report files replaced by renaming as modified
+        """
+        tmp = os.path.join(self.directory, "two.bib.tmp")
+        shutil.copy("test/controls/invalid.bib", tmp)
+        os.rename(tmp, self.two)
+        self.assertEqual(next(self.watcher.changes()), ([pathlib.Path(self.two)], []))
+
+
+@unittest.skipUnless(hasattr(os, "uname") and os.uname()[0] == "Linux", "inotify is Linux-only")
+class InotifyChanges(Changes):
+    """
+    Tests changes reported by refmanage.watch.Watcher when notified by inotify
+    """
+    def notifier(self):
+        return watch.InotifyNotifier()